@@ -18,6 +18,9 @@ class FilterWorkFiles(HookClass):
     """
     Hook that can be used to filter the list of work files found by the app for the current
     Work area
+
+    Note, work files are filtered in chunks as they are found so this hook may be called
+    several times for a single work area, each time with a subset of the work files.
     """
 
     def execute(self, work_files, **kwargs):
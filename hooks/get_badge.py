@@ -75,10 +75,53 @@ class GetBadge(HookClass):
         # the default implementation always returns None.
         return None
 
+    def get_badges(self, files, **kwargs):
+        """
+        Generate badges for a list of work files and publishes in one go.  This is called with
+        the files that are about to be displayed so that badges are only generated for files
+        the user actually sees.
+
+        The default implementation calls get_work_file_badge or get_publish_badge for each
+        file.  Overriding this method allows the badges for all files to be determined at once,
+        e.g. with a single query.
+
+        :param list files: A list of dictionaries, one for each file to generate a badge for.
+            Work files contain the keys:
+                - work_file_details
+                - work_file_path
+            Publishes contain the keys:
+                - publish_details
+                - publish_path
+            These match the parameters of get_work_file_badge and get_publish_badge.
+
+        :returns: A list containing a QPixmap, QColor or None for each file in the same order as
+            the files list.  See get_work_file_badge for details.
+        """
+        badges = []
+        for file_info in files:
+            if "work_file_path" in file_info:
+                badges.append(
+                    self.get_work_file_badge(
+                        work_file_details=file_info["work_file_details"],
+                        work_file_path=file_info["work_file_path"],
+                    )
+                )
+            elif "publish_path" in file_info:
+                badges.append(
+                    self.get_publish_badge(
+                        publish_details=file_info["publish_details"],
+                        publish_path=file_info["publish_path"],
+                    )
+                )
+            else:
+                badges.append(None)
+        return badges
+
     def generate_badge_pixmap(self, badge_color):
         """
         Generate a badge QPixmap from a QColor. This hook method is used to generate a badge image
-        when a badge hook returns a QColor. Thus, by overloading this method, it's possible to
+        when a badge hook returns a QColor.  The generated pixmap is cached and re-used for all
+        badges of the same color. Thus, by overloading this method, it's possible to
         customize what the generated badges will look like when get_work_file_badge or
         get_publish_badge return a QColor.
 
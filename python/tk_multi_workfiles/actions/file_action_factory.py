@@ -202,6 +202,27 @@ class FileActionFactory(object):
 
         return current_user_file_versions
 
+    def _get_max_version(self, file_item, file_versions):
+        """
+        Retrieves the latest version of a file owned by the current user.
+
+        :param file_item: File item we wish to retrieve the latest version for.
+        :param file_versions: Filtered list of file versions for the current user.
+
+        :returns: The latest version of the file.
+        """
+        if not self._in_other_users_sandbox:
+            # the file versions are the ones cached by the model which also knows the
+            # latest version so there's no need to look at every version:
+            latest_versions = self._file_model.get_cached_latest_versions(
+                file_item.key, self._work_area
+            )
+            if latest_versions and latest_versions[0] is not None:
+                return latest_versions[0]
+
+        all_versions = [v for v, f in six.iteritems(file_versions)]
+        return max(all_versions) if all_versions else 0
+
     def _create_local_file_actions(self, file_item, file_versions):
         """
         Creates a list of actions if the file item is a local file.
@@ -241,9 +262,7 @@ class FileActionFactory(object):
             # file isn't in a different sandbox so add regular open actions:
             if file_item.editable:
                 # determine if this version is the latest:
-                all_versions = [v for v, f in six.iteritems(file_versions)]
-                max_version = max(all_versions) if all_versions else 0
-                if file_item.version != max_version:
+                if file_item.version != self._get_max_version(file_item, file_versions):
                     actions.append(
                         ContinueFromWorkFileAction(
                             file_item, file_versions, self._work_area
@@ -9,6 +9,8 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import re
+import fnmatch
 from datetime import datetime
 import copy
 import time
@@ -30,7 +32,437 @@ task_manager = sgtk.platform.import_framework(
 BackgroundTaskManager = task_manager.BackgroundTaskManager
 
 from .work_area import WorkArea
-from .util import monitor_qobject_lifetime, Threaded
+from .work_file_index import WorkFileIndex, g_work_file_index
+from .shared_directory_scan import SharedDirectoryScan
+from .template_matcher import TemplateMatcher
+from .util import (
+    monitor_qobject_lifetime,
+    Threaded,
+    SnapshotDict,
+    get_template_user_keys,
+    freeze_sg_data,
+    thaw_sg_data,
+)
+
+
+class WorkFileWalker(object):
+    """
+    Single pass file system walker used to find all files that match a template.
+
+    This finds the same files as sgtk.paths_from_template but rather than running one glob
+    for each combination of optional keys in the template, the glob patterns for all
+    combinations are matched together whilst descending the static prefix of the template
+    with os.scandir.  This means each directory is only listed once and directories that
+    can't match any of the patterns are pruned as early as possible.
+
+    If a WorkFileIndex is provided then directory listings, together with the fields of
+    matching files, are read from the index and only directories whose modification time
+    has changed since they were indexed are listed again.  Matching files are always
+    stat'ed as their details can change without the directory changing.
+
+    If a SharedDirectoryScan is provided then directories are listed through it so that
+    walks run for other searches at the same time don't list the same directories again.
+    """
+
+    class _IndexedEntry(object):
+        """
+        Minimal DirEntry-like wrapper around an entry in an indexed directory listing.
+        """
+
+        def __init__(self, listing, name, path):
+            """
+            Construction
+
+            :param listing: The WorkFileIndex.Listing the entry belongs to
+            :param name:    The name of the entry
+            :param path:    The full path of the entry
+            """
+            self.listing = listing
+            self.name = name
+            self.path = path
+            # [is_dir, fields]
+            self.record = listing.entries[name]
+
+        def is_dir(self):
+            """
+            :returns:   True if the entry is a directory, otherwise False
+            """
+            return self.record[0]
+
+        def stat(self):
+            """
+            :returns:   The os.stat_result for the entry.  This is never taken from the
+                        index as the file may have changed without its directory changing.
+            """
+            return os.stat(self.path)
+
+    # regular expression used to find glob wildcards in a path component:
+    _MAGIC_RE = re.compile(r"[*?[]")
+
+    # template internals used to build the glob patterns:
+    _TEMPLATE_INTERNALS = ("_keys", "_missing_keys", "_apply_fields")
+
+    def __init__(self, template, index=None, shared_scan=None):
+        """
+        Construction
+
+        :param template:    The template to find files for
+        :param index:       Optional WorkFileIndex used to avoid re-listing directories
+                            that haven't changed since the last walk
+        :param shared_scan: Optional SharedDirectoryScan used to share directory listings
+                            with other walks
+        """
+        self._template = template
+        self._matcher = TemplateMatcher.get(template)
+        self._index = index
+        self._shared_scan = shared_scan
+        self._pattern_cache = {}
+
+    @staticmethod
+    def is_supported():
+        """
+        :returns:   True if the walker can be used with this version of Python, otherwise False.
+        """
+        return hasattr(os, "scandir")
+
+    @staticmethod
+    def supports_template(template):
+        """
+        The glob patterns are built from the template key sets in the same way as
+        sgtk.paths_from_template builds them.  These aren't part of the public Template
+        API so check they're available before walking.
+
+        :param template:    The template to check
+        :returns:           True if the walker can find files for the template, otherwise
+                            False
+        """
+        return all(
+            hasattr(template, attr) for attr in WorkFileWalker._TEMPLATE_INTERNALS
+        )
+
+    def walk(self, fields, skip_keys=None, skip_missing_optional_keys=False):
+        """
+        Find all files matching the template for the specified fields.  Keys that are
+        skipped or missing are treated as wildcards in the same way as they are by
+        sgtk.paths_from_template.
+
+        :param fields:                      Dictionary of fields to find files for
+        :param skip_keys:                   List of keys whose values should be ignored
+        :param skip_missing_optional_keys:  If True then optional keys that aren't included in
+                                            the fields will also be treated as wildcards
+        :returns:                           A dictionary {path:(stat, fields)} containing an
+                                            entry for each file found.  The stat is the
+                                            os.stat_result gathered whilst walking and fields are
+                                            the template fields for the path.  Stat will be None
+                                            if the file couldn't be stat'ed.
+        """
+        return dict(self.iter_walk(fields, skip_keys, skip_missing_optional_keys))
+
+    def iter_walk(
+        self,
+        fields,
+        skip_keys=None,
+        skip_missing_optional_keys=False,
+        report_progress=False,
+    ):
+        """
+        Find all files matching the template for the specified fields, yielding each file
+        as soon as it's found rather than waiting for the whole walk to complete.  See walk()
+        for details.
+
+        :param fields:                      Dictionary of fields to find files for
+        :param skip_keys:                   List of keys whose values should be ignored
+        :param skip_missing_optional_keys:  If True then optional keys that aren't included in
+                                            the fields will also be treated as wildcards
+        :param report_progress:             If True then None is also yielded each time a
+                                            directory has been walked so that the caller can
+                                            do something whilst no files are being found
+        :returns:                           A generator yielding (path, (stat, fields)) for each
+                                            file found
+        """
+        # group the remaining path components for each pattern by the static directory
+        # the pattern starts from:
+        pending = {}
+        for glob_str in self._build_glob_patterns(
+            fields, skip_keys, skip_missing_optional_keys
+        ):
+            parts = os.path.normpath(glob_str).split(os.sep)
+            for index, part in enumerate(parts):
+                if self._MAGIC_RE.search(part):
+                    break
+            else:
+                # no wildcards so this is just a single path - let the directory holding it
+                # look it up:
+                index = len(parts) - 1
+            static_dir = os.sep.join(parts[:index]) or os.sep
+            pending.setdefault(static_dir, set()).add(tuple(parts[index:]))
+
+        # walk the directory tree below each static directory, matching entries against
+        # all patterns at each level:
+        found_paths = set()
+        for static_dir, remaining in pending.items():
+            listings = None
+            if self._index:
+                listings = self._index.get_listings(static_dir, self._template)
+
+            dirs_to_walk = [(static_dir, remaining)]
+            while dirs_to_walk:
+                dir_path, remaining = dirs_to_walk.pop()
+                sub_dirs = {}
+                for name, path, entry in self._iter_dir_entries(
+                    dir_path, remaining, listings
+                ):
+                    for components in remaining:
+                        if not self._match(name, components[0]):
+                            continue
+                        if len(components) == 1:
+                            # leaf - make sure the path is valid for the template:
+                            if path not in found_paths:
+                                found_paths.add(path)
+                                found_file = self._get_found_file(path, entry)
+                                if found_file:
+                                    yield path, found_file
+                        elif self._is_dir(path, entry):
+                            sub_dirs.setdefault(path, set()).add(components[1:])
+                dirs_to_walk.extend(sub_dirs.items())
+                if report_progress:
+                    yield None
+
+            if listings is not None:
+                self._index.update_listings(
+                    static_dir, self._template, listings.values()
+                )
+
+    def _build_glob_patterns(self, fields, skip_keys, skip_missing_optional_keys):
+        """
+        Build the list of glob patterns to search with, one for each set of keys in the
+        template.  This mirrors the way sgtk.paths_from_template builds its glob strings
+        and should only be used if supports_template() is True for the template.
+
+        :param fields:                      Dictionary of fields to find files for
+        :param skip_keys:                   List of keys whose values should be ignored
+        :param skip_missing_optional_keys:  If True then missing optional keys are treated as
+                                            wildcards
+        :returns:                           A list of unique glob strings
+        """
+        template = self._template
+        skip_keys = list(skip_keys or [])
+
+        # construct local fields dictionary that doesn't include any skip keys and uses
+        # wildcards for any required keys that aren't specified:
+        local_fields = dict((k, v) for k, v in fields.items() if k not in skip_keys)
+        for key in template.missing_keys(local_fields):
+            if key not in skip_keys:
+                skip_keys.append(key)
+            local_fields[key] = "*"
+
+        glob_strs = []
+        for keys in template._keys:
+            current_fields = local_fields.copy()
+            current_skip_keys = []
+            for key in skip_keys:
+                if key in keys:
+                    current_skip_keys.append(key)
+                    current_fields[key] = "*"
+
+            missing_optional_keys = template._missing_keys(current_fields, keys, False)
+            if missing_optional_keys:
+                if not skip_missing_optional_keys:
+                    # can't form a valid path for this key set:
+                    continue
+                for missing_key in missing_optional_keys:
+                    current_fields[missing_key] = "*"
+                    current_skip_keys.append(missing_key)
+
+            glob_str = template._apply_fields(
+                current_fields, ignore_types=current_skip_keys, skip_defaults=True
+            )
+            if glob_str not in glob_strs:
+                glob_strs.append(glob_str)
+        return glob_strs
+
+    def _iter_dir_entries(self, dir_path, remaining, listings=None):
+        """
+        Iterate over the entries in a directory that may match the remaining pattern
+        components.  If none of the next components contain wildcards then the entries are
+        looked up directly rather than listing the whole directory.
+
+        :param dir_path:    The directory to iterate over
+        :param remaining:   A set of tuples containing the remaining pattern components
+        :param listings:    Optional dictionary {path:Listing} of indexed directory listings.
+                            If specified then the directory listing is taken from the index
+                            if it's still valid and the index is updated if it isn't.
+        :returns:           A generator yielding (name, path, entry) for each entry.  The
+                            entry will be a DirEntry (or an _IndexedEntry if it came from the
+                            index) or None for entries that were looked up directly.
+        """
+        names = set(components[0] for components in remaining)
+        if any(self._MAGIC_RE.search(name) for name in names):
+            if listings is not None:
+                listing = self._get_listing(dir_path, listings)
+                if listing is None:
+                    return
+                for name in listing.entries:
+                    path = os.path.join(dir_path, name)
+                    yield name, path, WorkFileWalker._IndexedEntry(listing, name, path)
+                return
+
+            entries = self._scandir(dir_path)
+            if entries is None:
+                return
+            for entry in entries:
+                yield entry.name, entry.path, entry
+        else:
+            for name in names:
+                path = os.path.join(dir_path, name)
+                if os.path.lexists(path):
+                    yield name, path, None
+
+    def _get_listing(self, dir_path, listings):
+        """
+        Get the listing for a directory from the indexed listings, re-listing the directory
+        if it's been modified since it was indexed.
+
+        :param dir_path:    The directory to get the listing for
+        :param listings:    Dictionary {path:Listing} of indexed directory listings.  This
+                            is updated with the new listing if the directory is re-listed.
+        :returns:           A WorkFileIndex.Listing or None if the directory couldn't be
+                            listed
+        """
+        dir_stat = (
+            self._shared_scan.stat(dir_path)
+            if self._shared_scan
+            else self._stat_dir(dir_path)
+        )
+        if dir_stat is None:
+            return None
+        mtime = dir_stat.st_mtime
+
+        listing = listings.get(dir_path)
+        if self._index.is_listing_valid(listing, mtime):
+            return listing
+
+        dir_entries = self._scandir(dir_path)
+        if dir_entries is None:
+            return None
+        entries = {}
+        for entry in dir_entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries[entry.name] = [is_dir, None]
+
+        listing = WorkFileIndex.Listing(dir_path, mtime, entries)
+        listings[dir_path] = listing
+        return listing
+
+    def _scandir(self, dir_path):
+        """
+        :param dir_path:    The directory to list
+        :returns:           A list of os.DirEntry instances for the directory or None if it
+                            couldn't be listed
+        """
+        if self._shared_scan:
+            return self._shared_scan.scandir(dir_path)
+        try:
+            return list(os.scandir(dir_path))
+        except OSError:
+            # ignore directories we can't list, the same as glob does!
+            return None
+
+    @staticmethod
+    def _stat_dir(dir_path):
+        """
+        :param dir_path:    The directory to stat
+        :returns:           An os.stat_result or None if the directory couldn't be stat'ed
+        """
+        try:
+            return os.stat(dir_path)
+        except OSError:
+            return None
+
+    def _match(self, name, pattern):
+        """
+        Match an entry name against a single glob pattern component.
+
+        :param name:    The name of the directory entry
+        :param pattern: The glob pattern component to match
+        :returns:       True if the name matches the pattern, otherwise False
+        """
+        if not self._MAGIC_RE.search(pattern):
+            return os.path.normcase(name) == os.path.normcase(pattern)
+        if name.startswith(".") and not pattern.startswith("."):
+            # glob doesn't match hidden files with wildcards:
+            return False
+        regex = self._pattern_cache.get(pattern)
+        if regex is None:
+            regex = re.compile(fnmatch.translate(os.path.normcase(pattern)))
+            self._pattern_cache[pattern] = regex
+        return regex.match(os.path.normcase(name)) is not None
+
+    def _is_dir(self, path, entry):
+        """
+        :param path:    The path of the directory entry
+        :param entry:   The DirEntry if available, otherwise None
+        :returns:       True if the entry is a directory, otherwise False
+        """
+        try:
+            return entry.is_dir() if entry is not None else os.path.isdir(path)
+        except OSError:
+            return False
+
+    def _get_found_file(self, path, entry):
+        """
+        Validate a leaf path against the template and if it's valid, return its stat and
+        fields.
+
+        :param path:    The path of the file
+        :param entry:   The DirEntry if available, otherwise None
+        :returns:       A tuple (stat, fields) or None if the path isn't valid for the
+                        template
+        """
+        indexed = isinstance(entry, WorkFileWalker._IndexedEntry)
+        if indexed and entry.record[1] is False:
+            # already known not to match the template
+            return None
+
+        if indexed and entry.record[1] is not None:
+            fields = dict(entry.record[1])
+        else:
+            fields = self._matcher.validate_and_get_fields(path)
+            if indexed:
+                # only fields that can be round-tripped through the index are stored,
+                # anything else is extracted from the path again next time:
+                if fields is None:
+                    entry.record[1] = False
+                    entry.listing.is_dirty = True
+                elif self._is_serializable(fields):
+                    entry.record[1] = fields.copy()
+                    entry.listing.is_dirty = True
+            if fields is None:
+                return None
+
+        stat = None
+        try:
+            stat = entry.stat() if entry is not None else os.stat(path)
+        except OSError:
+            # ignore OSErrors as it's probably a permissions thing!
+            pass
+        return stat, fields
+
+    @staticmethod
+    def _is_serializable(fields):
+        """
+        :param fields:  Dictionary of template fields
+        :returns:       True if all the field values can be stored in the index unchanged
+        """
+        for value in fields.values():
+            if value is not None and not isinstance(
+                value, six.string_types + six.integer_types + (float,)
+            ):
+                return False
+        return True
 
 
 class FileFinder(QtCore.QObject):
@@ -133,6 +565,56 @@ class FileFinder(QtCore.QObject):
 
             return name
 
+    class _DirectoryContextMap(object):
+        """
+        Map of directories to the context resolved from the path of a file in the directory.
+        All files in the same directory resolve to the same context so this avoids resolving
+        the context from the path cache for every file.
+        """
+
+        def __init__(self):
+            """
+            Construction
+            """
+            self._app = sgtk.platform.current_bundle()
+            self._context_map = SnapshotDict()  # directory path:context
+
+        def get_context(self, path, context):
+            """
+            Get the context for the specified file path, resolving it from the path if no other
+            file in the same directory has been resolved yet.
+
+            :param path:    The path of the file to get the context for
+            :param context: The context to pass as the previous context when resolving the
+                            context from the path
+            :returns:       The context resolved for the path
+            """
+            dir_path = os.path.dirname(path)
+            if dir_path in self._context_map:
+                return self._context_map.get(dir_path)
+            # resolve the context outside of the lock as it can be slow - if another thread
+            # resolves the same directory at the same time then the first context added is
+            # used by both:
+            path_ctx = self._app.sgtk.context_from_path(path, context)
+            return self._context_map.setdefault(dir_path, path_ctx)
+
+    # regular expression used to split a template definition into keys and static text:
+    _DEFINITION_KEY_RE = re.compile(r"({[^}]*})")
+
+    # fields that are always queried for publishes.  Any additional fields, including the
+    # thumbnail 'image', come from the 'publish_fields' setting:
+    _REQUIRED_PUBLISH_FIELDS = [
+        "id",
+        "description",
+        "version_number",
+        "created_at",
+        "created_by",
+        "name",
+        "path",
+        "task",
+        "updated_at",
+    ]
+
     def __init__(self, parent=None):
         """
         Construction
@@ -140,6 +622,17 @@ class FileFinder(QtCore.QObject):
         QtCore.QObject.__init__(self, parent)
         self._app = sgtk.platform.current_bundle()
 
+        # if enabled, publish queries are narrowed down by file extension and publish path
+        # so that fewer publishes that would just be filtered out are returned:
+        self._narrow_publish_queries = self._app.get_setting(
+            "narrow_publish_queries", False
+        )
+        # the fields to query for publishes:
+        self._publish_fields = list(FileFinder._REQUIRED_PUBLISH_FIELDS)
+        for field in self._app.get_setting("publish_fields", None) or []:
+            if field not in self._publish_fields:
+                self._publish_fields.append(field)
+
     ################################################################################################
 
     def find_files(
@@ -178,6 +671,11 @@ class FileFinder(QtCore.QObject):
         version_compare_ignore_fields = self._app.get_setting(
             "version_compare_ignore_fields", []
         )
+        publish_filters.extend(
+            self._get_publish_query_filters(
+                publish_template, valid_file_extensions, context
+            )
+        )
 
         # find all work & publish files and filter out any that should be ignored:
         work_files = self._find_work_files(
@@ -189,6 +687,7 @@ class FileFinder(QtCore.QObject):
         filtered_published_files = self._filter_publishes(
             published_files, publish_template, valid_file_extensions
         )
+        publish_stats = self._stat_paths([p["path"] for p in filtered_published_files])
 
         # turn these into FileItem instances:
         name_map = FileFinder._FileNameMap()
@@ -199,6 +698,7 @@ class FileFinder(QtCore.QObject):
             name_map,
             version_compare_ignore_fields,
             filter_file_key,
+            work_files,
         )
         work_file_items = dict(
             [
@@ -215,6 +715,7 @@ class FileFinder(QtCore.QObject):
             name_map,
             version_compare_ignore_fields,
             filter_file_key,
+            publish_stats,
         )
         publish_items = dict(
             [
@@ -236,6 +737,58 @@ class FileFinder(QtCore.QObject):
 
         return file_items
 
+    def find_work_file_items(self, paths, work_area):
+        """
+        Build FileItems for the specified work file paths.  Paths that don't exist or that
+        don't match the work template and context of the work area are ignored.  This is
+        used to update the files for a work area when only a few paths are known to have
+        changed rather than searching the whole work area again.
+
+        :param paths:       A list of the paths to build FileItems for
+        :param work_area:   The WorkArea the files belong to
+        :returns:           A list of FileItem instances, one for each valid work file
+        """
+        if not paths or not work_area or not work_area.work_template:
+            return []
+        work_template = work_area.work_template
+
+        search_fields = self._get_work_file_search_fields(
+            work_area.context, work_template, work_area.version_compare_ignore_fields
+        )
+        if search_fields is None:
+            return []
+        work_fields, skip_fields = search_fields
+
+        work_files = {}
+        matcher = TemplateMatcher.get(work_template)
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            fields = matcher.validate_and_get_fields(path)
+            if fields is None:
+                continue
+            # make sure the path is for this work area:
+            if any(
+                k in fields and fields[k] != v
+                for k, v in six.iteritems(work_fields)
+                if k not in skip_fields
+            ):
+                continue
+            work_files[path] = (self._stat_path(path), fields)
+
+        filtered_work_files = self._filter_work_files(
+            work_files, work_area.valid_file_extensions
+        )
+        work_item_details = self._process_work_files(
+            filtered_work_files,
+            work_template,
+            work_area.context,
+            FileFinder._FileNameMap(),
+            work_area.version_compare_ignore_fields,
+            found_work_files=work_files,
+        )
+        return [FileItem(**kwargs) for kwargs in work_item_details.values()]
+
     def _process_work_files(
         self,
         work_files,
@@ -244,6 +797,8 @@ class FileFinder(QtCore.QObject):
         name_map,
         version_compare_ignore_fields,
         filter_file_key=None,
+        found_work_files=None,
+        context_map=None,
     ):
         """
         :param work_files: A list of dictionaries with file details.
@@ -254,28 +809,53 @@ class FileFinder(QtCore.QObject):
                                               when building a key for the file.
         :param filter_file_key: A unique file 'key' that, if specified, will limit
                                 the returned list of files to just those that match.
+        :param found_work_files: Optional dictionary {path:(stat, fields)} of the details
+                                 gathered when the work files were found.  These are used
+                                 rather than stat'ing the files and extracting the fields
+                                 again.
+        :param context_map: Optional :class:`_DirectoryContextMap` instance used to resolve
+                            the context of files without a task.  If not specified then the
+                            context is only resolved once per directory for this call.
         returns: A dictionary where keys are (file key, version number) tuples
                   and values are dictionaries which can be used to instantiate
                   :class:`FileItem`.
         """
         files = {}
+        found_work_files = found_work_files or {}
+        context_map = context_map or FileFinder._DirectoryContextMap()
+        # {path:(stat, file details)} for the files that need the last modified user:
+        modified_by_details = {}
+
+        # extract the fields for all files that weren't found with fields in one go:
+        matcher = TemplateMatcher.get(work_template, version_compare_ignore_fields)
+        work_file_fields = matcher.get_fields_for_paths(
+            [
+                wf["path"]
+                for wf in work_files
+                if not (found_work_files.get(wf["path"]) or (None, None))[1]
+            ]
+        )
 
         for work_file in work_files:
 
             # always have the work path:
             work_path = work_file["path"]
 
-            # get fields for work file:
-            wf_fields = work_template.get_fields(work_path)
+            # get the stat and fields for the work file, re-using the details found when
+            # the file was found if possible:
+            stat, wf_fields = found_work_files.get(work_path) or (None, None)
+            if not wf_fields:
+                wf_fields = work_file_fields.get(work_path)
+                if wf_fields is None:
+                    # the path doesn't match the work template
+                    continue
             wf_ctx = None
 
             # Build the unique file key for the work path.
             # All files that share the same key are considered
             # to be different versions of the same file.
             #
-            file_key = FileItem.build_file_key(
-                wf_fields, work_template, version_compare_ignore_fields
-            )
+            file_key = matcher.build_file_key(wf_fields)
             if filter_file_key and file_key != filter_file_key:
                 # we can ignore this file completely!
                 continue
@@ -296,7 +876,7 @@ class FileFinder(QtCore.QObject):
                     file_details["task"] = context.task
                 else:
                     # try to create a context from the path and see if that contains a task:
-                    wf_ctx = self._app.sgtk.context_from_path(work_path, context)
+                    wf_ctx = context_map.get_context(work_path, context)
                     if wf_ctx and wf_ctx.task:
                         file_details["task"] = wf_ctx.task
 
@@ -307,21 +887,20 @@ class FileFinder(QtCore.QObject):
             file_details["entity"] = context.entity
 
             # File modified details:
-            if not file_details["modified_at"]:
-                try:
-                    modified_at = os.path.getmtime(work_path)
-                    file_details["modified_at"] = datetime.fromtimestamp(
-                        modified_at, tz=sg_timezone.local
-                    )
-                except OSError:
-                    # ignore OSErrors as it's probably a permissions thing!
-                    pass
+            if stat is None and (
+                not file_details["modified_at"] or not file_details["modified_by"]
+            ):
+                stat = self._stat_path(work_path)
 
-            if not file_details["modified_by"]:
-                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(
-                    work_path
+            if not file_details["modified_at"] and stat is not None:
+                file_details["modified_at"] = datetime.fromtimestamp(
+                    stat.st_mtime, tz=sg_timezone.local
                 )
 
+            if not file_details["modified_by"]:
+                # this is resolved for all files at once below:
+                modified_by_details[work_path] = (stat, file_details)
+
             if not file_details["name"]:
                 # make sure all files with the same key have the same name:
                 file_details["name"] = name_map.get_name(
@@ -336,6 +915,7 @@ class FileFinder(QtCore.QObject):
                 "work_details": file_details,
             }
 
+        self._resolve_modified_by_users(modified_by_details)
         return files
 
     def _process_publish_files(
@@ -347,25 +927,151 @@ class FileFinder(QtCore.QObject):
         name_map,
         version_compare_ignore_fields,
         filter_file_key=None,
+        publish_stats=None,
     ):
         """
+        :param sg_publishes: A list of dictionaries with publish details.
+        :param publish_template: The template the publish paths were generated with.
+        :param work_template: The template used to generate the corresponding work paths.
+        :param context: The context for which the publishes are retrieved.
+        :param name_map: A :class:`_FileNameMap` instance.
+        :param version_compare_ignore_fields: A list of template fields to ignore
+                                              when building a key for the file.
+        :param filter_file_key: A unique file 'key' that, if specified, will limit
+                                the returned list of files to just those that match.
+        :param publish_stats: Optional dictionary {path:stat} containing the stat
+                              results for the publish paths as returned by
+                              _stat_paths().  If not specified then the paths will
+                              be stat'ed as needed.
+        returns: A dictionary where keys are (file key, version number) tuples
+                  and values are dictionaries which can be used to instantiate
+                  :class:`FileItem`.
         """
-        files = {}
+        parsed_publishes = self._parse_publish_files(
+            sg_publishes, publish_template, context, publish_stats
+        )
+        return self._project_publish_files(
+            parsed_publishes,
+            publish_template,
+            work_template,
+            context,
+            name_map,
+            version_compare_ignore_fields,
+            filter_file_key,
+        )
 
-        # and add in publish details:
-        ctx_fields = context.as_template_fields(work_template)
+    def _parse_publish_files(
+        self, sg_publishes, publish_template, context, publish_stats=None
+    ):
+        """
+        Extract everything from a list of publishes that doesn't depend on the user the
+        publishes are being found for.  The result can be shared between all users of a
+        search and passed to _project_publish_files() for each one.
+
+        :param sg_publishes: A list of dictionaries with publish details as returned by
+                             _filter_publishes().
+        :param publish_template: The template the publish paths were generated with.
+        :param context: The context for which the publishes are retrieved.
+        :param publish_stats: Optional dictionary {path:stat} containing the stat
+                              results for the publish paths as returned by
+                              _stat_paths().  If not specified then the paths will
+                              be stat'ed as needed.
+        :returns: A list of (publish path, publish fields, file details) tuples, one for
+                  each publish that matches the publish template.  These must not be
+                  modified.
+        """
+        parsed_publishes = []
+        if publish_stats is None:
+            publish_stats = self._stat_paths([p["path"] for p in sg_publishes])
+        # {path:(stat, file details)} for the files that need the last modified user:
+        modified_by_details = {}
+
+        # extract the fields for all publishes in one go:
+        publish_matcher = TemplateMatcher.get(publish_template)
+        all_publish_fields = publish_matcher.get_fields_for_paths(
+            [sg_publish["path"] for sg_publish in sg_publishes]
+        )
 
         for sg_publish in sg_publishes:
-            file_details = {}
-
             # always have a path:
             publish_path = sg_publish["path"]
 
+            publish_fields = all_publish_fields.get(publish_path)
+            if publish_fields is None:
+                # the path doesn't match the publish template
+                continue
+
+            # copy common fields from sg_publish:
+            #
+            file_details = dict(
+                [(k, v) for k, v in six.iteritems(sg_publish) if k != "path"]
+            )
+
+            # get version from fields if not specified in publish file:
+            if file_details["version"] == None:
+                file_details["version"] = publish_fields.get("version", 0)
+
+            # entity
+            file_details["entity"] = context.entity
+
+            # local file modified details:
+            stat = publish_stats.get(publish_path)
+            if stat is not None:
+                file_details["modified_at"] = datetime.fromtimestamp(
+                    stat.st_mtime, tz=sg_timezone.local
+                )
+                # this is resolved for all files at once below:
+                modified_by_details[publish_path] = (stat, file_details)
+            else:
+                # just use the publish info
+                file_details["modified_at"] = sg_publish.get("published_at")
+                file_details["modified_by"] = sg_publish.get("published_by")
+
+            parsed_publishes.append((publish_path, publish_fields, file_details))
+
+        self._resolve_modified_by_users(modified_by_details)
+        return parsed_publishes
+
+    def _project_publish_files(
+        self,
+        parsed_publishes,
+        publish_template,
+        work_template,
+        context,
+        name_map,
+        version_compare_ignore_fields,
+        filter_file_key=None,
+    ):
+        """
+        Build the publish items for a single user from the publishes parsed by
+        _parse_publish_files().  This only resolves the things that depend on the user's
+        context - the work path and file key - and never modifies the parsed publishes.
+
+        :param parsed_publishes: A list of parsed publishes as returned by
+                                 _parse_publish_files().
+        :param publish_template: The template the publish paths were generated with.
+        :param work_template: The template used to generate the corresponding work paths.
+        :param context: The user context for which the publishes are retrieved.
+        :param name_map: A :class:`_FileNameMap` instance.
+        :param version_compare_ignore_fields: A list of template fields to ignore
+                                              when building a key for the file.
+        :param filter_file_key: A unique file 'key' that, if specified, will limit
+                                the returned list of files to just those that match.
+        :returns: A dictionary where keys are (file key, version number) tuples
+                  and values are dictionaries which can be used to instantiate
+                  :class:`FileItem`.
+        """
+        files = {}
+
+        # and add in publish details:
+        ctx_fields = context.as_template_fields(work_template)
+        work_matcher = TemplateMatcher.get(work_template, version_compare_ignore_fields)
+
+        for publish_path, publish_fields, parsed_details in parsed_publishes:
             # determine the work path fields from the publish fields + ctx fields:
             # The order is important as it ensures that the user is correct if the
             # publish file is in a user sandbox but we also need to be careful not
             # to overrwrite fields that are being ignored when comparing work files
-            publish_fields = publish_template.get_fields(publish_path)
             wp_fields = publish_fields.copy()
             for k, v in ctx_fields.items():
                 if k not in version_compare_ignore_fields:
@@ -373,9 +1079,7 @@ class FileFinder(QtCore.QObject):
 
             # build the unique file key for the publish path.  All files that share the same key are considered
             # to be different versions of the same file.
-            file_key = FileItem.build_file_key(
-                wp_fields, work_template, version_compare_ignore_fields
-            )
+            file_key = work_matcher.build_file_key(wp_fields)
             if filter_file_key and file_key != filter_file_key:
                 # we can ignore this file completely!
                 continue
@@ -384,42 +1088,13 @@ class FileFinder(QtCore.QObject):
             work_path = ""
             try:
                 work_path = work_template.apply_fields(wp_fields)
-            except TankError as e:
+            except TankError:
                 # unable to generate a work path - this means we are probably missing a field so it's going to
                 # be a problem matching this publish up with its corresponding work file!
                 work_path = ""
 
-            # copy common fields from sg_publish:
-            #
-            file_details = dict(
-                [(k, v) for k, v in six.iteritems(sg_publish) if k != "path"]
-            )
-
-            # get version from fields if not specified in publish file:
-            if file_details["version"] == None:
-                file_details["version"] = publish_fields.get("version", 0)
-
-            # entity
-            file_details["entity"] = context.entity
-
-            # local file modified details:
-            if os.path.exists(publish_path):
-                try:
-                    modified_at = os.path.getmtime(publish_path)
-                    file_details["modified_at"] = datetime.fromtimestamp(
-                        modified_at, tz=sg_timezone.local
-                    )
-                except OSError:
-                    # ignore OSErrors as it's probably a permissions thing!
-                    pass
-                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(
-                    publish_path
-                )
-            else:
-                # just use the publish info
-                file_details["modified_at"] = sg_publish.get("published_at")
-                file_details["modified_by"] = sg_publish.get("published_by")
-
+            # the parsed details are shared with other users so each user gets its own copy:
+            file_details = dict(parsed_details)
             if not file_details["name"]:
                 # make sure all files with the same key have the same name:
                 file_details["name"] = name_map.get_name(
@@ -436,37 +1111,138 @@ class FileFinder(QtCore.QObject):
                 "publish_path": publish_path,
                 "publish_details": file_details,
             }
+
         return files
 
+    def _resolve_modified_by_users(self, modified_by_details):
+        """
+        Resolve the last modified user for a set of files in one go and update the
+        'modified_by' entry in the details for each file.
+
+        :param modified_by_details: Dictionary {path:(stat, file details)} of the files to
+                                    resolve the user for.  Stat may be None in which case
+                                    the path will be stat'ed.
+        """
+        if not modified_by_details:
+            return
+        users = g_user_cache.get_file_last_modified_users(
+            list(modified_by_details),
+            dict(
+                (path, stat)
+                for path, (stat, _) in six.iteritems(modified_by_details)
+                if stat is not None
+            ),
+        )
+        for path, (_, file_details) in six.iteritems(modified_by_details):
+            file_details["modified_by"] = users.get(path)
+
     def _find_publishes(self, publish_filters):
         """
         Find all publishes for the specified context and publish template
 
+        :param publish_filters:     The Shotgun filters to find the publishes with
         :returns:                   List of dictionaries, each one containing the details
                                     of an individual published file
         """
-        fields = [
-            "id",
-            "description",
-            "version_number",
-            "image",
-            "created_at",
-            "created_by",
-            "name",
-            "path",
-            "task",
-        ]
         published_file_type = sgtk.util.get_published_file_entity_type(self._app.sgtk)
         sg_publishes = self._app.shotgun.find(
-            published_file_type, publish_filters, fields
+            published_file_type, publish_filters, self._publish_fields
         )
         return sg_publishes
 
+    def _get_publish_query_filters(
+        self, publish_template, valid_file_extensions, context
+    ):
+        """
+        Build the additional filters used to narrow down publish queries so that publishes
+        that would be discarded by _filter_publishes() aren't returned in the first place.
+        The query is narrowed to the valid file extensions and to publishes under the part
+        of the publish template that is fixed for the context.
+
+        Publishes without a cached path (e.g. those that aren't in a local storage) can't be
+        narrowed down this way so they are always returned and filtered as normal.
+
+        :param publish_template:        The template the publishes should match
+        :param valid_file_extensions:   The list of valid file extensions, e.g. [".ma", ".mb"]
+        :param context:                 The context the publishes are being found for
+        :returns:                       A list of Shotgun filters.  This will be empty if
+                                        publish queries shouldn't be narrowed down.
+        """
+        if not self._narrow_publish_queries:
+            return []
+
+        filters = []
+        if valid_file_extensions:
+            filters.append(
+                {
+                    "filter_operator": "any",
+                    "filters": [
+                        ["path_cache", "ends_with", ext]
+                        for ext in valid_file_extensions
+                    ]
+                    + [["path_cache", "is", None]],
+                }
+            )
+
+        path_prefix = (
+            self._get_publish_path_prefix(publish_template, context)
+            if publish_template and context
+            else None
+        )
+        if path_prefix:
+            filters.append(
+                {
+                    "filter_operator": "any",
+                    "filters": [
+                        ["path_cache", "contains", path_prefix],
+                        ["path_cache", "is", None],
+                    ],
+                }
+            )
+        return filters
+
+    def _get_publish_path_prefix(self, publish_template, context):
+        """
+        Get the directories at the start of the publish template that are the same for all
+        publishes in the specified context, e.g. 'sequences/Seq01/Shot01/Anim/publish/'
+        for the template 'sequences/{Sequence}/{Shot}/{Step}/publish/{name}.v{version}.ma'.
+
+        :param publish_template:    The publish template to get the prefix for
+        :param context:             The context to resolve template keys from
+        :returns:                   The path prefix relative to the project root, using
+                                    forward slashes, or None if there isn't one
+        """
+        ctx_fields = context.as_template_fields(publish_template)
+        prefix = ""
+        for token in FileFinder._DEFINITION_KEY_RE.split(publish_template.definition):
+            if token.startswith("{"):
+                key = publish_template.keys.get(token[1:-1])
+                if not key or key.name not in ctx_fields:
+                    break
+                try:
+                    prefix += key.str_from_value(ctx_fields[key.name])
+                except TankError:
+                    break
+            elif "[" in token:
+                # optional keys can't be resolved from the context:
+                prefix += token.split("[")[0]
+                break
+            else:
+                prefix += token
+
+        # only use whole directories:
+        prefix = prefix.replace("\\", "/")
+        prefix = prefix[: prefix.rfind("/") + 1].lstrip("/")
+        return prefix or None
+
     def _filter_publishes(self, sg_publishes, publish_template, valid_file_extensions):
         """
         """
-        # build list of publishes to send to the filter_publishes hook:
-        hook_publishes = [{"sg_publish": sg_publish} for sg_publish in sg_publishes]
+        # build list of publishes to send to the filter_publishes hook.  The publishes may be
+        # shared read-only records so the hook is given its own copies that it can modify:
+        hook_publishes = [
+            {"sg_publish": thaw_sg_data(sg_publish)} for sg_publish in sg_publishes
+        ]
 
         # execute the hook - this will return a list of filtered publishes:
         hook_result = self._app.execute_hook(
@@ -481,6 +1257,7 @@ class FileFinder(QtCore.QObject):
 
         # split back out publishes:
         published_files = []
+        publish_matcher = TemplateMatcher.get(publish_template)
         for item in hook_result:
             sg_publish = item.get("sg_publish")
             if not sg_publish:
@@ -502,7 +1279,7 @@ class FileFinder(QtCore.QObject):
                 continue
 
             # make sure path matches the publish template:
-            if not publish_template.validate(path):
+            if publish_matcher.validate_and_get_fields(path) is None:
                 continue
 
             # build file details for this publish:
@@ -513,7 +1290,9 @@ class FileFinder(QtCore.QObject):
             file_details["name"] = sg_publish.get("name")
             file_details["task"] = sg_publish.get("task")
             file_details["publish_description"] = sg_publish.get("description")
-            file_details["thumbnail"] = sg_publish.get("image")
+            if "image" in sg_publish:
+                # if the image wasn't queried then it's found when the thumbnail is needed:
+                file_details["thumbnail"] = sg_publish["image"]
 
             file_details["published_at"] = sg_publish.get("created_at")
             file_details["published_by"] = sg_publish.get("created_by", {})
@@ -530,6 +1309,58 @@ class FileFinder(QtCore.QObject):
 
         return published_files
 
+    def _stat_path(self, path):
+        """
+        :param path:    The path to stat
+        :returns:       The os.stat_result for the path or None if it couldn't be stat'ed
+        """
+        try:
+            return os.stat(path)
+        except OSError:
+            # ignore OSErrors as it's probably a permissions thing or the file doesn't exist!
+            return None
+
+    def _stat_paths(self, paths):
+        """
+        Stat all of the specified paths in a batch.  Paths are grouped by their parent
+        directory so that directories that don't exist only cost a single lookup and
+        directories containing several of the paths are listed once rather than looking
+        up each path individually.
+
+        :param paths:   A list of the paths to stat
+        :returns:       A dictionary {path:stat} containing the os.stat_result for each path
+                        or None if the path doesn't exist or couldn't be stat'ed
+        """
+        paths_by_dir = {}
+        for path in paths:
+            if path:
+                paths_by_dir.setdefault(os.path.dirname(path), set()).add(path)
+
+        stats = {}
+        for dir_path, dir_paths in six.iteritems(paths_by_dir):
+            if len(dir_paths) == 1 or not WorkFileWalker.is_supported():
+                for path in dir_paths:
+                    stats[path] = self._stat_path(path)
+                continue
+
+            try:
+                entries = list(os.scandir(dir_path))
+            except OSError:
+                # the directory doesn't exist so neither do any of the paths in it!
+                for path in dir_paths:
+                    stats[path] = None
+                continue
+
+            for entry in entries:
+                if entry.path in dir_paths:
+                    try:
+                        stats[entry.path] = entry.stat()
+                    except OSError:
+                        pass
+            for path in dir_paths:
+                stats.setdefault(path, None)
+        return stats
+
     def _find_work_files(self, context, work_template, version_compare_ignore_fields):
         """
         Find all work files for the specified context and work template.
@@ -538,18 +1369,186 @@ class FileFinder(QtCore.QObject):
         :param work_template:                   The work template to match found files against
         :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find
                                                 different versions of the same file
-        :returns:                               A list of file paths.
+        :returns:                               A dictionary {path:(stat, fields)} of all the work
+                                                files found - see WorkFileWalker.walk() for
+                                                details.
+        """
+        return dict(
+            self._iter_work_files(context, work_template, version_compare_ignore_fields)
+        )
+
+    def _iter_work_files(
+        self,
+        context,
+        work_template,
+        version_compare_ignore_fields,
+        shared_scan=None,
+        report_progress=False,
+    ):
+        """
+        Find all work files for the specified context and work template, yielding each one
+        as soon as it's found.
+
+        :param context:                         The context to find work files for
+        :param work_template:                   The work template to match found files against
+        :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find
+                                                different versions of the same file
+        :param shared_scan:                     Optional SharedDirectoryScan used to share
+                                                directory listings with other searches
+        :param report_progress:                 If True then None is also yielded as the
+                                                search progresses - see
+                                                WorkFileWalker.iter_walk()
+        :returns:                               A generator yielding (path, (stat, fields)) for
+                                                each work file found.  Stat and fields will be
+                                                None if they weren't gathered whilst searching.
+        """
+        search_fields = self._get_work_file_search_fields(
+            context, work_template, version_compare_ignore_fields
+        )
+        if search_fields is None:
+            return
+        work_fields, skip_fields = search_fields
+        for found_file in self._walk_work_files(
+            work_template, work_fields, skip_fields, shared_scan, report_progress
+        ):
+            yield found_file
+
+    def _iter_sandbox_work_files(
+        self, work_areas, shared_scan=None, report_progress=False
+    ):
+        """
+        Find all work files in the sandboxes of several users with a single walk, yielding
+        each one as soon as it's found together with the user whose sandbox it was found in.
+
+        The user keys in the work template are treated as wildcards and the files found are
+        split between the users by the value of the user keys in their fields.  All work
+        areas must be copies of the same work area for different users.
+
+        :param work_areas:  Dictionary {user id:WorkArea} of the work areas to find files for
+        :param shared_scan: Optional SharedDirectoryScan used to share directory listings
+                            with other searches
+        :param report_progress: If True then None is also yielded as the search progresses -
+                            see WorkFileWalker.iter_walk()
+        :returns:           A generator yielding (user id, path, (stat, fields)) for each work
+                            file found
+        """
+        if not work_areas:
+            return
+        work_template = list(work_areas.values())[0].work_template
+        user_keys = sorted(get_template_user_keys(work_template))
+
+        # find the values of the user keys for each user:
+        user_ids_by_value = {}
+        search_fields = None
+        for user_id, work_area in six.iteritems(work_areas):
+            user_search_fields = self._get_work_file_search_fields(
+                work_area.context,
+                work_template,
+                work_area.version_compare_ignore_fields,
+            )
+            if user_search_fields is None:
+                # there is no sandbox for this user
+                continue
+            work_fields, skip_fields = user_search_fields
+            user_value = tuple(work_fields.get(key) for key in user_keys)
+            user_ids_by_value[user_value] = user_id
+            if search_fields is None:
+                search_fields = (
+                    work_fields,
+                    skip_fields + [key for key in user_keys if key not in skip_fields],
+                )
+        if search_fields is None:
+            return
+        work_fields, skip_fields = search_fields
+
+        matcher = TemplateMatcher.get(work_template)
+        for found_file in self._walk_work_files(
+            work_template, work_fields, skip_fields, shared_scan, report_progress
+        ):
+            if found_file is None:
+                yield None
+                continue
+            path, (stat, fields) = found_file
+            if fields is None:
+                fields = matcher.validate_and_get_fields(path)
+                if fields is None:
+                    continue
+            user_value = tuple(fields.get(key) for key in user_keys)
+            user_id = user_ids_by_value.get(user_value)
+            if user_id is None and user_value not in user_ids_by_value:
+                # this file is in the sandbox of a user we're not interested in
+                continue
+            yield user_id, path, (stat, fields)
+
+    def _walk_work_files(
+        self,
+        work_template,
+        work_fields,
+        skip_fields,
+        shared_scan=None,
+        report_progress=False,
+    ):
+        """
+        Find all work files matching the work template for the specified fields.
+
+        :param work_template:   The work template to match found files against
+        :param work_fields:     Dictionary of fields to find files for
+        :param skip_fields:     List of keys whose values should be treated as wildcards
+        :param shared_scan:     Optional SharedDirectoryScan used to share directory
+                                listings with other searches
+        :param report_progress: If True then None is also yielded as the walk progresses -
+                                see WorkFileWalker.iter_walk()
+        :returns:               A generator yielding (path, (stat, fields)) for each work
+                                file found.  Stat and fields will be None if they weren't
+                                gathered whilst searching.
+        """
+        # find paths - walking the file system in a single pass if we can:
+        if WorkFileWalker.is_supported() and WorkFileWalker.supports_template(
+            work_template
+        ):
+            index = None
+            if self._app.get_setting("index_work_areas", False):
+                index = g_work_file_index
+            walker = WorkFileWalker(work_template, index, shared_scan)
+            for found_file in walker.iter_walk(
+                work_fields,
+                skip_fields,
+                skip_missing_optional_keys=True,
+                report_progress=report_progress,
+            ):
+                yield found_file
+            return
+
+        work_file_paths = self._app.sgtk.paths_from_template(
+            work_template, work_fields, skip_fields, skip_missing_optional_keys=True
+        )
+        for path in work_file_paths:
+            yield path, (None, None)
+
+    def _get_work_file_search_fields(
+        self, context, work_template, version_compare_ignore_fields
+    ):
+        """
+        Get the fields and the keys to skip when searching for work files for the
+        specified context and work template.
+
+        :param context:                         The context to find work files for
+        :param work_template:                   The work template to match found files against
+        :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find
+                                                different versions of the same file
+        :returns:                               A tuple (fields, skip keys) or None if the
+                                                fields couldn't be resolved from the context
         """
         # find work files that match the current work template:
         work_fields = []
         try:
             work_fields = context.as_template_fields(work_template, validate=True)
-        except TankError as e:
+        except TankError:
             # could not resolve fields from this context. This typically happens
             # when the context object does not have any corresponding objects on
             # disk / in the path cache. In this case, we cannot continue with any
             # file system resolution, so just exit early insted.
-            return []
+            return None
 
         # Build list of fields to ignore when looking for files, any missing key
         # is treated as a wildcard, which allows, for example to retrieve all files
@@ -566,11 +1565,7 @@ class FileFinder(QtCore.QObject):
         if "version" not in skip_fields:
             skip_fields += ["version"]
 
-        # find paths:
-        work_file_paths = self._app.sgtk.paths_from_template(
-            work_template, work_fields, skip_fields, skip_missing_optional_keys=True
-        )
-        return work_file_paths
+        return work_fields, skip_fields
 
     def _filter_work_files(self, work_file_paths, valid_file_extensions):
         """
@@ -659,28 +1654,56 @@ class AsyncFileFinder(FileFinder):
             self.aborted = False
 
             self.name_map = FileFinder._FileNameMap()
+            self.context_map = FileFinder._DirectoryContextMap()
 
             self.construct_work_area_task = None
             self.resolve_work_area_task = None
-            self.find_work_files_tasks = set()
+            self.find_work_files_tasks = {}  # task id:[user id]
+            # directory listings shared with the searches begun at the same time:
+            self.shared_scan = None
+            self.work_items = {}  # user id:{(file key, version):FileItem}
             self.load_cached_pubs_task = None
             self.find_publishes_tasks = set()
+            self.processed_publishes = None  # publish id:updated_at
             self.user_work_areas = {}
+            self.publish_work_area = None
+            self.publish_query_filters = []
 
     _FIND_PUBLISHES_PRIORITY, _FIND_FILES_PRIORITY = (20, 40)
 
+    # work files are emitted in chunks whilst searching as soon as either this many have
+    # been found or this many seconds have passed since the last chunk was emitted:
+    _WORK_FILES_CHUNK_SIZE = 200
+    _WORK_FILES_CHUNK_INTERVAL = 0.1
+
     # Signals
     work_area_found = QtCore.Signal(object, object)
     work_area_resolved = QtCore.Signal(object, object)  # search_id, WorkArea
+    # emitted with each chunk of work files as they are found during a search:
+    files_chunk_found = QtCore.Signal(
+        object, object, object
+    )  # search_id, file list, WorkArea
+    # emitted with the complete list of work files once they have all been found:
     files_found = QtCore.Signal(
         object, object, object
     )  # search_id, file list, WorkArea
     publishes_found = QtCore.Signal(
         object, object, object
     )  # search_id, file list, WorkArea
+    # emitted with the publishes that have been added or changed and the ids of the publishes
+    # that have been changed or removed since the publishes were last found for a search:
+    publishes_updated = QtCore.Signal(
+        object, object, object, object
+    )  # search_id, file list, removed publish ids, WorkArea
     search_failed = QtCore.Signal(object, object)  # search_id, message
     search_completed = QtCore.Signal(object)  # search_id
 
+    # internal signal emitted from the background task threads with each chunk of work
+    # items found:
+    _work_items_chunk_found = QtCore.Signal(
+        object, object, object, object
+    )  # search_id, user id, work items, WorkArea
+
     def __init__(self, bg_task_manager, parent=None):
         """
         """
@@ -689,6 +1712,24 @@ class AsyncFileFinder(FileFinder):
         self._searches = {}
         self._available_publish_models = []
 
+        # directory listings shared by the searches begun in the current batch - see
+        # _get_batch_scan():
+        self._batch_scan = None
+
+        # if enabled, publishes for all task searches of the same entity are queried in
+        # one go rather than refreshing the publish model for each search:
+        self._batch_publish_queries = self._app.get_setting(
+            "batch_publish_queries", False
+        )
+        self._pending_publish_searches = []  # search ids waiting for a batched query
+        self._publish_batches = {}  # task id:[search id]
+
+        # work item chunks are emitted from background threads so make sure they are
+        # always handled in the main thread:
+        self._work_items_chunk_found.connect(
+            self._on_work_items_chunk_found, QtCore.Qt.QueuedConnection
+        )
+
         self._bg_task_manager = bg_task_manager
         self._bg_task_manager.task_completed.connect(self._on_background_task_completed)
         self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
@@ -769,6 +1810,7 @@ class AsyncFileFinder(FileFinder):
 
         # construct the new search data:
         search = AsyncFileFinder._SearchData(search_id, entity, users, publish_model)
+        search.shared_scan = self._get_batch_scan()
         self._searches[search.id] = search
 
         # begin the search stage 1:
@@ -800,65 +1842,78 @@ class AsyncFileFinder(FileFinder):
         """
         """
 
-        # 2a. Add tasks to find and filter work files:
+        # create a copy of the work area for each user:
         for user in search.users:
             user_id = user["id"] if user else None
-
-            # create a copy of the work area for this user:
             user_work_area = work_area.create_copy_for_user(user) if user else work_area
             search.user_work_areas[user_id] = user_work_area
+            search.work_items[user_id] = {}
 
-            # find work files:
-            find_work_files_task = self._bg_task_manager.add_task(
-                self._task_find_work_files,
-                group=search.id,
-                priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                task_kwargs={"environment": user_work_area},
-            )
-
-            # filter work files:
-            filter_work_files_task = self._bg_task_manager.add_task(
-                self._task_filter_work_files,
-                group=search.id,
-                priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                upstream_task_ids=[find_work_files_task],
-                task_kwargs={"environment": user_work_area},
-            )
-
-            # build work items:
-            process_work_items_task = self._bg_task_manager.add_task(
-                self._task_process_work_items,
+        # if the work files are in user sandboxes then the sandboxes for all users can be
+        # searched with a single walk, otherwise each user is searched separately:
+        user_ids = list(search.user_work_areas)
+        if len(user_ids) > 1 and work_area.work_area_contains_user_sandboxes:
+            user_id_groups = [user_ids]
+        else:
+            user_id_groups = [[user_id] for user_id in user_ids]
+
+        # 2a. Add tasks to find, filter and process work files.  These are streamed through
+        # in chunks so that the first files can be shown before the whole work area has been
+        # searched:
+        for user_id_group in user_id_groups:
+            find_work_items_task = self._bg_task_manager.add_task(
+                self._task_find_work_items,
                 group=search.id,
                 priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                upstream_task_ids=[filter_work_files_task],
                 task_kwargs={
-                    "environment": user_work_area,
+                    "environments": dict(
+                        (user_id, search.user_work_areas[user_id])
+                        for user_id in user_id_group
+                    ),
                     "name_map": search.name_map,
+                    "context_map": search.context_map,
+                    "search_id": search.id,
+                    "shared_scan": search.shared_scan,
                 },
             )
-            search.find_work_files_tasks.add(process_work_items_task)
+            search.find_work_files_tasks[find_work_items_task] = user_id_group
 
-    def _begin_search_process_publishes(self, search, sg_publishes):
+    def _begin_search_process_publishes(
+        self, search, sg_publishes, removed_publish_ids=None
+    ):
         """
+        Begin filtering and processing publishes for all users of a search.
+
+        :param search:              The _SearchData for the search
+        :param sg_publishes:        The list of publishes to process
+        :param removed_publish_ids: None if sg_publishes contains all publishes for the
+                                    search, otherwise a set of the ids of publishes that
+                                    should be removed from those previously found.  In
+                                    this case, sg_publishes only contains publishes that
+                                    have been added or changed.
         """
         # 3a. Process publishes
-        for user in search.users:
-            user_id = user["id"] if user else None
-            user_work_area = search.user_work_areas[user_id]
+        user_ids = [user["id"] if user else None for user in search.users]
+        if not user_ids:
+            return
 
-            users_publishes = copy.deepcopy(sg_publishes)
+        # filter and parse the publishes once for all users.  The templates and settings
+        # are the same for all user work areas (see WorkArea.create_copy_for_user()) so
+        # any of them can be used:
+        filter_publishes_task = self._bg_task_manager.add_task(
+            self._task_filter_publishes,
+            group=search.id,
+            priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
+            task_kwargs={
+                "environment": search.user_work_areas[user_ids[0]],
+                "sg_publishes": sg_publishes,
+            },
+        )
 
-            # filter publishes:
-            filter_publishes_task = self._bg_task_manager.add_task(
-                self._task_filter_publishes,
-                group=search.id,
-                priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
-                task_kwargs={
-                    "environment": user_work_area,
-                    "sg_publishes": users_publishes,
-                },
-            )
-            # build publish items:
+        for user_id in user_ids:
+            user_work_area = search.user_work_areas[user_id]
+
+            # build publish items for the user from the shared parsed publishes:
             process_publish_items_task = self._bg_task_manager.add_task(
                 self._task_process_publish_items,
                 group=search.id,
@@ -867,6 +1922,7 @@ class AsyncFileFinder(FileFinder):
                 task_kwargs={
                     "environment": user_work_area,
                     "name_map": search.name_map,
+                    "removed_publish_ids": removed_publish_ids,
                 },
             )
 
@@ -882,10 +1938,61 @@ class AsyncFileFinder(FileFinder):
         search.publish_model_refreshed = True
 
         # get any publishes from the publish model:
-        sg_publishes = copy.deepcopy(search.publish_model.get_sg_data())
+        sg_publishes = self._parse_publishes(search.publish_model.get_sg_data())
 
         # and begin processing:
-        self._begin_search_process_publishes(search, sg_publishes)
+        self._begin_search_process_refreshed_publishes(search, sg_publishes)
+
+    def _begin_search_process_refreshed_publishes(self, search, sg_publishes):
+        """
+        Begin processing the publishes found when the publishes for a search have been
+        refreshed.  Only publishes that have been added, changed or removed since the cached
+        publishes were processed are processed again.
+
+        Runs in main thread
+
+        :param search:          The _SearchData for the search
+        :param sg_publishes:    The complete list of refreshed publishes
+        """
+        previous_publishes = search.processed_publishes
+        search.processed_publishes = dict(
+            (sg_publish["id"], sg_publish.get("updated_at"))
+            for sg_publish in sg_publishes
+        )
+        if previous_publishes is None or search.find_publishes_tasks:
+            # either nothing has been processed yet or the cached publishes are still being
+            # processed so the changes can't be applied on top of them - process everything:
+            self._begin_search_process_publishes(search, sg_publishes)
+            return
+
+        changed_publishes = [
+            sg_publish
+            for sg_publish in sg_publishes
+            if sg_publish["id"] not in previous_publishes
+            or previous_publishes[sg_publish["id"]] != sg_publish.get("updated_at")
+        ]
+        deleted_publish_ids = set(previous_publishes) - set(search.processed_publishes)
+        self._app.log_debug(
+            "File Finder: %d publishes added or changed and %d removed for search %s"
+            % (len(changed_publishes), len(deleted_publish_ids), search.id)
+        )
+
+        # changed publishes are removed as well as added in case they no longer represent
+        # the same file:
+        removed_publish_ids = deleted_publish_ids | set(
+            sg_publish["id"]
+            for sg_publish in changed_publishes
+            if sg_publish["id"] in previous_publishes
+        )
+        if not changed_publishes and not removed_publish_ids:
+            # nothing has changed since the cached publishes were processed but the search
+            # may have been waiting for the refresh to complete:
+            self._on_background_search_finished(search.id)
+            return
+
+        self._begin_search_process_publishes(
+            search, changed_publishes, removed_publish_ids
+        )
 
     def _on_publish_model_refresh_failed(self, msg):
         """
@@ -903,6 +2010,10 @@ class AsyncFileFinder(FileFinder):
 
         Runs in main thread
         """
+        if task_id in self._publish_batches:
+            self._on_publish_batch_completed(self._publish_batches.pop(task_id), result)
+            return
+
         if search_id not in self._searches:
             return
         search = self._searches[search_id]
@@ -920,6 +2031,8 @@ class AsyncFileFinder(FileFinder):
                 self.publishes_found.emit(search_id, [], work_area)
                 self.files_found.emit(search_id, [], work_area)
                 search.aborted = True
+                # this search may have been holding back the batched publish queries:
+                self._begin_publish_batches()
                 return
 
             # we have successfully constructed a work area that we can
@@ -938,30 +2051,184 @@ class AsyncFileFinder(FileFinder):
 
         elif task_id == search.load_cached_pubs_task:
             search.load_cached_pubs_task = None
-            # ok so now it's time to load the cached publishes:
-            sg_publishes = self._load_cached_publishes(search, work_area)
-            # begin stage 3 for the un-cached publishes:
-            self._begin_search_process_publishes(search, sg_publishes)
-            # we can also start the background refresh of the publishes model:
-            search.publish_model.refresh()
+            search.publish_query_filters = self._get_publish_query_filters(
+                work_area.publish_template,
+                work_area.valid_file_extensions,
+                work_area.context,
+            )
+            if self._batch_publish_queries and work_area.context.task:
+                # the publishes are found by a batched query rather than by refreshing the
+                # publish model so the model's cache is never updated - rather than showing
+                # stale cached publishes, just wait for the batched query:
+                search.publish_work_area = work_area
+                self._pending_publish_searches.append(search.id)
+            else:
+                # ok so now it's time to load the cached publishes:
+                sg_publishes = self._load_cached_publishes(search, work_area)
+                # remember what was processed so that only changes are processed once the
+                # publishes have been refreshed:
+                search.processed_publishes = dict(
+                    (sg_publish["id"], sg_publish.get("updated_at"))
+                    for sg_publish in sg_publishes
+                )
+                # begin stage 3 for the un-cached publishes:
+                self._begin_search_process_publishes(search, sg_publishes)
+                # we can also start the background refresh of the publishes:
+                search.publish_model.refresh()
+            # this search may have been holding back the batched publish queries:
+            self._begin_publish_batches()
 
         elif task_id in search.find_publishes_tasks:
             search.find_publishes_tasks.remove(task_id)
             # found publishes:
             publish_item_args = result.get("publish_items", {}).values()
             files = [FileItem(**kwargs) for kwargs in publish_item_args]
-            self.publishes_found.emit(search_id, files, work_area)
+            removed_publish_ids = result.get("removed_publish_ids")
+            if removed_publish_ids is None:
+                self.publishes_found.emit(search_id, files, work_area)
+            else:
+                self.publishes_updated.emit(
+                    search_id, files, removed_publish_ids, work_area
+                )
 
         elif task_id in search.find_work_files_tasks:
-            search.find_work_files_tasks.remove(task_id)
-            # found work files:
-            work_item_args = result.get("work_items", {}).values()
-            files = [FileItem(**kwargs) for kwargs in work_item_args]
-            self.files_found.emit(search_id, files, work_area)
+            user_ids = search.find_work_files_tasks.pop(task_id)
+            # all work files have been found and emitted in chunks so emit the complete
+            # list of work files for each user:
+            for user_id in user_ids:
+                files = list(search.work_items.pop(user_id, {}).values())
+                self.files_found.emit(search_id, files, search.user_work_areas[user_id])
+            if not search.find_work_files_tasks:
+                # the scan is released once all searches in its batch have let go of it:
+                search.shared_scan = None
+
+    def _begin_publish_batches(self):
+        """
+        Start the batched publish queries for all searches waiting for one.  Searches are
+        started together for an entity and all of its tasks so the queries are held back
+        until no other search can join the batch, then one query is run for each entity
+        covering all of its tasks.
+
+        Runs in main thread
+        """
+        if not self._pending_publish_searches:
+            return
+        for search in self._searches.values():
+            if search.construct_work_area_task or search.load_cached_pubs_task:
+                # this search may still join a batch
+                return
+
+        # group the waiting searches by entity:
+        searches_by_entity = {}
+        for search_id in self._pending_publish_searches:
+            search = self._searches.get(search_id)
+            if not search:
+                continue
+            entity = (
+                search.publish_work_area.context.entity
+                or search.publish_work_area.context.project
+            )
+            entity_key = (entity["type"], entity["id"])
+            searches_by_entity.setdefault(entity_key, (entity, []))[1].append(search)
+        self._pending_publish_searches = []
+
+        for entity, searches in searches_by_entity.values():
+            tasks = [search.publish_work_area.context.task for search in searches]
+            task_filters = dict(
+                (
+                    search.publish_work_area.context.task["id"],
+                    search.publish_query_filters,
+                )
+                for search in searches
+            )
+            task_id = self._bg_task_manager.add_task(
+                self._task_find_publishes_for_tasks,
+                group=self._bg_task_manager.next_group_id(),
+                priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
+                task_kwargs={
+                    "entity": entity,
+                    "tasks": tasks,
+                    "task_filters": task_filters,
+                },
+            )
+            self._publish_batches[task_id] = [search.id for search in searches]
+
+    def _on_publish_batch_completed(self, search_ids, result):
+        """
+        Split the publishes found by a batched query between the searches they were found
+        for and begin processing them.
+
+        Runs in main thread
+
+        :param search_ids:  The ids of the searches the query was run for
+        :param result:      The result of the query task
+        """
+        sg_publishes_by_task = result.get("sg_publishes_by_task", {})
+        for search_id in search_ids:
+            search = self._searches.get(search_id)
+            if not search:
+                continue
+            search.publish_model_refreshed = True
+            task = search.publish_work_area.context.task
+            sg_publishes = sg_publishes_by_task.get(task["id"], [])
+            self._begin_search_process_refreshed_publishes(search, sg_publishes)
+
+    def _get_batch_scan(self):
+        """
+        Get the directory scan shared by all searches begun in the current batch.  Searches
+        are begun together for an entity and all of its tasks so these are the searches most
+        likely to walk the same directories.  The batch ends when control returns to the
+        event loop so searches begun later, e.g. by a refresh, always list the directories
+        again.  Each search lets go of the scan once its work files have been found.
+
+        Runs in main thread
+
+        :returns:   A SharedDirectoryScan instance
+        """
+        if not self._batch_scan:
+            self._batch_scan = SharedDirectoryScan()
+            QtCore.QTimer.singleShot(0, self._end_scan_batch)
+        return self._batch_scan
+
+    def _end_scan_batch(self):
+        """
+        End the current batch of searches so that the next search begins a new scan.
+        """
+        self._batch_scan = None
+
+    def _on_work_items_chunk_found(self, search_id, user_id, work_items, work_area):
+        """
+        Slot triggered when a chunk of work items has been found by a background task.
+
+        Runs in main thread
+
+        :param search_id:   The id of the search the work items were found for
+        :param user_id:     The id of the user whose sandbox the work items were found in
+        :param work_items:  A dictionary {(file key, version):FileItem kwargs} of the work
+                            items found
+        :param work_area:   The WorkArea the work items were found in
+        """
+        search = self._searches.get(search_id)
+        if not search or user_id not in search.work_items:
+            return
+
+        files = []
+        found_work_items = search.work_items[user_id]
+        for file_key_and_version, kwargs in six.iteritems(work_items):
+            file_item = FileItem(**kwargs)
+            found_work_items[file_key_and_version] = file_item
+            files.append(file_item)
+        self.files_chunk_found.emit(search_id, files, work_area)
 
     def _on_background_task_failed(self, task_id, search_id, msg, stack_trace):
         """
         """
+        if task_id in self._publish_batches:
+            # fail all searches in the batch:
+            for batch_search_id in self._publish_batches.pop(task_id):
+                self._on_background_task_failed(None, batch_search_id, msg, stack_trace)
+            return
+
         if search_id not in self._searches:
             return
         self.stop_search(search_id)
@@ -1011,6 +2278,8 @@ class AsyncFileFinder(FileFinder):
             search.publish_model.clear()
             self._available_publish_models.append(search.publish_model)
         del self._searches[search_id]
+        # this search may have been holding back the batched publish queries:
+        self._begin_publish_batches()
 
     def stop_all_searches(self):
         """
@@ -1020,6 +2289,9 @@ class AsyncFileFinder(FileFinder):
             if search.publish_model:
                 self._available_publish_models.append(search.publish_model)
         self._searches = {}
+        self._batch_scan = None
+        self._pending_publish_searches = []
+        self._publish_batches = {}
 
     ################################################################################################
     ################################################################################################
@@ -1044,6 +2316,31 @@ class AsyncFileFinder(FileFinder):
             environment.resolve_user_sandboxes()
         return {"environment": environment}
 
+    def _parse_publishes(self, sg_publishes):
+        """
+        Convert the publishes returned from Shotgun or the publish model into read-only
+        records.  This is done once for each set of publishes and the records are then
+        shared by reference between all users and stages of a search - anything that needs
+        to change them must create new dictionaries instead.  The records are internal to
+        the finder - hooks are given mutable copies, see _filter_publishes().
+
+        :param sg_publishes:    List of publish dictionaries
+        :returns:               List of ReadOnlyDict publish records
+        """
+        publishes = []
+        for sg_publish in sg_publishes:
+            # convert created_at & updated_at unix time stamps to shotgun std time stamps
+            # for publishes that came from the publish model:
+            for field in ("created_at", "updated_at"):
+                value = sg_publish.get(field)
+                if value and not isinstance(value, datetime):
+                    sg_publish = dict(sg_publish)
+                    sg_publish[field] = datetime.fromtimestamp(
+                        value, sg_timezone.LocalTimezone()
+                    )
+            publishes.append(freeze_sg_data(sg_publish))
+        return publishes
+
     def _load_cached_publishes(self, search, work_area):
         """
         Runs in main thread.
@@ -1057,27 +2354,63 @@ class AsyncFileFinder(FileFinder):
             publish_filters.append(["task", "is", work_area.context.task])
         elif work_area.context.step:
             publish_filters.append(["task.Task.step", "is", work_area.context.step])
-        fields = [
-            "id",
-            "description",
-            "version_number",
-            "image",
-            "created_at",
-            "created_by",
-            "name",
-            "path",
-            "task",
-        ]
-
+        publish_filters.extend(search.publish_query_filters)
         # load the data into the publish model:
-        search.publish_model.load_data(filters=publish_filters, fields=fields)
-        return copy.deepcopy(search.publish_model.get_sg_data())
+        search.publish_model.load_data(
+            filters=publish_filters, fields=self._publish_fields
+        )
+        return self._parse_publishes(search.publish_model.get_sg_data())
+
+    def _task_find_publishes_for_tasks(
+        self, entity, tasks, task_filters=None, **kwargs
+    ):
+        """
+        Find the publishes for several tasks of the same entity with a single query.
+
+        :param entity:          The entity the tasks belong to
+        :param tasks:           A list of the task entity dictionaries to find publishes for
+        :param task_filters:    Optional dictionary {task id:[filters]} of additional filters
+                                the publishes for each task must match
+        :returns:               A dictionary containing the publishes found for each task id
+        """
+        task_filters = task_filters or {}
+        if any(task_filters.values()):
+            # each task has its own filters:
+            publish_filters = [
+                ["entity", "is", entity],
+                {
+                    "filter_operator": "any",
+                    "filters": [
+                        {
+                            "filter_operator": "all",
+                            "filters": [["task", "is", {"type": "Task", "id": t["id"]}]]
+                            + list(task_filters.get(t["id"]) or []),
+                        }
+                        for t in tasks
+                    ],
+                },
+            ]
+        else:
+            publish_filters = [
+                ["entity", "is", entity],
+                ["task", "in", [{"type": "Task", "id": t["id"]} for t in tasks]],
+            ]
+        sg_publishes = self._find_publishes(publish_filters)
+
+        sg_publishes_by_task = {}
+        for sg_publish in self._parse_publishes(sg_publishes):
+            task = sg_publish.get("task")
+            if task:
+                sg_publishes_by_task.setdefault(task["id"], []).append(sg_publish)
+        return {"sg_publishes_by_task": sg_publishes_by_task}
 
     def _task_filter_publishes(self, sg_publishes, environment, **kwargs):
         """
+        Filter and parse the publishes for a search.  This is run once for all users of the
+        search - the result is shared by the _task_process_publish_items task for each user.
         """
         # time.sleep(5)
-        filtered_publishes = []
+        parsed_publishes = []
         if (
             sg_publishes
             and environment
@@ -1085,84 +2418,160 @@ class AsyncFileFinder(FileFinder):
             and environment.context
         ):
 
-            # convert created_at unix time stamp to shotgun std time stamp for all publishes
-            for sg_publish in sg_publishes:
-                created_at = sg_publish.get("created_at")
-                if created_at:
-                    created_at = datetime.fromtimestamp(
-                        created_at, sg_timezone.LocalTimezone()
-                    )
-                    sg_publish["created_at"] = created_at
-
             filtered_publishes = self._filter_publishes(
                 sg_publishes,
                 environment.publish_template,
                 environment.valid_file_extensions,
             )
-        return {"sg_publishes": filtered_publishes}
+            # stat all the publish paths in one go and parse the publishes:
+            parsed_publishes = self._parse_publish_files(
+                filtered_publishes, environment.publish_template, environment.context
+            )
+        return {"parsed_publishes": parsed_publishes}
 
     def _task_process_publish_items(
-        self, sg_publishes, environment, name_map, **kwargs
+        self,
+        parsed_publishes,
+        environment,
+        name_map,
+        removed_publish_ids=None,
+        **kwargs
     ):
         """
+        Build the publish items for a single user from the shared parsed publishes.  The
+        removed publish ids are passed straight through so that the results can be applied
+        as changes to the publishes found previously.
         """
         publish_items = {}
         if (
-            sg_publishes
+            parsed_publishes
             and environment
             and environment.publish_template
             and environment.work_template
             and environment.context
             and name_map
         ):
-            publish_items = self._process_publish_files(
-                sg_publishes,
+            publish_items = self._project_publish_files(
+                parsed_publishes,
                 environment.publish_template,
                 environment.work_template,
                 environment.context,
                 name_map,
                 environment.version_compare_ignore_fields,
             )
-        return {"publish_items": publish_items, "environment": environment}
+        return {
+            "publish_items": publish_items,
+            "environment": environment,
+            "removed_publish_ids": removed_publish_ids,
+        }
 
-    def _task_find_work_files(self, environment, **kwargs):
+    def _task_find_work_items(
+        self,
+        environments,
+        name_map,
+        search_id,
+        context_map=None,
+        shared_scan=None,
+        **kwargs
+    ):
         """
+        Find, filter and process the work files for one or more user work areas.  Work files
+        are passed through each stage in chunks as they are found and the work items for each
+        chunk are emitted straight away rather than waiting for the whole work area to be
+        searched.  If there is more than one work area then the sandboxes for all users are
+        searched in a single walk.
         """
-        work_files = []
-        if environment and environment.context and environment.work_template:
-            work_files = self._find_work_files(
-                environment.context,
-                environment.work_template,
-                environment.version_compare_ignore_fields,
+        environments = dict(
+            (user_id, environment)
+            for user_id, environment in six.iteritems(environments)
+            if environment and environment.context and environment.work_template
+        )
+        if not environments or not name_map:
+            return {}
+
+        if len(environments) == 1:
+            user_id, environment = list(environments.items())[0]
+            found_files = (
+                (user_id,) + found_file if found_file else None
+                for found_file in self._iter_work_files(
+                    environment.context,
+                    environment.work_template,
+                    environment.version_compare_ignore_fields,
+                    shared_scan,
+                    report_progress=True,
+                )
             )
-        return {"work_files": work_files}
-
-    def _task_filter_work_files(self, work_files, environment, **kwargs):
-        """
-        """
-        filtered_work_files = []
-        if work_files:
-            filtered_work_files = self._filter_work_files(
-                work_files, environment.valid_file_extensions
+        else:
+            found_files = self._iter_sandbox_work_files(
+                environments, shared_scan, report_progress=True
             )
-        return {"work_files": filtered_work_files}
 
-    def _task_process_work_items(self, work_files, environment, name_map, **kwargs):
+        # if the search is stopped whilst this task is running then there is no point
+        # searching any further:
+        for found_chunk in self._iter_chunks(
+            found_files,
+            AsyncFileFinder._WORK_FILES_CHUNK_SIZE,
+            AsyncFileFinder._WORK_FILES_CHUNK_INTERVAL,
+            lambda: search_id not in self._searches,
+        ):
+            # split the chunk between the users:
+            found_work_files_by_user = {}
+            for user_id, path, found_file in found_chunk:
+                found_work_files_by_user.setdefault(user_id, {})[path] = found_file
+
+            for user_id, found_work_files in six.iteritems(found_work_files_by_user):
+                environment = environments[user_id]
+                work_files = self._filter_work_files(
+                    found_work_files, environment.valid_file_extensions
+                )
+                if not work_files:
+                    continue
+                work_items = self._process_work_files(
+                    work_files,
+                    environment.work_template,
+                    environment.context,
+                    name_map,
+                    environment.version_compare_ignore_fields,
+                    found_work_files=found_work_files,
+                    context_map=context_map,
+                )
+                if work_items:
+                    self._work_items_chunk_found.emit(
+                        search_id, user_id, work_items, environment
+                    )
+        return {}
+
+    @staticmethod
+    def _iter_chunks(iterable, max_size, max_interval, is_stopped=None):
         """
+        Split the items from an iterable into chunks.  A chunk is complete once it contains
+        max_size items or once max_interval seconds have passed since its first item was
+        added.
+
+        The iterable may also yield None to report progress without an item, e.g. each time
+        a directory has been walked.  This lets a chunk be completed on time and a stopped
+        search be noticed whilst no items are being found.
+
+        :param iterable:        The iterable to split into chunks
+        :param max_size:        The maximum number of items in a chunk
+        :param max_interval:    The maximum time in seconds to wait before completing a chunk
+        :param is_stopped:      Optional callable returning True once no more chunks are
+                                needed
+        :returns:               A generator yielding a list of items for each chunk
         """
-        work_items = {}
-        if (
-            work_files
-            and environment
-            and environment.work_template
-            and environment.context
-            and name_map
-        ):
-            work_items = self._process_work_files(
-                work_files,
-                environment.work_template,
-                environment.context,
-                name_map,
-                environment.version_compare_ignore_fields,
-            )
-        return {"work_items": work_items, "environment": environment}
+        chunk = []
+        chunk_started_at = None
+        for item in iterable:
+            if is_stopped and is_stopped():
+                return
+            if item is not None:
+                if not chunk:
+                    chunk_started_at = time.time()
+                chunk.append(item)
+            if chunk and (
+                len(chunk) >= max_size or time.time() - chunk_started_at >= max_interval
+            ):
+                yield chunk
+                chunk = []
+        if chunk and not (is_stopped and is_stopped()):
+            yield chunk
@@ -16,6 +16,9 @@ import os
 from datetime import datetime, timedelta
 import copy
 
+from .template_matcher import TemplateMatcher
+from .util import thaw_sg_data
+
 
 class FileItem(object):
     """
@@ -24,6 +27,23 @@ class FileItem(object):
     for that file if available.
     """
 
+    # A large number of instances can be created when searching big work areas so
+    # attributes are stored in slots rather than a per-instance dictionary:
+    __slots__ = (
+        "_key",
+        "_is_local",
+        "_path",
+        "_details",
+        "_is_published",
+        "_publish_path",
+        "_publish_details",
+        "_thumbnail_path",
+        "_thumbnail_image",
+        "_badge",
+        "_badge_generated",
+        "_versions",
+    )
+
     @staticmethod
     def build_file_key(fields, template, ignore_fields=None):
         """
@@ -57,41 +77,12 @@ class FileItem(object):
                                 may also contain other fields (e.g. user initials in
                                 the file name).
         :returns:               An immutable 'key' that can be used for comparison and
-                                as the key in a dictionary (e.g. a string).
-        """
-        ignore_fields = ignore_fields or []
-        # always want to ignore 'version' and 'extension' if they are present in the fields
-        # dictionary
-        ignore_fields += ["version", "extension"]
-
-        # populate the file key from the fields passed in that are included in
-        # the template, skipping the ignore fields:
-        file_key = {}
-        template_keys = template.keys
-        for name, value in fields.items():
-            if name in ignore_fields:
-                # skip fields that are explicitly ignored
-                continue
-
-            if name not in template_keys:
-                # skip fields that aren't included in the template
-                continue
-
-            file_key[name] = value
-
-        # add in any 'default' values from the template that aren't explicitely ignored
-        # or weren't specified in the input fields:
-        for key in template_keys.values():
-            if (
-                key.name not in ignore_fields
-                and key.default != None
-                and key.name not in file_key
-            ):
-                file_key[key.name] = key.default
-
-        # return an immutable representation of the sorted dictionary:
-        # e.g. (('sequence', 'Sequence01'), ('shot', 'shot_010'), ('name', 'foo'))
-        return tuple(sorted(file_key.items()))
+                                as the key in a dictionary (e.g. a string).  Keys are
+                                interned so equal keys are usually the same object.
+        """
+        # the matcher precomputes the ignored fields and template defaults once per template
+        # and interns the key so equal keys usually share the same object:
+        return TemplateMatcher.get(template, ignore_fields).build_file_key(fields)
 
     def __init__(
         self,
@@ -115,7 +106,7 @@ class FileItem(object):
         :param publish_details: Dictionary containing additional information about this publish
         :param badge:           QPixmap icon that should be displayed as a badge
         """
-        self._key = key
+        self._key = TemplateMatcher.intern_file_key(key)
 
         self._is_local = is_work_file
         self._path = work_path
@@ -128,12 +119,59 @@ class FileItem(object):
         self._thumbnail_path = None
         self._thumbnail_image = None
 
+        # The badge for this FileItem is generated the first time it's needed, typically
+        # when the item is first displayed - see generate_badges()
         self._badge = None
-        # Generate the badge for this FileIte.  This needs to be done in the main thread
-        # since the badge is a QPixmap.
-        sgtk.platform.current_engine().async_execute_in_main_thread(self.generate_badge)
+        self._badge_generated = False
 
-        self._versions = {}
+        # all versions of a file share the same version table so this is only set once the
+        # versions are known - see the versions property:
+        self._versions = None
+
+    def serialize(self):
+        """
+        Serialize this file so that it can be stored between sessions.  The thumbnail, badge
+        and versions table aren't included as they are rebuilt when the file is used.
+
+        :returns:   A tuple containing only builtin types that can be restored with
+                    FileItem.deserialize()
+        """
+        return (
+            self._key,
+            self._is_local,
+            self._path,
+            thaw_sg_data(self._details),
+            self._is_published,
+            self._publish_path,
+            thaw_sg_data(self._publish_details),
+        )
+
+    @staticmethod
+    def deserialize(data):
+        """
+        Create a FileItem from data returned by serialize().
+
+        :param data:    The serialized file data
+        :returns:       A new FileItem instance
+        """
+        (
+            key,
+            is_work_file,
+            work_path,
+            work_details,
+            is_published,
+            publish_path,
+            publish_details,
+        ) = data
+        return FileItem(
+            key,
+            is_work_file,
+            work_path,
+            work_details,
+            is_published,
+            publish_path,
+            publish_details,
+        )
 
     # ------------------------------------------------------------------------------------------
     # General properties
@@ -206,6 +244,24 @@ class FileItem(object):
 
     thumbnail_path = property(_get_thumbnail_path, _set_thumbnail_path)
 
+    @property
+    def publish_thumbnail_pending(self):
+        """
+        :returns:   True if this is a publish whose thumbnail hasn't been queried from Shotgun
+                    yet, otherwise False
+        """
+        return self._is_published and "thumbnail" not in self._publish_details
+
+    def set_publish_thumbnail_path(self, path):
+        """
+        Set the thumbnail for the publish once it has been queried from Shotgun.
+
+        :param path:    The thumbnail url for the publish or None if it doesn't have one
+        """
+        self._publish_details = dict(self._publish_details, thumbnail=path)
+        # make sure the thumbnail path is re-evaluated:
+        self._thumbnail_path = None
+
     # @property
     def _get_thumbnail(self):
         """
@@ -226,27 +282,136 @@ class FileItem(object):
     def _get_versions(self):
         """
         :returns:   A dictionary of {version:FileItem} containing a map of all other
-                    versions of this file
+                    versions of this file.  This is typically shared by all versions of
+                    the file so it shouldn't be modified.
         """
+        if self._versions is None:
+            return {}
         return self._versions
 
     # @versions.setter
     def _set_versions(self, value):
         """
         :param value:   A dictionary of {version:FileItem} pairs that represent all other
-                        versions of this file
+                        versions of this file.  This isn't copied so the same dictionary can
+                        be shared by all versions of the file.
         """
         self._versions = value
 
     versions = property(_get_versions, _set_versions)
 
+    # badge pixmaps generated for badge colours, shared by all file items:
+    _badge_pixmaps = {}  # QColor.rgba():QPixmap
+
+    @staticmethod
+    def generate_badges(file_items):
+        """
+        Generate the badges for a list of file items with a single call to the get_badge hook.
+        Badges that have already been generated are not generated again.
+
+        Note, this must be called from the main thread as badges are QPixmaps.
+
+        :param file_items:  A list of FileItem instances to generate badges for
+        """
+        # skip any that have already been generated or that are in the list more than once:
+        file_items = list(
+            dict((id(f), f) for f in file_items if not f._badge_generated).values()
+        )
+        if not file_items:
+            return
+
+        app = sgtk.platform.current_bundle()
+        badge_requests = []
+        for file_item in file_items:
+            if file_item._is_local:
+                badge_requests.append(
+                    {
+                        "work_file_details": file_item._details,
+                        "work_file_path": file_item._path,
+                    }
+                )
+            elif file_item._is_published:
+                badge_requests.append(
+                    {
+                        "publish_details": file_item._publish_details,
+                        "publish_path": file_item._publish_path,
+                    }
+                )
+            else:
+                badge_requests.append({})
+
+        badges = None
+        try:
+            badges = app.execute_hook_method(
+                "hook_get_badge", "get_badges", files=badge_requests
+            )
+        except Exception:
+            # Capture exceptions raised here and log them, so as not to break
+            # the app if the hook fails.
+            app.logger.warning(
+                "Exception raised when getting badges for %d files - falling back to "
+                "getting badges one file at a time" % len(file_items),
+                exc_info=True,
+            )
+        if not isinstance(badges, list) or len(badges) != len(file_items):
+            badges = [file_item._get_badge() for file_item in file_items]
+
+        for file_item, badge in zip(file_items, badges):
+            if isinstance(badge, QtGui.QColor):
+                # If the hook returned a QColor, we'll use a dot badge of that color.
+                badge = FileItem._get_badge_pixmap(badge)
+            file_item._badge = badge
+            file_item._badge_generated = True
+
+    @staticmethod
+    def _get_badge_pixmap(badge_color):
+        """
+        Get the badge pixmap for a badge color, generating it with the get_badge hook if it
+        hasn't been generated before.
+
+        :param badge_color: The QColor to get the badge pixmap for
+        :returns:           The QPixmap for the badge or None if it couldn't be generated
+        """
+        color_key = badge_color.rgba()
+        badge = FileItem._badge_pixmaps.get(color_key)
+        if badge is not None:
+            return badge
+
+        app = sgtk.platform.current_bundle()
+        try:
+            badge = app.execute_hook_method(
+                "hook_get_badge", "generate_badge_pixmap", badge_color=badge_color
+            )
+        except Exception:
+            # Capture exceptions raised here and log them, so as not to break
+            # the app if the hook fails.
+            app.logger.warning(
+                "Exception raised in hook while executing generate_badge_pixmap.",
+                exc_info=True,
+            )
+            return None
+        FileItem._badge_pixmaps[color_key] = badge
+        return badge
+
     def generate_badge(self):
-        self._badge = None
+        """
+        Generate the badge for this file item.  See generate_badges() for details.
+        """
+        self._badge_generated = False
+        FileItem.generate_badges([self])
+
+    def _get_badge(self):
+        """
+        Get the badge for this file item by calling the single file get_badge hook methods.
+
+        :returns:   The QPixmap or QColor returned by the hook or None
+        """
+        badge = None
         app = sgtk.platform.current_bundle()
         if self._is_local:
             # We're a work file - get the badge for the work file from the hook:
             try:
-                self._badge = app.execute_hook_method(
+                badge = app.execute_hook_method(
                     "hook_get_badge",
                     "get_work_file_badge",
                     work_file_details=self._details,
@@ -263,7 +428,7 @@ class FileItem(object):
         elif self._is_published:
             # We're a publish - get the badge for the publish from the hook:
             try:
-                self._badge = app.execute_hook_method(
+                badge = app.execute_hook_method(
                     "hook_get_badge",
                     "get_publish_badge",
                     publish_details=self._publish_details,
@@ -277,27 +442,16 @@ class FileItem(object):
                     % (self._publish_path, self._publish_details),
                     exc_info=True,
                 )
-
-        if isinstance(self._badge, QtGui.QColor):
-            # If the hook returned a QColor, we'll create a dot badge of that color.
-            try:
-                self._badge = app.execute_hook_method(
-                    "hook_get_badge", "generate_badge_pixmap", badge_color=self._badge
-                )
-            except Exception:
-                # Capture exceptions raised here and log them, so as not to break
-                # the app if the hook fails.
-                app.logger.warning(
-                    "Exception raised in hook while executing generate_badge_pixmap.",
-                    exc_info=True,
-                )
+        return badge
 
     @property
     def badge(self):
         """
         :returns:   The QPixmap to be used as a badge when displaying this file
-                to the user.
+                to the user.  The badge is generated the first time it's requested.
         """
+        if not self._badge_generated:
+            self.generate_badge()
         return self._badge
 
     @badge.setter
@@ -307,6 +461,14 @@ class FileItem(object):
                         to the user.
         """
         self._badge = value
+        self._badge_generated = True
+
+    @property
+    def badge_generated(self):
+        """
+        :returns:   True if the badge for this file has been generated, otherwise False
+        """
+        return self._badge_generated
 
     # ------------------------------------------------------------------------------------------
     # Work file properties
@@ -410,10 +572,21 @@ class FileItem(object):
         :param publish: A FileItem representing the publish details that this instance should
                         be updated with
         """
+        thumbnail_path = self._publish_details.get("thumbnail")
+        published_file_id = self.published_file_id
+
         self._is_published = publish._is_published
         self._publish_path = publish._publish_path
         self._publish_details = copy.deepcopy(publish._publish_details or {})
+        if (
+            publish.publish_thumbnail_pending
+            and thumbnail_path
+            and self.published_file_id == published_file_id
+        ):
+            # keep the thumbnail that was already queried for the same publish:
+            self._publish_details["thumbnail"] = thumbnail_path
         self._badge = publish._badge
+        self._badge_generated = publish._badge_generated
 
     def update_from_work_file(self, work_file):
         """
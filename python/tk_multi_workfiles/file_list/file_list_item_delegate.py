@@ -15,9 +15,10 @@ import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
 from ..file_model import FileModel
+from ..file_item import FileItem
 from .file_group_widget import FileGroupWidget
 from .file_widget import FileWidget
-from ..util import get_model_data, get_model_str
+from ..util import get_model_data, get_model_str, get_source_model
 from ..framework_qtwidgets import GroupedListViewItemDelegate
 
 
@@ -31,6 +32,16 @@ class FileListItemDelegate(GroupedListViewItemDelegate):
         self._item_widget = None
         self._folder_icon = QtGui.QPixmap(":/tk-multi-workfiles2/folder_512x400.png")
 
+        # badges are generated and thumbnails requested in batches for the files that are
+        # painted without them:
+        self._pending_badge_items = []
+        self._pending_thumbnail_items = []
+        self._thumbnail_model = None
+        self._paint_request_timer = QtCore.QTimer(self)
+        self._paint_request_timer.setSingleShot(True)
+        self._paint_request_timer.setInterval(0)
+        self._paint_request_timer.timeout.connect(self._on_paint_request_timer_timeout)
+
     def create_group_widget(self, parent):
         return FileGroupWidget(parent)
 
@@ -68,6 +79,7 @@ class FileListItemDelegate(GroupedListViewItemDelegate):
 
             is_publish = False
             is_editable = True
+            badge = None
             show_subtitle = True
             file_item = get_model_data(model_index, FileModel.FILE_ITEM_ROLE)
             if file_item:
@@ -81,7 +93,14 @@ class FileListItemDelegate(GroupedListViewItemDelegate):
 
                 # retrieve the icon:
                 icon = file_item.thumbnail
-                badge = file_item.badge
+                if file_item.badge_generated:
+                    badge = file_item.badge
+                else:
+                    # generate the badge along with any others needed for this paint:
+                    self._request_badge(file_item)
+                if file_item.publish_thumbnail_pending:
+                    # the thumbnail for this publish hasn't been queried yet:
+                    self._request_thumbnail(file_item, model_index)
                 is_publish = file_item.is_published
                 is_editable = file_item.editable
 
@@ -106,6 +125,50 @@ class FileListItemDelegate(GroupedListViewItemDelegate):
             style_options.state & QtGui.QStyle.State_Selected
         ) == QtGui.QStyle.State_Selected
 
+    def _request_badge(self, file_item):
+        """
+        Request that the badge is generated for a file item.  Badges are generated for all
+        requested items in one go once the current paint has finished.
+
+        :param file_item:   The FileItem to generate the badge for
+        """
+        self._pending_badge_items.append(file_item)
+        if not self._paint_request_timer.isActive():
+            self._paint_request_timer.start()
+
+    def _request_thumbnail(self, file_item, model_index):
+        """
+        Request that the thumbnail is queried for a publish.  Thumbnails are requested for
+        all publishes painted without one in one go once the current paint has finished.
+
+        :param file_item:   The FileItem to request the thumbnail for
+        :param model_index: The QModelIndex the file item is being painted for
+        """
+        model = get_source_model(model_index.model())
+        if not isinstance(model, FileModel):
+            return
+        self._thumbnail_model = model
+        self._pending_thumbnail_items.append(file_item)
+        if not self._paint_request_timer.isActive():
+            self._paint_request_timer.start()
+
+    def _on_paint_request_timer_timeout(self):
+        """
+        Slot triggered to generate the badges and request the thumbnails needed whilst
+        painting.  The view is repainted so that the badges are displayed - thumbnails are
+        updated in the model once they have been downloaded.
+        """
+        badge_items = self._pending_badge_items
+        self._pending_badge_items = []
+        thumbnail_items = self._pending_thumbnail_items
+        self._pending_thumbnail_items = []
+
+        if thumbnail_items and self._thumbnail_model:
+            self._thumbnail_model.request_publish_thumbnails(thumbnail_items)
+        if badge_items:
+            FileItem.generate_badges(badge_items)
+            self.view.viewport().update()
+
     def sizeHint(self, style_options, model_index):
         """
         """
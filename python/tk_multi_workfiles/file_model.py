@@ -8,7 +8,7 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-import weakref
+import os
 
 import sgtk
 from tank_vendor import six
@@ -17,6 +17,7 @@ from sgtk.platform.qt import QtGui, QtCore
 from .file_finder import AsyncFileFinder
 from .user_cache import g_user_cache
 from .file_search_cache import FileSearchCache
+from .work_area_watcher import WorkAreaWatcher
 
 shotgun_data = sgtk.platform.import_framework(
     "tk-framework-shotgunutils", "shotgun_data"
@@ -333,22 +334,58 @@ class FileModel(QtGui.QStandardItemModel):
         self._current_users = [g_user_cache.current_user]
 
         self._in_progress_searches = {}
-        self._search_cache = FileSearchCache()
+        # the background task restoring cached results from the persistent cache:
+        self._restore_cache_task = None
+        # self._watcher_tasks[task_id] = (group_key, set(changed path), work_area)
+        self._watcher_tasks = {}
+        self._search_cache = FileSearchCache(
+            self._app.get_setting("file_search_cache_size", 0),
+            self._app.get_setting("file_search_cache_ttl", 0),
+            self._app.get_setting("persist_file_search_cache", False),
+        )
 
-        # self._current_item_map[search_id][file.key][file.version] = model._FileModelItem
+        # self._group_map[group_key] = model._GroupModelItem
+        self._group_map = {}
+        # self._current_item_map[group_key][file.key][file.version] = model._FileModelItem
         self._current_item_map = {}
         # self._pending_thumbnail_requests[request_id] = (group_key, file_key, file_version)
         self._pending_thumbnail_requests = {}
+        # self._pending_thumbnail_url_requests[request_id][published file id] = set((file.key, file.version))
+        self._pending_thumbnail_url_requests = {}
+
+        self._bg_task_manager = bg_task_manager
+        self._bg_task_manager.task_completed.connect(self._on_background_task_completed)
+        self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
 
         # we'll need a file finder to be able to find files:
         self._finder = AsyncFileFinder(bg_task_manager, self)
+        self._finder.files_chunk_found.connect(self._on_finder_files_chunk_found)
         self._finder.files_found.connect(self._on_finder_files_found)
         self._finder.publishes_found.connect(self._on_finder_publishes_found)
+        self._finder.publishes_updated.connect(self._on_finder_publishes_updated)
         self._finder.search_completed.connect(self._on_finder_search_completed)
         self._finder.search_failed.connect(self._on_finder_search_failed)
         self._finder.work_area_resolved.connect(self._on_finder_work_area_resolved)
         self._finder.work_area_found.connect(self._on_finder_work_area_found)
 
+        # optionally watch the work areas of groups in the model so that they are kept
+        # up-to-date without having to search for files again:
+        self._watcher = None
+        if (
+            self._app.get_setting("watch_work_areas", False)
+            and WorkAreaWatcher.is_supported()
+        ):
+            try:
+                self._watcher = WorkAreaWatcher(bg_task_manager, self)
+            except OSError as e:
+                self._app.log_debug("File Model: Unable to watch work areas: %s" % e)
+            else:
+                self._watcher.work_area_changed.connect(
+                    self._on_watcher_work_area_changed
+                )
+                self._watcher.files_changed.connect(self._on_watcher_files_changed)
+                self._watcher.watch_overflowed.connect(self.async_refresh)
+
     def destroy(self):
         """
         Called to clean-up and shutdown any internal objects when the model has been finished
@@ -357,21 +394,42 @@ class FileModel(QtGui.QStandardItemModel):
         # clear the model:
         self.clear()
 
+        if self._bg_task_manager:
+            for task_id in self._watcher_tasks:
+                self._bg_task_manager.stop_task(task_id)
+            self._watcher_tasks = {}
+            self._bg_task_manager.task_completed.disconnect(
+                self._on_background_task_completed
+            )
+            self._bg_task_manager.task_failed.disconnect(
+                self._on_background_task_failed
+            )
+            self._bg_task_manager = None
+
         # stop the data retriever:
         if self._sg_data_retriever:
             self._sg_data_retriever.stop()
             self._sg_data_retriever.deleteLater()
             self._sg_data_retriever = None
 
-        # clean up the cache:
+        # stop watching work areas:
+        if self._watcher:
+            self._watcher.shut_down()
+            self._watcher.deleteLater()
+            self._watcher = None
+
+        # clean up the cache - changed entries are stored in the persistent cache as
+        # searches complete (see _save_search_cache()) so there is nothing left to store:
         if self._search_cache:
             self._search_cache.clear()
             self._search_cache = None
 
         # disconnect and clean up the file finder:
         if self._finder:
+            self._finder.files_chunk_found.disconnect(self._on_finder_files_chunk_found)
             self._finder.files_found.disconnect(self._on_finder_files_found)
             self._finder.publishes_found.disconnect(self._on_finder_publishes_found)
+            self._finder.publishes_updated.disconnect(self._on_finder_publishes_updated)
             self._finder.search_completed.disconnect(self._on_finder_search_completed)
             self._finder.search_failed.disconnect(self._on_finder_search_failed)
             self._finder.work_area_resolved.disconnect(
@@ -395,6 +453,21 @@ class FileModel(QtGui.QStandardItemModel):
         """
         return self._search_cache.find_file_versions(work_area, key, clean_only)
 
+    def get_cached_latest_versions(self, key, work_area, clean_only=False):
+        """
+        Return the latest cached versions for the specified file key and work area.  The same
+        caveats apply as for get_cached_file_versions().
+
+        :param key:         The unique file key to find the latest versions for
+        :param work_area:   A WorkArea instance to find the latest versions for
+        :param clean_only:  If true then the latest versions will only be returned if the cache
+                            is up-to-date.
+        :returns:           A tuple (max version, max local version, max publish version) or
+                            None if there are no cached results for the work area.  Each version
+                            is None if no files of that kind were found.
+        """
+        return self._search_cache.find_latest_versions(work_area, key, clean_only)
+
     def items_from_file(self, file_item, ignore_version=False):
         """
         Find the model item(s) for the specified file item.
@@ -431,8 +504,10 @@ class FileModel(QtGui.QStandardItemModel):
         # update groups:
         self._update_groups()
 
-        # start searches for all items/users in the model:
-        self._start_searches()
+        # start searches for all items/users in the model that aren't up-to-date once any
+        # results stored by a previous session have been restored:
+        if not self._restore_cached_results():
+            self._start_searches(skip_up_to_date=True)
 
     # Interface for modifying the users in the model:
     def set_users(self, users):
@@ -461,8 +536,10 @@ class FileModel(QtGui.QStandardItemModel):
         # update groups:
         self._update_groups()
 
-        # start searches for all items/users in the model:
-        self._start_searches()
+        # start searches for all items/users in the model that aren't up-to-date once any
+        # results stored by a previous session have been restored:
+        if not self._restore_cached_results():
+            self._start_searches(skip_up_to_date=True)
 
     def async_refresh(self):
         """
@@ -486,9 +563,14 @@ class FileModel(QtGui.QStandardItemModel):
         # in pre-1.1.2 PySide that can result in crashes!
         self._clear_children_r(self.invisibleRootItem())
 
-        # clean up the current-item map
+        # clean up the group and current-item maps
+        self._group_map = {}
         self._current_item_map = {}
 
+        # and stop watching any work areas:
+        if self._watcher:
+            self._watcher.clear()
+
     # ------------------------------------------------------------------------------------------
     # protected methods
 
@@ -577,26 +659,43 @@ class FileModel(QtGui.QStandardItemModel):
         else:
             return (entity_dict.get("type"), entity_dict.get("id"))
 
-    def _start_searches(self):
+    def _start_searches(self, skip_up_to_date=False):
         """
         Start all searches for all users that should be presented in the model.
+
+        :param skip_up_to_date: If True then searches are skipped for entities whose cached
+                                results are still up-to-date for all users
         """
         if not self._current_searches:
             # nothing to do!
             return
 
         # get existing groups:
-        group_map = {}
-        for group_item in self._group_items():
-            group_map[group_item.key] = group_item
+        group_map = dict(self._group_map)
 
         for search in self._current_searches:
             if not search.entity:
                 continue
 
+            entity_key = self._gen_entity_key(search.entity)
+            if skip_up_to_date and all(
+                self._search_cache.is_up_to_date(search.entity, user)
+                for user in self._current_users
+            ):
+                # the cached results are recent enough that there's no need to search:
+                self._app.log_debug(
+                    "File Model: Using up-to-date results for %s" % search.name
+                )
+                for user in self._current_users:
+                    group_key = (entity_key, self._gen_entity_key(user))
+                    group_item = group_map.get(group_key)
+                    if group_item:
+                        group_item.set_search_status(FileModel.SEARCH_COMPLETED)
+                        self._watch_group_work_area(group_item)
+                continue
+
             # update all existing group items for this entity and all users to indicate
             # that we are searching for files
-            entity_key = self._gen_entity_key(search.entity)
             for user in self._current_users:
                 user_key = self._gen_entity_key(user)
                 group_key = (entity_key, user_key)
@@ -612,10 +711,100 @@ class FileModel(QtGui.QStandardItemModel):
             self._in_progress_searches[search_id] = search
             self._app.log_debug("File Model: Started search %d..." % search_id)
 
+    def _restore_cached_results(self):
+        """
+        Start a background task to restore the cached results for all searches and users that
+        should be presented in the model from the persistent search cache.  The searches are
+        started when the task completes - see _on_background_task_completed().
+
+        :returns:   True if the task was started or False if there are no results to restore
+        """
+        entities_and_users = [
+            (search.entity, user)
+            for search in self._current_searches
+            if search.entity
+            for user in self._current_users
+            if self._search_cache.needs_restore(search.entity, user)
+        ]
+        if not entities_and_users:
+            return False
+
+        self._restore_cache_task = self._bg_task_manager.add_task(
+            self._search_cache.restore,
+            group=self._bg_task_manager.next_group_id(),
+            task_kwargs={"entities_and_users": entities_and_users},
+        )
+        return True
+
+    def _on_background_task_completed(self, task_id, group, result):
+        """
+        Slot triggered when a background task completes.  Populates the groups with the
+        results restored from the persistent search cache and then starts the searches.
+
+        :param task_id: The id of the task that completed
+        :param group:   The group the task belongs to
+        :param result:  The result of the task - the list of (entity, user) tuples that
+                        results were restored for
+        """
+        if task_id in self._watcher_tasks:
+            group_key, paths, work_area = self._watcher_tasks.pop(task_id)
+            self._on_watched_files_found(group_key, paths, work_area, result)
+            return
+        if task_id != self._restore_cache_task:
+            return
+        self._restore_cache_task = None
+
+        # add any groups that are now needed:
+        self._update_groups()
+
+        # and populate the existing groups that were added before their results were restored:
+        for entity, user in result:
+            group_key = (self._gen_entity_key(entity), self._gen_entity_key(user))
+            group_item = self._group_map.get(group_key)
+            if not group_item or self._current_item_map.get(group_key):
+                continue
+            cached_result = self._search_cache.find(entity, user)
+            if cached_result:
+                files, work_area = cached_result
+                self._process_files(files, work_area, group_item)
+                group_item.work_area = work_area
+
+        self._start_searches(skip_up_to_date=True)
+
+    def _on_background_task_failed(self, task_id, group, msg, stack_trace):
+        """
+        Slot triggered when a background task fails.  If the results can't be restored from
+        the persistent search cache then the searches are started straight away.  If the
+        changed files in a watched work area can't be found then the group is left as it is
+        and its cache entry stays dirty.
+
+        :param task_id:     The id of the task that failed
+        :param group:       The group the task belongs to
+        :param msg:         The error message
+        :param stack_trace: The stack trace of the error
+        """
+        if self._watcher_tasks.pop(task_id, None):
+            self._app.log_debug(
+                "File Model: Failed to find changed files: %s\n%s" % (msg, stack_trace)
+            )
+            return
+        if task_id != self._restore_cache_task:
+            return
+        self._restore_cache_task = None
+        self._app.log_debug(
+            "File Model: Failed to restore cached results: %s\n%s" % (msg, stack_trace)
+        )
+        self._start_searches(skip_up_to_date=True)
+
     def _stop_in_progress_searches(self):
         """
         Stop all in-progress searches
         """
+        # stop restoring cached results as the searches they were restored for have changed:
+        if self._restore_cache_task is not None:
+            self._bg_task_manager.stop_task(self._restore_cache_task)
+            self._restore_cache_task = None
+
         search_ids = list(self._in_progress_searches)
         self._in_progress_searches = {}
         for search_id in search_ids:
@@ -625,6 +814,9 @@ class FileModel(QtGui.QStandardItemModel):
         for request_id in self._pending_thumbnail_requests:
             self._sg_data_retriever.stop_work(request_id)
         self._pending_thumbnail_requests = {}
+        for request_id in self._pending_thumbnail_url_requests:
+            self._sg_data_retriever.stop_work(request_id)
+        self._pending_thumbnail_url_requests = {}
 
     def _update_groups(self):
         """
@@ -637,9 +829,7 @@ class FileModel(QtGui.QStandardItemModel):
         model.
         """
         # get existing groups:
-        group_map = {}
-        for group_item in self._group_items():
-            group_map[group_item.key] = group_item
+        group_map = dict(self._group_map)
 
         valid_group_keys = set()
         if self._current_searches and self._current_users:
@@ -686,6 +876,7 @@ class FileModel(QtGui.QStandardItemModel):
                                 search.name, group_key
                             )
                             self.insertRow(previous_valid_row + 1, group_item)
+                            self._group_map[group_key] = group_item
 
                             if cached_result:
                                 # we have a cached result so populate the group:
@@ -709,9 +900,10 @@ class FileModel(QtGui.QStandardItemModel):
         for group_key, group_item in six.iteritems(group_map):
             if group_key not in valid_group_keys:
                 self._safe_remove_row(group_item.row())
-
-        # and clean up the file-to-item map:
-        self._cleanup_current_item_map()
+                del self._group_map[group_key]
+                self._current_item_map.pop(group_key, None)
+                if self._watcher:
+                    self._watcher.unwatch(group_key)
 
     def _update_group_child_entity_items(self, parent_item, child_details):
         """
@@ -769,7 +961,14 @@ class FileModel(QtGui.QStandardItemModel):
             parent_item.appendRows(new_rows)
 
     def _process_files(
-        self, files, work_area, group_item, have_local=True, have_publishes=True
+        self,
+        files,
+        work_area,
+        group_item,
+        have_local=True,
+        have_publishes=True,
+        keep_existing=False,
+        removed_publish_ids=None,
     ):
         """
         Update the file items under the specified parent.  This adds/removes/updates file model items
@@ -788,17 +987,48 @@ class FileModel(QtGui.QStandardItemModel):
         :param group_item:      The _GroupModelItem the files should be updated for
         :param have_local:      True if the files list contains details about work files, false otherwise
         :param have_publishes:  True if the files list contains details about publishes, false otherwise
+        :param keep_existing:   True if the files list is only a partial list of the files found so
+                                existing items should never be removed, False otherwise
+        :param removed_publish_ids: Optional set of publish ids that are no longer valid.  Existing
+                                publishes with these ids are removed (or just marked as not published
+                                if they are also work files) unless they are in the files list.  This
+                                is used together with keep_existing to apply changes to the existing
+                                publishes.
         """
         if not have_local and not have_publishes:
             # nothing to do then!
             return
 
+        # find the existing items that these files may affect.  When keeping existing items, only
+        # the items for the files in the list and any removed publishes can change so the rest of
+        # the group doesn't need to be looked at:
+        file_map = self._current_item_map.get(group_item.key, {})
+        if keep_existing:
+            existing_model_items = []
+            for file_item in files:
+                model_item = file_map.get(file_item.key, {}).get(file_item.version)
+                if model_item is not None:
+                    existing_model_items.append(model_item)
+            if removed_publish_ids:
+                existing_model_items.extend(
+                    model_item
+                    for version_map in six.itervalues(file_map)
+                    for model_item in six.itervalues(version_map)
+                    if model_item.file_item.published_file_id in removed_publish_ids
+                )
+        else:
+            existing_model_items = [
+                model_item
+                for version_map in six.itervalues(file_map)
+                for model_item in six.itervalues(version_map)
+            ]
+
         # get details about existing items:
         existing_file_item_map = {}
         prev_local_file_versions = set()
         prev_publish_file_versions = set()
 
-        for model_item in self._file_items(group_item):
+        for model_item in existing_model_items:
             file_item = model_item.file_item
             file_version_key = (file_item.key, file_item.version)
             existing_file_item_map[file_version_key] = (file_item, model_item)
@@ -807,9 +1037,24 @@ class FileModel(QtGui.QStandardItemModel):
             if file_item.is_published:
                 prev_publish_file_versions.add(file_version_key)
 
+        # find any existing publishes that are no longer valid:
+        removed_publish_file_versions = set()
+        if removed_publish_ids:
+            removed_publish_file_versions = set(
+                k
+                for k in prev_publish_file_versions
+                if existing_file_item_map[k][0].published_file_id in removed_publish_ids
+            )
+
         # build a list of existing files that we should keep in the model:
         file_versions_to_keep = set()
-        if have_local and not have_publishes:
+        if keep_existing:
+            # keep everything - more files are still to come - apart from removed publishes
+            # that aren't also work files:
+            file_versions_to_keep = set(existing_file_item_map) - (
+                removed_publish_file_versions - prev_local_file_versions
+            )
+        elif have_local and not have_publishes:
             # keep all publishes that aren't local
             file_versions_to_keep = prev_publish_file_versions
         elif not have_local and have_publishes:
@@ -825,12 +1070,17 @@ class FileModel(QtGui.QStandardItemModel):
 
         # match files against existing items:
         files_to_add = []
+        found_file_versions = set()
         for file_item in files:
             file_version_key = (file_item.key, file_item.version)
+            found_file_versions.add(file_version_key)
             current_file, model_item = existing_file_item_map.get(
                 file_version_key, (None, None)
             )
-            if current_file and model_item:
+            if current_file is file_item:
+                # this file was already added when processing a previous chunk
+                pass
+            elif current_file and model_item:
                 # update the existing file:
                 if file_item.is_published:
                     current_file.update_from_publish(file_item)
@@ -846,24 +1096,7 @@ class FileModel(QtGui.QStandardItemModel):
 
             # if this is from a published file then we want to retrieve the thumbnail
             # if one is available:
-            if (
-                file_item.is_published
-                and file_item.thumbnail_path
-                and not file_item.thumbnail
-            ):
-                # request the thumbnail using the data retriever:
-                request_id = self._sg_data_retriever.request_thumbnail(
-                    file_item.thumbnail_path,
-                    self._published_file_type,
-                    file_item.published_file_id,
-                    "image",
-                    load_image=True,
-                )
-                self._pending_thumbnail_requests[request_id] = (
-                    group_item.key,
-                    file_item.key,
-                    file_item.version,
-                )
+            self._request_thumbnail(file_item, group_item.key)
 
         # figure out if any existing items are no longer needed:
         valid_file_versions = set(valid_files)
@@ -885,19 +1118,36 @@ class FileModel(QtGui.QStandardItemModel):
                 file_item.set_not_work_file()
         if have_publishes:
             for file_version_key in (
-                prev_publish_file_versions - valid_file_versions
+                (prev_publish_file_versions - valid_file_versions)
+                | (removed_publish_file_versions - found_file_versions)
             ) - file_versions_to_remove:
                 file_item, model_item = existing_file_item_map[file_version_key]
                 file_item.set_not_published()
 
-        # update the cache - it's important this is done _before_ adding/updating the model items:
-        self._search_cache.add(work_area, list(valid_files.values()))
+        # update the cache - it's important this is done _before_ adding/updating the model items.
+        # When keeping existing items, only the files that have changed are updated in the cache
+        # entry unless the entry has been evicted in which case it's rebuilt from the whole group:
+        if not keep_existing:
+            self._search_cache.add(work_area, list(valid_files.values()))
+        elif not self._search_cache.update(
+            work_area, list(valid_files.values()), file_versions_to_remove
+        ):
+            all_files = dict(
+                ((file_key, version), model_item.file_item)
+                for file_key, version_map in six.iteritems(file_map)
+                for version, model_item in six.iteritems(version_map)
+                if (file_key, version) not in file_versions_to_remove
+            )
+            all_files.update(valid_files)
+            self._search_cache.add(work_area, list(all_files.values()))
 
         # now lets remove, add and update items as needed:
         # 1. Remove items that are no longer needed:
         if rows_to_remove:
             for row in sorted(rows_to_remove, reverse=True):
                 self._safe_remove_row(row, group_item)
+            for file_key, version in file_versions_to_remove:
+                self._untrack_current_file_item(group_item, file_key, version)
 
         # 2. Add new items:
         if files_to_add:
@@ -910,11 +1160,16 @@ class FileModel(QtGui.QStandardItemModel):
             if new_items:
                 group_item.appendRows(new_items)
 
-        # 3. Update all items in this group:
-        self._update_group_file_items(group_item)
-
-        # and clean up the file-to-item map:
-        self._cleanup_current_item_map()
+        # 3. Update the items in this group - when keeping existing items, only the versions of
+        # the files that were found or removed can have changed:
+        if keep_existing:
+            updated_file_keys = set(file_key for file_key, _ in valid_files)
+            updated_file_keys.update(
+                file_key for file_key, _ in file_versions_to_remove
+            )
+            self._update_group_file_items(group_item, updated_file_keys)
+        else:
+            self._update_group_file_items(group_item)
 
     def _track_current_file_item(self, file_model_item, group_model_item):
         """
@@ -926,32 +1181,45 @@ class FileModel(QtGui.QStandardItemModel):
         """
         file_item = file_model_item.file_item
 
-        # self._current_item_map[group_key][file_key][file_version] = weakref.ref(_FileModelItem)
+        # self._current_item_map[group_key][file_key][file_version] = _FileModelItem
         file_map = self._current_item_map.setdefault(group_model_item.key, {})
         version_map = file_map.setdefault(file_item.key, {})
-        version_map[file_item.version] = weakref.ref(file_model_item)
+        version_map[file_item.version] = file_model_item
+
+    def _untrack_current_file_item(self, group_model_item, file_key, file_version):
+        """
+        Stop tracking a _FileModelItem that has been removed from the model
+
+        :param group_model_item:    The parent _GroupModelItem the file model item was removed from
+        :param file_key:            The file key of the removed item
+        :param file_version:        The file version of the removed item
+        """
+        file_map = self._current_item_map.get(group_model_item.key, {})
+        version_map = file_map.get(file_key)
+        if version_map is None:
+            return
+        version_map.pop(file_version, None)
+        if not version_map:
+            del file_map[file_key]
 
     def _find_version_items(self, version_map, file_version):
         """
         Find current model items for the specified file version in the specified map.  If file_version is
         None then all valid model items in the map are returned.
 
-        :param version_map:     A dictionary mapping file version to weakrefs of _FileModelItems
+        :param version_map:     A dictionary mapping file version to _FileModelItems
         :param file_version:    The file version to find all matching items for
         :returns:               A list of _FileModelItems that were found that match the specified file version
         """
         found_items = []
         if file_version is not None:
             # see if we have an item for the specific version and add it
-            item_ref = version_map.get(file_version)
-            item = item_ref() if item_ref else None
+            item = version_map.get(file_version)
             if item:
                 found_items.append(item)
         else:
             # add items for all versions to the list:
-            for item in [ref() for ref in version_map.values()]:
-                if item:
-                    found_items.append(item)
+            found_items.extend(version_map.values())
         return found_items
 
     def _find_file_items(self, file_map, file_key, file_version):
@@ -1000,25 +1268,6 @@ class FileModel(QtGui.QStandardItemModel):
                 )
         return found_items
 
-    def _cleanup_current_item_map(self):
-        """
-        Cleanup the current item map by removing any entries that are no longer valid, e.g. the weakref
-        to the _FileModelItem is None.
-        """
-        new_item_map = {}
-        for group_key, file_map in six.iteritems(self._current_item_map):
-            new_file_map = {}
-            for file_key, version_map in six.iteritems(file_map):
-                new_version_map = {}
-                for version, item_ref in six.iteritems(version_map):
-                    if item_ref and item_ref():
-                        new_version_map[version] = item_ref
-                if new_version_map:
-                    new_file_map[file_key] = new_version_map
-            if new_file_map:
-                new_item_map[group_key] = new_file_map
-        self._current_item_map = new_item_map
-
     def _on_finder_work_area_found(self, search_id, work_area):
         """
         Slot triggered when the finder finds a work area. This will
@@ -1054,6 +1303,25 @@ class FileModel(QtGui.QStandardItemModel):
         if users:
             self.sandbox_users_found.emit(users)
 
+    def _on_finder_files_chunk_found(self, search_id, file_list, work_area):
+        """
+        Slot triggered when the finder has found a chunk of work files whilst a search is still
+        in progress.  These are merged into the model straight away without removing any files
+        that haven't been found yet.
+
+        :param search_id:    The id of the search that the work files were found for
+        :param file_list:    The list of FileItems that were found
+        :param work_area:    The work area that the files were found in
+        """
+        self._process_found_files(
+            search_id,
+            file_list,
+            work_area,
+            have_local=True,
+            have_publishes=False,
+            keep_existing=True,
+        )
+
     def _on_finder_files_found(self, search_id, file_list, work_area):
         """
         Slot triggered when the finder has found some work files for a search.
@@ -1094,8 +1362,46 @@ class FileModel(QtGui.QStandardItemModel):
             search_id, file_list, work_area, have_local=False, have_publishes=True
         )
 
+    def _on_finder_publishes_updated(
+        self, search_id, file_list, removed_publish_ids, work_area
+    ):
+        """
+        Slot triggered when the finder has found changes to the publishes previously found
+        for a search.  These are applied to the existing publishes rather than replacing them.
+
+        :param search_id:           The id of the search that the publishes were found for
+        :param file_list:           The list of FileItems for publishes that were added or changed
+        :param removed_publish_ids: The set of ids of publishes that were changed or removed
+        :param work_area:           The work area that the publishes were found in
+        """
+        self._app.log_debug(
+            "File Model: Found %d new and %d removed publishes for search %s, user '%s'"
+            % (
+                len(file_list),
+                len(removed_publish_ids),
+                search_id,
+                work_area.context.user["name"] if work_area.context.user else "Unknown",
+            )
+        )
+        self._process_found_files(
+            search_id,
+            file_list,
+            work_area,
+            have_local=False,
+            have_publishes=True,
+            keep_existing=True,
+            removed_publish_ids=removed_publish_ids,
+        )
+
     def _process_found_files(
-        self, search_id, file_list, work_area, have_local, have_publishes
+        self,
+        search_id,
+        file_list,
+        work_area,
+        have_local,
+        have_publishes,
+        keep_existing=False,
+        removed_publish_ids=None,
     ):
         """
         Process files/publishes found by the finder.  This ensures that the parent _GroupModelItem for the
@@ -1106,6 +1412,9 @@ class FileModel(QtGui.QStandardItemModel):
         :param work_area:       The work area that the files were found in
         :param have_local:      True if work files were found, otherwise false
         :param have_publishes:  True if publishes were found, otherwise false
+        :param keep_existing:   True if the file list is only a partial list of the files found,
+                                otherwise False
+        :param removed_publish_ids: Optional set of ids of publishes that are no longer valid
         """
         if search_id not in self._in_progress_searches:
             # ignore result
@@ -1118,13 +1427,9 @@ class FileModel(QtGui.QStandardItemModel):
             self._gen_entity_key(search.entity),
             self._gen_entity_key(search_user),
         )
-        found_group = False
-        for group_item in self._group_items():
-            if group_item.key == group_key:
-                found_group = True
-                break
+        group_item = self._group_map.get(group_key)
 
-        if found_group:
+        if group_item:
             # and make sure the work area is up-to-date:
             group_item.work_area = work_area
         else:
@@ -1136,6 +1441,7 @@ class FileModel(QtGui.QStandardItemModel):
             group_item = FileModel._GroupModelItem(search.name, group_key, work_area)
             # (TODO) need to insert it into the right place in the list!
             self.appendRow(group_item)
+            self._group_map[group_key] = group_item
 
             # add children
             self._update_group_child_entity_items(
@@ -1144,7 +1450,13 @@ class FileModel(QtGui.QStandardItemModel):
 
         # process files:
         self._process_files(
-            file_list, work_area, group_item, have_local, have_publishes
+            file_list,
+            work_area,
+            group_item,
+            have_local,
+            have_publishes,
+            keep_existing,
+            removed_publish_ids,
         )
 
     def _on_finder_search_completed(self, search_id):
@@ -1186,14 +1498,10 @@ class FileModel(QtGui.QStandardItemModel):
         search = self._in_progress_searches[search_id]
         del self._in_progress_searches[search_id]
 
-        group_map = {}
-        for group_item in self._group_items():
-            group_map[group_item.key] = group_item
-
         entity_key = self._gen_entity_key(search.entity)
         for user in self._current_users:
             group_key = (entity_key, self._gen_entity_key(user))
-            group_item = group_map.get(group_key)
+            group_item = self._group_map.get(group_key)
             if not group_item:
                 continue
             group_item.set_search_status(status, error_msg)
@@ -1201,6 +1509,247 @@ class FileModel(QtGui.QStandardItemModel):
             # clean the search cache entry for this item assuming the search completed successfully!
             if status == FileModel.SEARCH_COMPLETED:
                 self._search_cache.set_dirty(search.entity, user, is_dirty=False)
+                # and start watching the work area for changes:
+                self._watch_group_work_area(group_item)
+
+        if status == FileModel.SEARCH_COMPLETED:
+            self._save_search_cache()
+
+    def _save_search_cache(self):
+        """
+        Start a background task to store the cache entries that have changed in the
+        persistent search cache so that they can be restored next time.  Entries are stored
+        as they are updated rather than when the model is destroyed so that they never have
+        to be serialized and written in the main thread.
+        """
+        if not self._search_cache.is_persistent:
+            return
+        self._bg_task_manager.add_task(
+            self._search_cache.save, group=self._bg_task_manager.next_group_id()
+        )
+
+    def _watch_group_work_area(self, group_item):
+        """
+        Watch the work area directories for the specified group so that the group can be
+        updated as soon as files are added or removed.  This watches the directory of each
+        work file in the group as well as the root work directory for the work area.
+
+        :param group_item:  The _GroupModelItem to watch the work area for
+        """
+        work_area = group_item.work_area
+        if not self._watcher or not work_area or not work_area.work_template:
+            return
+
+        directories = set()
+        for model_item in self._file_items(group_item):
+            file_item = model_item.file_item
+            if file_item.is_local and file_item.path:
+                directories.add(os.path.dirname(file_item.path))
+
+        work_dir_template = work_area.work_template.parent
+        if work_dir_template:
+            try:
+                work_dir = work_dir_template.apply_fields(
+                    work_area.context.as_template_fields(work_dir_template)
+                )
+            except sgtk.TankError:
+                # the work directory can't be resolved from the context alone
+                pass
+            else:
+                if os.path.isdir(work_dir):
+                    directories.add(work_dir)
+
+        self._watcher.watch(group_item.key, directories)
+
+    def _on_watcher_work_area_changed(self, group_key):
+        """
+        Slot triggered as soon as files start changing in a watched work area.  The cache
+        entry for the work area is marked as dirty until the changes have been processed.
+
+        :param group_key:   The key of the group whose work area has changed
+        """
+        group_item = self._group_map.get(group_key)
+        if group_item and group_item.work_area:
+            self._search_cache.set_work_area_dirty(group_item.work_area)
+
+    def _on_watcher_files_changed(self, group_key, paths):
+        """
+        Slot triggered when files have been added, modified or removed in a watched work
+        area.  Only the work files for the changed paths are found, in a background task,
+        and then pushed into the group rather than searching the whole work area again.
+
+        :param group_key:   The key of the group whose work area has changed
+        :param paths:       A list of the paths that have changed.  Any that no longer exist
+                            have been removed.  This may include directories in which case
+                            all files under the directory are affected.
+        """
+        group_item = self._group_map.get(group_key)
+        if not group_item or not group_item.work_area:
+            return
+        if group_item.data(FileModel.SEARCH_STATUS_ROLE) == FileModel.SEARCHING:
+            # a full search is in progress which will find these changes anyway
+            return
+        work_area = group_item.work_area
+
+        self._app.log_debug(
+            "File Model: %d paths changed in work area for group %s"
+            % (len(paths), group_item.text())
+        )
+
+        # replace any task still finding files for earlier changes to the group so that the
+        # changes are always merged in the order they happened:
+        changed_paths = set(paths)
+        for task_id, (task_group_key, task_paths, _) in list(
+            self._watcher_tasks.items()
+        ):
+            if task_group_key == group_key:
+                self._bg_task_manager.stop_task(task_id)
+                del self._watcher_tasks[task_id]
+                changed_paths.update(task_paths)
+
+        task_id = self._bg_task_manager.add_task(
+            self._finder.find_work_file_items,
+            group=self._bg_task_manager.next_group_id(),
+            task_kwargs={"paths": sorted(changed_paths), "work_area": work_area},
+        )
+        self._watcher_tasks[task_id] = (group_key, changed_paths, work_area)
+
+    def _on_watched_files_found(self, group_key, paths, work_area, found_files):
+        """
+        Merge the work files found for the changed paths in a watched work area into the
+        group - see _on_watcher_files_changed().
+
+        :param group_key:   The key of the group whose work area has changed
+        :param paths:       A set of the paths that have changed
+        :param work_area:   The work area the files were found in
+        :param found_files: A list of the FileItem's found for the changed paths that still
+                            exist
+        """
+        group_item = self._group_map.get(group_key)
+        if not group_item or group_item.work_area is not work_area:
+            # the group has been removed or searched again since the files changed
+            return
+        if group_item.data(FileModel.SEARCH_STATUS_ROLE) == FileModel.SEARCHING:
+            # a full search is in progress which will find these changes anyway
+            return
+
+        # keep all current work files apart from those that have changed:
+        changed_dirs = tuple(os.path.join(path, "") for path in paths)
+        files = []
+        for model_item in self._file_items(group_item):
+            file_item = model_item.file_item
+            if not file_item.is_local:
+                continue
+            if file_item.path in paths or file_item.path.startswith(changed_dirs):
+                continue
+            files.append(file_item)
+
+        # and add files for changed paths that still exist:
+        files.extend(found_files)
+
+        self._process_files(
+            files, work_area, group_item, have_local=True, have_publishes=False
+        )
+
+        # the cache entry is up-to-date again and any new directories should be watched:
+        self._search_cache.set_work_area_dirty(work_area, False)
+        self._watch_group_work_area(group_item)
+        self._save_search_cache()
+
+    def request_publish_thumbnails(self, file_items):
+        """
+        Request the thumbnails for publishes that were found without them, e.g. because they
+        are about to be displayed.  The thumbnails for all the publishes are queried from
+        Shotgun in one go and then downloaded as normal.
+
+        :param file_items:  A list of FileItem instances to request the thumbnails for
+        """
+        pending_ids = set()
+        for published_files in self._pending_thumbnail_url_requests.values():
+            pending_ids.update(published_files)
+
+        # remember the file versions for each publish so that the model items can be found
+        # without searching the whole model when the thumbnails are found:
+        published_files = {}  # published file id:set((file key, file version))
+        for file_item in file_items:
+            published_file_id = file_item.published_file_id
+            if (
+                not file_item.publish_thumbnail_pending
+                or published_file_id is None
+                or published_file_id in pending_ids
+            ):
+                continue
+            published_files.setdefault(published_file_id, set()).add(
+                (file_item.key, file_item.version)
+            )
+        if not published_files:
+            return
+
+        request_id = self._sg_data_retriever.execute_find(
+            self._published_file_type,
+            [["id", "in", sorted(published_files)]],
+            ["image"],
+        )
+        self._pending_thumbnail_url_requests[request_id] = published_files
+
+    def _request_thumbnail(self, file_item, group_key):
+        """
+        Request the thumbnail for a published file if it has one that hasn't been loaded yet.
+
+        :param file_item:   The FileItem to request the thumbnail for
+        :param group_key:   The key of the group the file item is in
+        """
+        if (
+            not file_item.is_published
+            or not file_item.thumbnail_path
+            or file_item.thumbnail
+        ):
+            return
+
+        # request the thumbnail using the data retriever:
+        request_id = self._sg_data_retriever.request_thumbnail(
+            file_item.thumbnail_path,
+            self._published_file_type,
+            file_item.published_file_id,
+            "image",
+            load_image=True,
+        )
+        self._pending_thumbnail_requests[request_id] = (
+            group_key,
+            file_item.key,
+            file_item.version,
+        )
+
+    def _on_thumbnail_urls_found(self, published_files, sg_publishes):
+        """
+        Update the publishes with the thumbnails queried for them and request the thumbnails.
+
+        :param published_files: Dictionary {published file id:set((file key, file version))}
+                                of the publishes that were queried and the file versions
+                                they were queried for
+        :param sg_publishes:    The list of publishes returned by the query
+        """
+        thumbnail_urls = dict(
+            (sg_publish["id"], sg_publish.get("image")) for sg_publish in sg_publishes
+        )
+        # the same file version may be in more than one group so look the items up in each
+        # group:
+        for group_key, file_map in six.iteritems(self._current_item_map):
+            for published_file_id, file_versions in six.iteritems(published_files):
+                for file_key, file_version in file_versions:
+                    model_item = file_map.get(file_key, {}).get(file_version)
+                    if not model_item:
+                        continue
+                    file_item = model_item.file_item
+                    if (
+                        not file_item.publish_thumbnail_pending
+                        or file_item.published_file_id != published_file_id
+                    ):
+                        continue
+                    file_item.set_publish_thumbnail_path(
+                        thumbnail_urls.get(published_file_id)
+                    )
+                    self._request_thumbnail(file_item, group_key)
 
     def _on_data_retriever_work_completed(self, uid, request_type, data):
         """
@@ -1212,6 +1761,11 @@ class FileModel(QtGui.QStandardItemModel):
         :param request_type:    A string representing the type of request that has been completed
         :param data:            The result from completing the work
         """
+        if uid in self._pending_thumbnail_url_requests:
+            # the thumbnails for some publishes have been queried:
+            published_files = self._pending_thumbnail_url_requests.pop(uid)
+            self._on_thumbnail_urls_found(published_files, data.get("sg") or [])
+            return
         if uid not in self._pending_thumbnail_requests:
             # the completed work is of no interest to us!
             return
@@ -1230,11 +1784,8 @@ class FileModel(QtGui.QStandardItemModel):
             return
 
         # find the work area associated with the group:
-        work_area = None
-        for group_item in self._group_items():
-            if group_item.key == group_key:
-                work_area = group_item.work_area
-                break
+        group_item = self._group_map.get(group_key)
+        work_area = group_item.work_area if group_item else None
 
         # prepare a pixmap from the thumbnail image:
         thumb = self._build_thumbnail(thumb_image)
@@ -1251,6 +1802,10 @@ class FileModel(QtGui.QStandardItemModel):
                 # update thumbnails on all file versions:
                 self._update_version_thumbnails(file_item.key, group_key, work_area)
 
+        if work_area:
+            # the thumbnail adds to the size of the cached files:
+            self._search_cache.update_size(work_area)
+
     def _on_data_retriever_work_failed(self, uid, error_msg):
         """
         Slot triggered when the data retriever fails to do some work!
@@ -1260,27 +1815,31 @@ class FileModel(QtGui.QStandardItemModel):
         """
         if uid in self._pending_thumbnail_requests:
             del self._pending_thumbnail_requests[uid]
+        self._pending_thumbnail_url_requests.pop(uid, None)
         self._app.log_debug(
             "File Model: Failed to find thumbnail for id %s: %s" % (uid, error_msg)
         )
 
-    def _update_group_file_items(self, group_item):
+    def _update_group_file_items(self, group_item, file_keys=None):
         """
         Update all file model items within the specified group model item.  This updates each file's
         tooltip, associated versions and thumbnail and ensures that the correct dataChanged signal is
         emitted for them.
 
         :param group_item:  The _GroupModelItem representing the group in the model
+        :param file_keys:   Optional set of file keys to update the items for.  If this is None then
+                            the items for all files in the group are updated.
         """
         work_area = group_item.work_area
         if not work_area:
             return
 
         # get a unique list of all file keys under the group:
-        unique_file_keys = set()
-        for item in self._file_items(group_item):
-            file_item = item.file_item
-            unique_file_keys.add(file_item.key)
+        file_map = self._current_item_map.get(group_item.key, {})
+        if file_keys is None:
+            unique_file_keys = set(file_map)
+        else:
+            unique_file_keys = set(k for k in file_keys if k in file_map)
 
         if not unique_file_keys:
             return
@@ -1288,13 +1847,14 @@ class FileModel(QtGui.QStandardItemModel):
         # process files for each key:
         for file_key in unique_file_keys:
             # get all file versions for this key:
-            file_versions = (
-                self._search_cache.find_file_versions(work_area, file_key) or {}
+            cached_versions = self._search_cache.find_sorted_file_versions(
+                work_area, file_key
             )
+            file_versions, sorted_versions = cached_versions or ({}, [])
 
             # update thumbnail and versions for each version:
             thumb = None
-            for _, version in sorted(six.iteritems(file_versions), reverse=False):
+            for version in (file_versions[v] for v in sorted_versions):
                 if version.thumbnail_path:
                     # this file version should have a thumbnail!
                     thumb = version.thumbnail
@@ -1306,17 +1866,28 @@ class FileModel(QtGui.QStandardItemModel):
                 version.versions = file_versions
 
         # update tooltips on all file items:
-        for file_model_item in self._file_items(group_item):
+        file_model_items = [
+            file_model_item
+            for file_key in unique_file_keys
+            for file_model_item in six.itervalues(file_map[file_key])
+        ]
+        for file_model_item in file_model_items:
             file_item = file_model_item.file_item
             tooltip = ""
             if file_item:
                 tooltip = file_item.format_tooltip()
             file_model_item.setToolTip(tooltip)
 
-        # emit data changed signal for all items in the group:
-        row_count = group_item.rowCount()
-        tl_idx = self.index(0, 0, group_item.index())
-        br_idx = self.index(row_count - 1, 0, group_item.index())
+        # emit data changed signal for all updated items in the group:
+        if file_keys is None:
+            first_row = 0
+            last_row = group_item.rowCount() - 1
+        else:
+            rows = [file_model_item.row() for file_model_item in file_model_items]
+            first_row = min(rows)
+            last_row = max(rows)
+        tl_idx = self.index(first_row, 0, group_item.index())
+        br_idx = self.index(last_row, 0, group_item.index())
         self.dataChanged.emit(tl_idx, br_idx)
 
     def _update_version_thumbnails(self, file_key, group_key, work_area):
@@ -1328,9 +1899,12 @@ class FileModel(QtGui.QStandardItemModel):
         :param group_key:   A unique key that represents a single file group
         :param work_area:   A WorkArea instance that all files in this group belong to
         """
-        file_versions = self._search_cache.find_file_versions(work_area, file_key) or {}
+        cached_versions = self._search_cache.find_sorted_file_versions(
+            work_area, file_key
+        )
+        file_versions, sorted_versions = cached_versions or ({}, [])
         thumb = None
-        for _, version in sorted(six.iteritems(file_versions), reverse=False):
+        for version in (file_versions[v] for v in sorted_versions):
             if version.thumbnail_path:
                 # this file version should have a thumbnail!
                 thumb = version.thumbnail
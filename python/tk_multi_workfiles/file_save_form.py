@@ -415,12 +415,14 @@ class FileSaveForm(FileFormBase):
             file_key = FileItem.build_file_key(
                 fields, env.work_template, env.version_compare_ignore_fields
             )
-            file_versions = None
+            latest_versions = None
             if self._file_model:
-                file_versions = self._file_model.get_cached_file_versions(
+                latest_versions = self._file_model.get_cached_latest_versions(
                     file_key, env, clean_only=True
                 )
-            if file_versions == None:
+            if latest_versions != None:
+                max_version = latest_versions[0] or 0
+            else:
                 # fall back to finding the files manually - this will be slower!
                 try:
                     finder = FileFinder()
@@ -435,9 +437,7 @@ class FileSaveForm(FileFormBase):
                     )
                 except TankError as e:
                     raise TankError("Failed to find files for this work area: %s" % e)
-                file_versions = [f.version for f in files]
-
-            max_version = max(file_versions or [0])
+                max_version = max([f.version for f in files] or [0])
             next_version = max_version + 1
 
             # update version:
@@ -12,27 +12,101 @@
 Cache used to store and find file search results.
 """
 
+import os
+import json
+import bisect
+import time
+import sqlite3
+import calendar
+import itertools
+from datetime import datetime
+
 import sgtk
-from .util import Threaded
 from tank_vendor import six
+from tank_vendor.shotgun_api3 import sg_timezone
+
+from .file_item import FileItem
+from .work_area import WorkArea
+from .util import Threaded, SnapshotDict
 
 
 class FileSearchCache(Threaded):
     """
     Implementation of FileSearchCache class
+
+    The cache can be limited to an estimated size, in which case the least recently used
+    entries are evicted once the limit is exceeded.  The size of an entry is estimated from
+    the number of files it contains and the number of thumbnails loaded for them.
+
+    The cache can also be persistent, in which case entries are stored on disk when they
+    are evicted or the cache is saved and can be restored with restore(), even in a later
+    session.  Restoring entries is slow so it's intended to be run in a background task
+    rather than when entries are looked up.  Entries are stored as JSON per entity, user and
+    the templates of the work area so a restored entry is only used if the templates for its
+    context haven't changed.  Restored entries are dirty unless they are still within the
+    time-to-live of the cache so that they can be displayed straight away whilst a new
+    search runs.
+
+    File versions are looked up far more often than the cache is updated so these lookups
+    don't take the lock - see SnapshotDict.  Entries are never modified once they have been
+    added, apart from their dirty state, estimated size and when they were last used.
     """
 
+    # estimated size of a thumbnail relative to a single file:
+    _THUMBNAIL_SIZE = 20
+
+    # entries that haven't been updated for this many seconds are purged from the
+    # persistent cache:
+    _EXPIRY_INTERVAL = 30 * 24 * 60 * 60
+
+    _DB_FILE_NAME = "file_search_cache.db"
+
+    # the version of the persistent cache schema and the format of the entries stored in
+    # it - stored entries are discarded when this changes:
+    _SCHEMA_VERSION = 1
+
     class _CachedFileInfo(object):
         """
         Storage for file versions - encapsulates a dictionary if files indexed
-        by their version
+        by their version together with the sorted list of versions and the latest
+        local and publish versions so that these don't need to be computed by every
+        caller.
         """
 
+        __slots__ = (
+            "versions",
+            "sorted_versions",
+            "max_local_version",
+            "max_publish_version",
+        )
+
         def __init__(self):
             """
             Construction
             """
             self.versions = {}  # version:FileItem()
+            self.sorted_versions = []
+            self.max_local_version = None
+            self.max_publish_version = None
+
+        def add(self, file_item):
+            """
+            Add a file version, updating the sorted versions and latest versions.
+
+            :param file_item:   The FileItem to add
+            """
+            version = file_item.version
+            if version not in self.versions:
+                bisect.insort(self.sorted_versions, version)
+            self.versions[version] = file_item
+            if file_item.is_local and (
+                self.max_local_version is None or version > self.max_local_version
+            ):
+                self.max_local_version = version
+            if file_item.is_published and (
+                self.max_publish_version is None or version > self.max_publish_version
+            ):
+                self.max_publish_version = version
 
     class _CacheEntry(object):
         """
@@ -47,13 +121,69 @@ class FileSearchCache(Threaded):
             self.work_area = None
             self.is_dirty = True
             self.file_info = {}  # FileItem.key:_CachedFileInfo()
+            self.size = 0
+            # the time the entry was last known to be up-to-date:
+            self.updated_at = None
+            # True if the entry is stored in the persistent cache:
+            self.is_saved = False
+            # used to evict the least recently used entries:
+            self.used_at = 0
+
+        def add_files(self, files):
+            """
+            Add files to the entry.
+
+            :param files:   A list of FileItem's to add
+            """
+            for file_item in files:
+                self.file_info.setdefault(
+                    file_item.key, FileSearchCache._CachedFileInfo()
+                ).add(file_item)
+
+        def get_files(self):
+            """
+            :returns:   A list of all the FileItem's in the entry
+            """
+            return [
+                file_item
+                for file_info in self.file_info.values()
+                for file_item in file_info.versions.values()
+            ]
+
+        def mark_clean(self):
+            """
+            Mark the entry as being up-to-date as of now.
+            """
+            self.is_dirty = False
+            self.updated_at = time.time()
+            self.is_saved = False
 
-    def __init__(self):
+    def __init__(self, max_size=None, ttl=None, persistent=False):
         """
         Construction
+
+        :param max_size:    The maximum estimated size of all entries in the cache - see
+                            _estimate_size().  If this is None or 0 then the size of the
+                            cache isn't limited.
+        :param ttl:         The time in seconds that clean entries are considered to be
+                            up-to-date for - see is_up_to_date().  If this is None or 0 then
+                            entries are never considered to be up-to-date.
+        :param persistent:  True if entries should be stored on disk so that they can be
+                            restored in later sessions.
         """
         Threaded.__init__(self)
-        self._cache = {}
+        self._cache = SnapshotDict()  # key:_CacheEntry()
+        self._use_counter = itertools.count()
+        self._max_size = max_size or 0
+        self._size = 0
+        self._evictions = 0
+        self._evicted_size = 0
+        self._ttl = ttl or 0
+        self._persistent = persistent
+        self._connection = None
+        self._disabled = False
+        # keys that have been looked up in the persistent cache since they were last in memory:
+        self._restored_keys = set()
 
     @Threaded.exclusive
     def add(self, work_area, files, is_dirty=None):
@@ -81,16 +211,93 @@ class FileSearchCache(Threaded):
         # build the new cache entry from the list of files:
         new_entry = FileSearchCache._CacheEntry()
         new_entry.work_area = work_area
-        new_entry.is_dirty = is_dirty
-        for file_item in files:
-            new_entry.file_info.setdefault(
-                file_item.key, FileSearchCache._CachedFileInfo()
-            ).versions[file_item.version] = file_item
+        if not is_dirty:
+            if current_entry and not current_entry.is_dirty:
+                new_entry.is_dirty = False
+                new_entry.updated_at = current_entry.updated_at
+            else:
+                new_entry.mark_clean()
+        new_entry.add_files(files)
+        new_entry.size = self._estimate_size(files)
+
+        self._set_entry(key, new_entry, current_entry)
+
+    @Threaded.exclusive
+    def update(self, work_area, files, removed_files=None):
+        """
+        Update the entry for the specified work area with files that have been added or changed
+        and remove any files that no longer exist.  All other files in the entry are kept so
+        this only costs the number of files being updated rather than the size of the entry,
+        apart from re-estimating the size of the entry.
+
+        :param work_area:       A WorkArea instance containing information about the work area
+                                the files were found in
+        :param files:           A list of the FileItem's that have been added or changed
+        :param removed_files:   A list of (file key, version) tuples for the files that should
+                                be removed from the entry
+        :returns:               True if the entry was updated or False if there is no entry
+                                for the work area, in which case add() should be used instead
+        """
+        key, current_entry = self._find_entry(work_area)
+        if not current_entry:
+            return False
 
-        # add the new entry to the cache:
-        self._cache[key] = new_entry
+        # find the files to add or remove for each file key:
+        updated_files = {}  # file key:({version:FileItem}, set(removed version))
+        for file_item in files:
+            added_versions, _ = updated_files.setdefault(file_item.key, ({}, set()))
+            added_versions[file_item.version] = file_item
+        for file_key, version in removed_files or []:
+            _, removed_versions = updated_files.setdefault(file_key, ({}, set()))
+            removed_versions.add(version)
+
+        # build the new entry, sharing the file info for all keys that haven't changed.
+        # Note, the existing entry is left untouched as it may be being read from another
+        # thread:
+        new_entry = FileSearchCache._CacheEntry()
+        new_entry.work_area = work_area
+        new_entry.is_dirty = current_entry.is_dirty
+        new_entry.updated_at = current_entry.updated_at
+        new_entry.file_info = dict(current_entry.file_info)
+        for file_key, (added_versions, removed_versions) in updated_files.items():
+            versions = {}
+            current_info = current_entry.file_info.get(file_key)
+            if current_info:
+                versions.update(current_info.versions)
+            for version in removed_versions:
+                versions.pop(version, None)
+            versions.update(added_versions)
+
+            if not versions:
+                new_entry.file_info.pop(file_key, None)
+                continue
+            file_info = FileSearchCache._CachedFileInfo()
+            for version in sorted(versions):
+                file_info.add(versions[version])
+            new_entry.file_info[file_key] = file_info
+        new_entry.size = self._estimate_size(new_entry.get_files())
+
+        self._set_entry(key, new_entry, current_entry)
+        return True
 
     @Threaded.exclusive
+    def update_size(self, work_area):
+        """
+        Re-estimate the size of the entry for the specified work area, e.g. once thumbnails
+        have been loaded for its files, evicting entries if the cache is now too big.
+
+        :param work_area:   A WorkArea instance for the entry to update
+        """
+        _, entry = self._find_entry(work_area)
+        if not entry:
+            return
+
+        size = self._estimate_size(entry.get_files())
+        if size != entry.size:
+            self._size += size - entry.size
+            entry.size = size
+            self._evict()
+
     def find_file_versions(self, work_area, file_key, clean_only=False):
         """
         Find all file versions for the specified file key and context.
@@ -100,22 +307,57 @@ class FileSearchCache(Threaded):
         :param clean_only:      If False then dirty cache entries will be included in the returned results.  If
                                 True then they will be omitted. Defaults to False.
         :returns:               A dictionary {version:FileItem} of all file versions found.
+                                This is the table stored in the cache and shared by all
+                                callers so it must not be modified.
         """
-        _, entry = self._find_entry(work_area)
-        if not entry:
+        file_info = self._find_file_info(work_area, file_key, clean_only)
+        if file_info is None:
             # return None as we don't have a cached result for this context!
             return None
 
-        if clean_only and entry.is_dirty:
-            return None
+        # return the dictionary of version:FileItem entries.  Cache entries are replaced
+        # rather than updated when files are added so this can be shared rather than copied
+        # for every caller (and every version of the file):
+        return file_info.versions
 
-        file_info = entry.file_info.get(file_key)
-        if not file_info:
-            # although we have a cache entry, we don't have any files for the key!
-            return {}
+    def find_sorted_file_versions(self, work_area, file_key, clean_only=False):
+        """
+        Find all file versions for the specified file key and context together with the
+        list of versions in ascending order.
+
+        :param work_area:       The work area to find the file versions for
+        :param file_key:        A unique file key that can be used to locate all versions of
+                                a single file
+        :param clean_only:      If True then None is returned if the cache entry is dirty
+        :returns:               A tuple ({version:FileItem}, [version]) or None if there is
+                                no cached result for the work area.  Both are shared by all
+                                callers so they must not be modified.
+        """
+        file_info = self._find_file_info(work_area, file_key, clean_only)
+        if file_info is None:
+            return None
+        return (file_info.versions, file_info.sorted_versions)
 
-        # return a dictionary of version:FileItem entries:
-        return dict([(v, f) for v, f in six.iteritems(file_info.versions)])
+    def find_latest_versions(self, work_area, file_key, clean_only=False):
+        """
+        Find the latest versions of the file for the specified file key and context.
+
+        :param work_area:       The work area to find the latest versions for
+        :param file_key:        A unique file key that can be used to locate all versions of
+                                a single file
+        :param clean_only:      If True then None is returned if the cache entry is dirty
+        :returns:               A tuple (max version, max local version, max publish version)
+                                or None if there is no cached result for the work area.  Each
+                                version is None if there are no files of that kind.
+        """
+        file_info = self._find_file_info(work_area, file_key, clean_only)
+        if file_info is None:
+            return None
+        return (
+            file_info.sorted_versions[-1] if file_info.sorted_versions else None,
+            file_info.max_local_version,
+            file_info.max_publish_version,
+        )
 
     @Threaded.exclusive
     def find(self, entity, user=None):
@@ -127,16 +369,11 @@ class FileSearchCache(Threaded):
                         context will be used
         :returns:       Tuple containing (list(FileItem), WorkArea) or None of an entry isn't found
         """
-        key = self._construct_key(entity, user)
-        entry = self._cache.get(key)
+        entry = self._get_entry(self._construct_key(entity, user))
         if not entry:
             return None
 
-        files = []
-        for file_info in entry.file_info.values():
-            files.extend([f for f in file_info.versions.values()])
-
-        return (files, entry.work_area)
+        return (entry.get_files(), entry.work_area)
 
     @Threaded.exclusive
     def set_dirty(self, entity, user=None, is_dirty=True):
@@ -152,7 +389,10 @@ class FileSearchCache(Threaded):
         entry = self._cache.get(key)
         if not entry:
             return None
-        entry.is_dirty = is_dirty
+        if is_dirty:
+            entry.is_dirty = True
+        else:
+            entry.mark_clean()
 
     @Threaded.exclusive
     def set_work_area_dirty(self, work_area, dirty=True):
@@ -165,14 +405,522 @@ class FileSearchCache(Threaded):
         _, entry = self._find_entry(work_area)
         if not entry:
             return
-        entry.is_dirty = dirty
+        if dirty:
+            entry.is_dirty = True
+        else:
+            entry.mark_clean()
+
+    @Threaded.exclusive
+    def is_up_to_date(self, entity, user=None):
+        """
+        Determine if the cache entry for the specified entity and user is clean and was
+        updated within the time-to-live of the cache, in which case there is no need to
+        search for the files again.
+
+        :param entity:  The entity to check the cache entry for
+        :param user:    The user to check the cache entry for.  If user is None then the user
+                        for the current context will be used.
+        :returns:       True if the entry is up-to-date, otherwise False
+        """
+        if not self._ttl:
+            return False
+        entry = self._get_entry(self._construct_key(entity, user))
+        return bool(entry and not entry.is_dirty and self._is_recent(entry.updated_at))
+
+    @Threaded.exclusive
+    def needs_restore(self, entity, user=None):
+        """
+        Determine if the entry for the specified entity and user should be restored from the
+        persistent cache - see restore().
+
+        :param entity:  The entity to check the cache entry for
+        :param user:    The user to check the cache entry for.  If user is None then the user
+                        for the current context will be used.
+        :returns:       True if the entry isn't in memory and hasn't already been looked up in
+                        the persistent cache, otherwise False
+        """
+        if not self._persistent or self._disabled:
+            return False
+        key = self._construct_key(entity, user)
+        return key not in self._cache and key not in self._restored_keys
+
+    def restore(self, entities_and_users):
+        """
+        Restore the entries for the specified entities and users from the persistent cache.
+        This reads and deserializes the stored entries so it's intended to be run in a
+        background task.  The lock is only held whilst the database is read and the restored
+        entries are added so lookups from other threads aren't blocked.  Entries that are
+        already in memory are left untouched.
+
+        :param entities_and_users:  A list of (entity, user) tuples to restore the entries for
+        :returns:                   A list of the (entity, user) tuples that entries were
+                                    restored for
+        """
+        restored = []
+        for entity, user in entities_and_users:
+            key = self._construct_key(entity, user)
+            rows = self._read_entry_rows(key)
+            if not rows:
+                continue
+            entry = self._build_restored_entry(key, rows)
+            if entry and self._add_restored_entry(key, entry):
+                restored.append((entity, user))
+        return restored
+
+    @property
+    def is_persistent(self):
+        """
+        :returns:   True if entries are stored in the persistent cache, otherwise False
+        """
+        return self._persistent and not self._disabled
+
+    @Threaded.exclusive
+    def save(self):
+        """
+        Store all clean entries that have changed in the persistent cache.  This serializes
+        the entries and writes them to disk so it's intended to be run in a background task.
+        This does nothing if the cache isn't persistent.
+        """
+        if self._persistent:
+            self._save_entries(self._cache.snapshot.items())
 
     @Threaded.exclusive
     def clear(self):
         """
         Clear the cache
         """
-        self._cache = {}
+        self._cache.clear()
+        self._size = 0
+        self._restored_keys = set()
+
+    @Threaded.exclusive
+    def get_stats(self):
+        """
+        Get statistics about the size of the cache and the entries evicted from it.
+
+        :returns:   A dictionary containing the number of 'entries' in the cache, the
+                    estimated 'size' of the cache, the 'max_size' it's limited to (0 if it
+                    isn't limited), the number of 'evictions' and the total 'evicted_size'
+                    of the evicted entries
+        """
+        return {
+            "entries": len(self._cache),
+            "size": self._size,
+            "max_size": self._max_size,
+            "evictions": self._evictions,
+            "evicted_size": self._evicted_size,
+        }
+
+    def _estimate_size(self, files):
+        """
+        Estimate the size of a cache entry for a list of files.
+
+        :param files:   The list of FileItem's in the entry
+        :returns:       The estimated size of the entry
+        """
+        # thumbnails are typically shared between versions of the same file:
+        thumbnails = set(id(f.thumbnail) for f in files if f.thumbnail)
+        return len(files) + len(thumbnails) * FileSearchCache._THUMBNAIL_SIZE
+
+    def _set_entry(self, key, entry, current_entry):
+        """
+        Set the entry for the specified key as the most recently used, replacing the current
+        entry and evicting entries if the cache is too big.
+
+        :param key:             The key of the entry
+        :param entry:           The new cache entry
+        :param current_entry:   The entry currently in the cache for the key or None
+        """
+        if current_entry:
+            self._size -= current_entry.size
+        self._touch(entry)
+        self._cache.set(key, entry)
+        self._size += entry.size
+        self._evict()
+
+    def _touch(self, entry):
+        """
+        Mark an entry as the most recently used.  This is safe to call without the lock.
+
+        :param entry:   The cache entry to mark
+        """
+        entry.used_at = next(self._use_counter)
+
+    def _evict(self):
+        """
+        Evict the least recently used entries until the cache is within its maximum size.
+        The most recently used entry is always kept.
+        """
+        if not self._max_size:
+            return
+
+        evicted = 0
+        while self._size > self._max_size and len(self._cache) > 1:
+            entries = self._cache.snapshot
+            key = min(entries, key=lambda k: entries[k].used_at)
+            entry = self._cache.pop(key)
+            if self._persistent:
+                # keep the entry on disk so that it can be restored if needed again:
+                self._save_entries([(key, entry)])
+                self._restored_keys.discard(key)
+            self._size -= entry.size
+            self._evictions += 1
+            self._evicted_size += entry.size
+            evicted += 1
+
+        if evicted:
+            app = sgtk.platform.current_bundle()
+            app.log_debug(
+                "File Search Cache: Evicted %d entries - %d entries of size %d/%d remain "
+                "(%d evicted in total)"
+                % (
+                    evicted,
+                    len(self._cache),
+                    self._size,
+                    self._max_size,
+                    self._evictions,
+                )
+            )
+
+    def _find_file_info(self, work_area, file_key, clean_only):
+        """
+        Find the cached versions of a file in the entry for the specified work area.  The
+        entry is marked as the most recently used.
+
+        :param work_area:   The work area to find the file for
+        :param file_key:    The unique file key of the file
+        :param clean_only:  If True then None is returned if the cache entry is dirty
+        :returns:           The _CachedFileInfo for the file, an empty _CachedFileInfo if the
+                            entry doesn't contain the file or None if there is no entry
+        """
+        key, entry = self._find_entry(work_area)
+        if not entry:
+            return None
+
+        if clean_only and entry.is_dirty:
+            return None
+        self._touch(entry)
+
+        file_info = entry.file_info.get(file_key)
+        if not file_info:
+            # although we have a cache entry, we don't have any files for the key!
+            return FileSearchCache._CachedFileInfo()
+        return file_info
+
+    def _get_entry(self, key):
+        """
+        Get the entry for the specified key and mark it as the most recently used.  Entries
+        in the persistent cache are only returned once they have been restored - see
+        restore().
+
+        :param key: The key of the entry to get
+        :returns:   The cache entry or None if there isn't one
+        """
+        entry = self._cache.get(key)
+        if entry:
+            self._touch(entry)
+        return entry
+
+    def _is_recent(self, updated_at):
+        """
+        :param updated_at:  The time an entry was last known to be up-to-date
+        :returns:           True if the time is within the time-to-live of the cache
+        """
+        return updated_at is not None and time.time() - updated_at < self._ttl
+
+    @Threaded.exclusive
+    def _read_entry_rows(self, key):
+        """
+        Read the stored data for the specified key from the persistent cache.  The key is
+        remembered so that it isn't read again until the entry is evicted or the cache is
+        cleared.
+
+        :param key: The key of the entry to read
+        :returns:   A list of (templates, context, updated_at, files) tuples, most recently
+                    updated first.  This is empty if the entry is already in memory, has
+                    already been read or isn't stored.
+        """
+        if key in self._cache or key in self._restored_keys:
+            return []
+        self._restored_keys.add(key)
+
+        connection = self._get_connection()
+        if not connection:
+            return []
+
+        try:
+            return connection.execute(
+                "SELECT templates, context, updated_at, files FROM entries "
+                "WHERE key = ? ORDER BY updated_at DESC",
+                (json.dumps(key),),
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return []
+
+    def _build_restored_entry(self, key, rows):
+        """
+        Build a cache entry from the data stored in the persistent cache.  This doesn't
+        access any cache state so it's safe to call without the lock.
+
+        :param key:     The key of the entry being restored
+        :param rows:    The stored data for the key - see _read_entry_rows()
+        :returns:       The restored cache entry or None if there isn't a valid entry stored
+                        for the templates of the work area
+        """
+        app = sgtk.platform.current_bundle()
+        for templates, context_data, updated_at, files_data in rows:
+            try:
+                context = sgtk.Context.from_dict(app.sgtk, json.loads(context_data))
+                work_area = self._restore_work_area(context)
+                if self._get_templates_key(work_area) != templates:
+                    # the entry was stored for different templates, e.g. by another engine
+                    continue
+                files = [
+                    FileItem.deserialize(data)
+                    for data in FileSearchCache._decode_value(json.loads(files_data))
+                ]
+            except Exception as e:
+                # the entry is just an optimization so ignore it if it can't be restored:
+                app.log_debug(
+                    "File Search Cache: Failed to restore entry %s - %s" % (key, e)
+                )
+                continue
+
+            entry = FileSearchCache._CacheEntry()
+            entry.work_area = work_area
+            entry.updated_at = updated_at
+            # the files need to be searched for again unless the entry is still recent:
+            entry.is_dirty = not self._is_recent(updated_at)
+            entry.is_saved = True
+            entry.add_files(files)
+            entry.size = self._estimate_size(files)
+            app.log_debug(
+                "File Search Cache: Restored %d files for entry %s" % (len(files), key)
+            )
+            return entry
+
+        return None
+
+    def _restore_work_area(self, context):
+        """
+        Rebuild the work area an entry was stored for.  The work areas for the sandboxes of
+        other users are copies of the work area for the current user (see
+        WorkArea.create_copy_for_user()) so they are rebuilt in the same way.
+
+        :param context: The context of the stored work area
+        :returns:       The restored WorkArea
+        """
+        app = sgtk.platform.current_bundle()
+        current_user = app.context.user
+        user = context.user
+        if not current_user or not user or user["id"] == current_user["id"]:
+            return WorkArea(context)
+        work_area = WorkArea(context.create_copy_for_user(current_user))
+        return work_area.create_copy_for_user(user)
+
+    @Threaded.exclusive
+    def _add_restored_entry(self, key, entry):
+        """
+        Add an entry restored from the persistent cache unless the key already has an entry
+        in memory, e.g. because the files were found whilst the entry was being restored.
+
+        :param key:     The key of the entry
+        :param entry:   The restored cache entry
+        :returns:       True if the entry was added, otherwise False
+        """
+        if key in self._cache:
+            return False
+        self._set_entry(key, entry, None)
+        return True
+
+    def _save_entries(self, entries):
+        """
+        Store the specified entries in the persistent cache.  Only clean entries that
+        haven't already been stored are saved.
+
+        :param entries: A list of (key, entry) tuples to store
+        """
+        rows = []
+        saved_entries = []
+        for key, entry in entries:
+            if entry.is_dirty or entry.is_saved:
+                continue
+            work_area = entry.work_area
+            if not work_area or not work_area.context:
+                continue
+            try:
+                files_data = json.dumps(
+                    FileSearchCache._encode_value(
+                        [f.serialize() for f in entry.get_files()]
+                    )
+                )
+                context_data = json.dumps(work_area.context.to_dict())
+            except Exception as e:
+                app = sgtk.platform.current_bundle()
+                app.log_debug(
+                    "File Search Cache: Failed to store entry %s - %s" % (key, e)
+                )
+                continue
+            rows.append(
+                (
+                    json.dumps(key),
+                    self._get_templates_key(work_area),
+                    context_data,
+                    entry.updated_at,
+                    files_data,
+                )
+            )
+            saved_entries.append(entry)
+
+        if not rows:
+            return
+        connection = self._get_connection()
+        if not connection:
+            return
+
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries "
+                    "(key, templates, context, updated_at, files) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
+            return
+
+        for entry in saved_entries:
+            entry.is_saved = True
+
+    def _get_connection(self):
+        """
+        Get the connection to the persistent cache database, opening it if needed.  Must
+        be called with the lock held.
+
+        :returns:   An sqlite3 connection or None if the persistent cache isn't available
+        """
+        if self._connection or self._disabled:
+            return self._connection
+
+        try:
+            app = sgtk.platform.current_bundle()
+            cache_dir = app.cache_location
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            db_path = os.path.join(cache_dir, FileSearchCache._DB_FILE_NAME)
+
+            connection = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            with connection:
+                # discard entries stored in a different format:
+                (schema_version,) = connection.execute("PRAGMA user_version").fetchone()
+                if schema_version != FileSearchCache._SCHEMA_VERSION:
+                    connection.execute("DROP TABLE IF EXISTS entries")
+                    connection.execute(
+                        "PRAGMA user_version = %d" % FileSearchCache._SCHEMA_VERSION
+                    )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT, templates TEXT, context TEXT, updated_at REAL, "
+                    "files TEXT, PRIMARY KEY (key, templates))"
+                )
+                # purge entries that haven't been updated for a long time:
+                connection.execute(
+                    "DELETE FROM entries WHERE updated_at < ?",
+                    (time.time() - FileSearchCache._EXPIRY_INTERVAL,),
+                )
+        except (OSError, sqlite3.Error) as e:
+            self._disable(e)
+            return None
+
+        self._connection = connection
+        return self._connection
+
+    def _disable(self, error):
+        """
+        Disable the persistent cache for the rest of the session.
+
+        :param error:   The error that caused the persistent cache to be disabled
+        """
+        app = sgtk.platform.current_bundle()
+        app.log_debug("File Search Cache: Persistent cache disabled: %s" % error)
+        self._disabled = True
+        if self._connection:
+            try:
+                self._connection.close()
+            except sqlite3.Error:
+                pass
+            self._connection = None
+
+    @staticmethod
+    def _encode_value(value):
+        """
+        Convert serialized file data into a form that can be stored as JSON without losing
+        the tuples used for file keys or the datetimes found in file and publish details.
+
+        :param value:   The value to encode
+        :returns:       The encoded value - see _decode_value()
+        :raises TypeError: If the value contains data that can't be stored as JSON
+        """
+        if isinstance(value, datetime):
+            if value.tzinfo:
+                timestamp = calendar.timegm(value.utctimetuple())
+            else:
+                timestamp = time.mktime(value.timetuple())
+            return {
+                "__datetime__": timestamp + value.microsecond / 1000000.0,
+                "local": value.tzinfo is not None,
+            }
+        if isinstance(value, tuple):
+            return {"__tuple__": [FileSearchCache._encode_value(v) for v in value]}
+        if isinstance(value, list):
+            return [FileSearchCache._encode_value(v) for v in value]
+        if isinstance(value, dict):
+            encoded = {}
+            for k, v in six.iteritems(value):
+                if not isinstance(k, six.string_types):
+                    raise TypeError("Unable to store dictionary key %r" % (k,))
+                encoded[k] = FileSearchCache._encode_value(v)
+            return encoded
+        return value
+
+    @staticmethod
+    def _decode_value(value):
+        """
+        The inverse of _encode_value().
+
+        :param value:   The value loaded from JSON
+        :returns:       The decoded value
+        """
+        if isinstance(value, list):
+            return [FileSearchCache._decode_value(v) for v in value]
+        if isinstance(value, dict):
+            if "__tuple__" in value:
+                return tuple(
+                    FileSearchCache._decode_value(v) for v in value["__tuple__"]
+                )
+            if "__datetime__" in value:
+                if value["local"]:
+                    return datetime.fromtimestamp(
+                        value["__datetime__"], sg_timezone.local
+                    )
+                return datetime.fromtimestamp(value["__datetime__"])
+            return dict(
+                (k, FileSearchCache._decode_value(v)) for k, v in six.iteritems(value)
+            )
+        return value
+
+    def _get_templates_key(self, work_area):
+        """
+        :param work_area:   The work area to return a key for
+        :returns:           A string that uniquely identifies the work and publish templates
+                            of the work area
+        """
+        return "|".join(
+            "%s:%s" % (template.root_path, template.definition) if template else ""
+            for template in (work_area.work_template, work_area.publish_template)
+        )
 
     def _find_entry(self, work_area):
         """
@@ -0,0 +1,145 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Directory listings shared between searches that are run at the same time.
+"""
+import os
+import threading
+
+from .util import Threaded
+
+
+class SharedDirectoryScan(Threaded):
+    """
+    Directory listings and stats shared by all work file walks that are run as part of
+    the same group of searches.
+
+    When an entity is selected, a search is run for the entity and for each of its tasks.
+    The work areas for these searches typically overlap (e.g. tasks for the same step
+    share the same work directories) so rather than each search listing the same
+    directories, the first walk to reach a directory lists it and all other walks re-use
+    that listing, matching the entries against their own templates and fields.
+
+    If several walks reach the same directory at the same time then only one of them lists
+    it whilst the others wait for the result.
+
+    Note, listings are never refreshed so an instance should only be used for a single
+    group of searches and then discarded.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        # directory path:list(DirEntry) or None if it can't be listed:
+        self._listings = {}
+        self._pending_listings = {}  # directory path:threading.Event
+        self._stats = {}  # path:os.stat_result or None if it can't be stat'ed
+
+    def scandir(self, dir_path):
+        """
+        List the entries in a directory, re-using the listing if the directory has already
+        been listed as part of this scan.
+
+        :param dir_path:    The directory to list
+        :returns:           A list of os.DirEntry instances or None if the directory couldn't
+                            be listed
+        """
+        while True:
+            is_listed, entries, pending = self._get_or_claim_listing(dir_path)
+            if is_listed:
+                return entries
+            if pending is None:
+                # we've claimed the directory so it's our job to list it:
+                break
+            # another walk is listing the directory so wait for it to finish:
+            pending.wait()
+
+        entries = None
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            # ignore directories we can't list, the same as glob does!
+            pass
+        finally:
+            self._set_listing(dir_path, entries)
+        return entries
+
+    def stat(self, path):
+        """
+        Stat a path, re-using the result if the path has already been stat'ed as part of
+        this scan.
+
+        :param path:    The path to stat
+        :returns:       An os.stat_result or None if the path couldn't be stat'ed
+        """
+        found, stat = self._get_stat(path)
+        if found:
+            return stat
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        self._set_stat(path, stat)
+        return stat
+
+    @Threaded.exclusive
+    def _get_or_claim_listing(self, dir_path):
+        """
+        Get the listing for a directory if it's been listed or claim it so that the caller
+        is responsible for listing it.
+
+        :param dir_path:    The directory to get the listing for
+        :returns:           A tuple (is_listed, entries, pending).  If is_listed is True then
+                            entries contains the listing.  Otherwise pending is a
+                            threading.Event to wait on if another thread is listing the
+                            directory or None if the caller has claimed the directory and
+                            must call _set_listing() once it's been listed.
+        """
+        if dir_path in self._listings:
+            return True, self._listings[dir_path], None
+        pending = self._pending_listings.get(dir_path)
+        if pending is None:
+            self._pending_listings[dir_path] = threading.Event()
+        return False, None, pending
+
+    @Threaded.exclusive
+    def _set_listing(self, dir_path, entries):
+        """
+        Store the listing for a directory and wake up anything waiting for it.
+
+        :param dir_path:    The directory that was listed
+        :param entries:     The list of entries or None if the directory couldn't be listed
+        """
+        self._listings[dir_path] = entries
+        pending = self._pending_listings.pop(dir_path, None)
+        if pending:
+            pending.set()
+
+    @Threaded.exclusive
+    def _get_stat(self, path):
+        """
+        :param path:    The path to get the stat for
+        :returns:       A tuple (found, stat) where found is True if the path has been
+                        stat'ed before
+        """
+        if path in self._stats:
+            return True, self._stats[path]
+        return False, None
+
+    @Threaded.exclusive
+    def _set_stat(self, path, stat):
+        """
+        :param path:    The path that was stat'ed
+        :param stat:    The os.stat_result or None if the path couldn't be stat'ed
+        """
+        self._stats[path] = stat
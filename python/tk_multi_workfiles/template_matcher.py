@@ -0,0 +1,335 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compiled matcher used to extract fields and file keys from large numbers of paths.
+"""
+import os
+import re
+
+from sgtk import TankError
+
+from .util import Threaded
+
+
+class TemplateMatcher(object):
+    """
+    Extracts template fields from paths using regular expressions compiled once from the
+    template definition rather than running the generic template parser for every path.
+
+    Each variation of the template (one for each combination of optional keys) is compiled
+    into a pair of expressions, one matching key values lazily and one greedily.  If both
+    match a path and agree on the values then there is only one way the path can be split
+    into key values and the fields are converted directly.  Anything else (no match,
+    ambiguous matches or values that fail to convert) is handed to template.get_fields() so
+    that the results are the same as those of the template itself.
+
+    The matcher also builds the file keys used to group different versions of the same file
+    together with the template defaults and ignored fields precomputed.  File keys are
+    interned so that equal keys are usually the same object rather than many copies of the
+    same tuple.
+    """
+
+    class _Cache(Threaded):
+        """
+        Cache of matchers so that each template is only compiled once.
+        """
+
+        def __init__(self):
+            """
+            Construction
+            """
+            Threaded.__init__(self)
+            self._matchers = {}
+
+        @Threaded.exclusive
+        def get(self, template, ignore_fields):
+            """
+            Get the matcher for the specified template and ignore fields, creating it if
+            needed.
+
+            :param template:        The template to get the matcher for
+            :param ignore_fields:   List of fields to ignore when building file keys
+            :returns:               A TemplateMatcher instance
+            """
+            cache_key = (
+                template.name,
+                template.root_path,
+                template.definition,
+                tuple(sorted(ignore_fields or [])),
+            )
+            matcher = self._matchers.get(cache_key)
+            if matcher is None:
+                matcher = TemplateMatcher(template, ignore_fields)
+                self._matchers[cache_key] = matcher
+            return matcher
+
+    _cache = _Cache()
+
+    # regular expression used to find keys in a template definition:
+    _KEY_RE = re.compile(r"{[^}]*}")
+
+    # maximum number of converted values to remember:
+    _MAX_CACHED_VALUES = 50000
+
+    # table of interned file keys.  This is cleared once it reaches the maximum size so
+    # equal keys interned before and after may be different objects - keys must always be
+    # compared with ==:
+    _file_keys = {}  # file key:file key
+    _MAX_FILE_KEYS = 100000
+
+    @staticmethod
+    def get(template, ignore_fields=None):
+        """
+        Get the shared matcher for the specified template and ignore fields.
+
+        :param template:        The template to get the matcher for
+        :param ignore_fields:   List of fields to ignore when building file keys
+        :returns:               A TemplateMatcher instance
+        """
+        return TemplateMatcher._cache.get(template, ignore_fields)
+
+    @staticmethod
+    def intern_file_key(file_key):
+        """
+        Get the shared instance of the specified file key so that all equal keys are the
+        same object.
+
+        :param file_key:    The file key to intern
+        :returns:           The interned file key.  This is equal to the key passed in but
+                            may be a different object.
+        """
+        file_keys = TemplateMatcher._file_keys
+        if (
+            len(file_keys) >= TemplateMatcher._MAX_FILE_KEYS
+            and file_key not in file_keys
+        ):
+            file_keys.clear()
+        # dict.setdefault is atomic so this is safe to call from multiple threads:
+        return file_keys.setdefault(file_key, file_key)
+
+    def __init__(self, template, ignore_fields=None):
+        """
+        Construction
+
+        :param template:        The template to match paths against
+        :param ignore_fields:   List of fields to ignore when building file keys.  'version' and
+                                'extension' are always ignored.
+        """
+        self._template = template
+
+        # always want to ignore 'version' and 'extension' when building file keys:
+        self._ignore_fields = frozenset(
+            list(ignore_fields or []) + ["version", "extension"]
+        )
+        self._template_key_names = frozenset(template.keys)
+        self._key_defaults = [
+            (key.name, key.default)
+            for key in template.keys.values()
+            if key.default is not None and key.name not in self._ignore_fields
+        ]
+
+        # compile the expressions for each variation of the template.  The variations
+        # aren't part of the public Template API so if they aren't available then every
+        # path is handed to template.get_fields() instead:
+        self._variations = []
+        definitions = getattr(template, "_definitions", None)
+        all_ordered_keys = getattr(template, "_ordered_keys", None)
+        if definitions is not None and all_ordered_keys is not None:
+            for definition, ordered_keys in zip(definitions, all_ordered_keys):
+                self._variations.append(self._compile(definition, ordered_keys))
+
+        # most values (e.g. entity names, steps, users) are shared by a lot of paths so
+        # remember the converted values rather than converting them for every path:
+        self._converted_values = {}  # (key name, string value):value
+
+    @property
+    def template(self):
+        """
+        :returns:   The template this matcher was built for
+        """
+        return self._template
+
+    def get_fields(self, path):
+        """
+        Extract the fields from a path.  This is equivalent to template.get_fields().
+
+        :param path:    The path to extract fields from
+        :returns:       Dictionary of fields extracted from the path
+        :raises:        TankError if the path doesn't match the template
+        """
+        norm_path = os.path.normpath(path)
+        for variation in self._variations:
+            if variation is None:
+                # this variation can't be matched with an expression:
+                break
+            lazy_re, greedy_re, keys = variation
+
+            lazy_match = lazy_re.match(norm_path)
+            if not lazy_match:
+                # the path doesn't match this variation so try the next one:
+                continue
+
+            greedy_match = greedy_re.match(norm_path)
+            if not greedy_match or lazy_match.groups() != greedy_match.groups():
+                # the values are ambiguous so let the template resolve them:
+                break
+
+            fields = self._convert_values(keys, lazy_match.groups())
+            if fields is None:
+                break
+            return fields
+
+        return self._template.get_fields(path)
+
+    def validate_and_get_fields(self, path):
+        """
+        Extract the fields from a path if it matches the template.
+
+        :param path:    The path to extract fields from
+        :returns:       Dictionary of fields extracted from the path or None if the path
+                        doesn't match the template
+        """
+        try:
+            return self.get_fields(path)
+        except TankError:
+            return None
+
+    def get_fields_for_paths(self, paths):
+        """
+        Extract the fields for a list of paths in one go.
+
+        :param paths:   A list of paths to extract fields from
+        :returns:       A dictionary {path:fields} containing the fields for each path or None
+                        if the path doesn't match the template
+        """
+        return dict((path, self.validate_and_get_fields(path)) for path in paths)
+
+    def build_file_key(self, fields):
+        """
+        Build the unique file key from the specified fields.  This is equivalent to
+        FileItem.build_file_key() for the template and ignore fields of this matcher.
+
+        :param fields:  A dictionary of fields extracted from a path
+        :returns:       An immutable, interned key that can be used to compare files
+        """
+        file_key = dict(
+            (name, value)
+            for name, value in fields.items()
+            if name not in self._ignore_fields and name in self._template_key_names
+        )
+        for name, default in self._key_defaults:
+            if name not in file_key:
+                file_key[name] = default
+        return TemplateMatcher.intern_file_key(tuple(sorted(file_key.items())))
+
+    def get_fields_and_keys(self, paths):
+        """
+        Extract the fields and build the file key for each of the specified paths.
+
+        :param paths:   A list of paths to process
+        :returns:       A dictionary {path:(fields, file key)} for all paths that match the
+                        template
+        """
+        results = {}
+        for path in paths:
+            fields = self.validate_and_get_fields(path)
+            if fields is not None:
+                results[path] = (fields, self.build_file_key(fields))
+        return results
+
+    def _compile(self, definition, ordered_keys):
+        """
+        Compile the lazy and greedy expressions for a single variation of the template.
+
+        :param definition:      The definition of the variation relative to the template root
+        :param ordered_keys:    The keys in the order they appear in the definition
+        :returns:               A tuple (lazy regex, greedy regex, keys) or None if the
+                                variation can't be represented by an expression
+        """
+        full_definition = (
+            os.path.join(self._template.root_path, definition)
+            if definition
+            else self._template.root_path
+        )
+        static_tokens = self._KEY_RE.split(full_definition)
+        if len(static_tokens) != len(ordered_keys) + 1:
+            return None
+
+        lazy_parts = []
+        greedy_parts = []
+        for index, key in enumerate(ordered_keys):
+            if index and not static_tokens[index]:
+                # adjacent keys can only be separated by validating their values
+                return None
+            lazy_parts.append(re.escape(static_tokens[index]))
+            greedy_parts.append(re.escape(static_tokens[index]))
+            # key values can never contain a path separator:
+            lazy_parts.append(r"([^%s]+?)" % re.escape(os.sep))
+            greedy_parts.append(r"([^%s]+)" % re.escape(os.sep))
+        lazy_parts.append(re.escape(static_tokens[-1]) + r"\Z")
+        greedy_parts.append(re.escape(static_tokens[-1]) + r"\Z")
+
+        flags = re.IGNORECASE | re.UNICODE
+        return (
+            re.compile("".join(lazy_parts), flags),
+            re.compile("".join(greedy_parts), flags),
+            list(ordered_keys),
+        )
+
+    def _convert_values(self, keys, values):
+        """
+        Convert the string values matched for a variation into field values.
+
+        :param keys:    The keys in the order they were matched
+        :param values:  The matched string values
+        :returns:       A dictionary of fields or None if the values couldn't be converted
+        """
+        fields = {}
+        str_values = {}
+        for key, str_value in zip(keys, values):
+            previous_str_value = str_values.get(key.name)
+            if previous_str_value is not None:
+                if previous_str_value != str_value:
+                    # conflicting values for the same key
+                    return None
+                continue
+            value = self._convert_value(key, str_value)
+            if value is None:
+                return None
+            fields[key.name] = value
+            str_values[key.name] = str_value
+        return fields
+
+    def _convert_value(self, key, str_value):
+        """
+        Convert a single string value for a key, re-using the previously converted value
+        if the same string has been converted before.
+
+        :param key:         The template key to convert the value for
+        :param str_value:   The string value matched for the key
+        :returns:           The converted value or None if it isn't valid for the key
+        """
+        cache_key = (key.name, str_value)
+        value = self._converted_values.get(cache_key)
+        if value is not None:
+            return value
+
+        if key.length is not None and len(str_value) < key.length:
+            return None
+        try:
+            value = key.value_from_str(str_value)
+        except TankError:
+            return None
+
+        if len(self._converted_values) >= TemplateMatcher._MAX_CACHED_VALUES:
+            self._converted_values = {}
+        self._converted_values[cache_key] = value
+        return value
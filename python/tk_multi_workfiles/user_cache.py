@@ -15,24 +15,25 @@ import os
 import sys
 import sgtk
 
-from .util import Threaded
+from .util import SnapshotDict
 
 
-class UserCache(Threaded):
+class UserCache(object):
     """
-    A cache of user information retrieved from Shotgun as needed
+    A cache of user information retrieved from Shotgun as needed.  The cache is read by all
+    background searches so lookups don't take a lock - see SnapshotDict.
     """
 
     def __init__(self):
         """
         Construction
         """
-        Threaded.__init__(self)
         self._app = sgtk.platform.current_bundle()
         self._current_user = sgtk.util.get_current_user(self._app.sgtk)
 
-        self._user_details_by_login = {}
-        self._user_details_by_id = {}
+        self._user_details_by_login = SnapshotDict()
+        self._user_details_by_id = SnapshotDict()
+        self._login_by_uid = SnapshotDict()
 
         self._sg_fields = ["id", "type", "email", "login", "name", "image"]
 
@@ -106,32 +107,202 @@ class UserCache(Threaded):
 
         return user_details
 
-    def get_file_last_modified_user(self, path):
+    def get_file_last_modified_user(self, path, stat=None):
         """
         Get the user details of the last person to modify the specified file.  Note, this currently
         doesn't work on Windows as Windows doesn't provide this information as standard
 
         :param path:    The path to find the last modified user for
+        :param stat:    Optional os.stat_result for the path.  If this is provided then it is
+                        used rather than stat'ing the path again.
         :returns:       A  Shotgun entity dictionary for the HumanUser that last modified the path
         """
+        stats = {path: stat} if stat is not None else None
+        return self.get_file_last_modified_users([path], stats).get(path)
 
-        login_name = None
+    def get_file_last_modified_users(self, paths, stats=None):
+        """
+        Get the user details of the last person to modify each of the specified files.  All
+        users that haven't been looked up before are found with a single Shotgun query.  Note,
+        this currently doesn't work on Windows as Windows doesn't provide this information as
+        standard
+
+        :param paths:   A list of the paths to find the last modified user for
+        :param stats:   Optional dictionary {path:os.stat_result}.  Paths that have a stat
+                        result in this dictionary won't be stat'ed again.
+        :returns:       A dictionary {path:user} containing the Shotgun entity dictionary for
+                        the HumanUser that last modified each path or None if the user couldn't
+                        be determined
+        """
         if sgtk.util.is_windows():
             # TODO: add windows support..
-            pass
-        else:
+            return {}
+
+        stats = stats or {}
+        uids_by_path = {}
+        for path in paths:
+            stat = stats.get(path)
+            if stat is None:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+            uids_by_path[path] = stat.st_uid
+
+        users_by_uid = self.get_users_for_uids(set(uids_by_path.values()))
+        return dict((path, users_by_uid.get(uid)) for path, uid in uids_by_path.items())
+
+    def get_users_for_uids(self, uids):
+        """
+        Get the user details for each of the specified system user ids.  Uids are resolved to
+        logins once and all logins that haven't been looked up before are found with a single
+        Shotgun query.
+
+        :param uids:    A list of system user ids to find the users for
+        :returns:       A dictionary {uid:user} containing the Shotgun entity dictionary for the
+                        HumanUser with the login for each uid.  This will be an empty dictionary
+                        if there is no HumanUser for the login or None if the uid doesn't have a
+                        login
+        """
+        logins_by_uid = self._get_logins_for_uids(uids)
+        users_by_login = self._get_user_details_for_logins(
+            set(login for login in logins_by_uid.values() if login)
+        )
+        return dict(
+            (uid, users_by_login.get(login)) for uid, login in logins_by_uid.items()
+        )
+
+    def get_user_details_for_field_values(self, field_name, values):
+        """
+        Get the user details for the users whose Shotgun field has one of the specified values,
+        e.g. the users for the values of a HumanUser template key.  All values are looked up
+        with a single Shotgun query.
+
+        :param field_name:  The HumanUser field to match the values against, e.g. 'login'
+        :param values:      A list of the field values to find users for
+        :returns:           A dictionary {value:user} containing the Shotgun entity dictionary
+                            for each user found.  Values that don't match a user are omitted.
+        """
+        values = set(values)
+        if not values:
+            return {}
+
+        if field_name == "login":
+            # logins are cached so use the cache:
+            users_by_login = self._get_user_details_for_logins(values)
+            return dict((login, user) for login, user in users_by_login.items() if user)
+
+        try:
+            sg_users = self._app.shotgun.find(
+                "HumanUser",
+                [[field_name, "in", list(values)]],
+                self._sg_fields + [field_name],
+            )
+        except Exception as e:
+            # this isn't critical so just log as debug
+            self._app.log_debug(
+                "Failed to retrieve Shotgun users for %s values %s: %s"
+                % (field_name, sorted(values), e)
+            )
+            return {}
+
+        users = {}
+        for sg_user in sg_users:
+            value = sg_user.get(field_name)
+            if value not in values:
+                continue
+            details = dict((k, v) for k, v in sg_user.items() if k in self._sg_fields)
+            self._cache_user(details.get("login"), details.get("id"), details)
+            users[value] = details
+        return users
+
+    def _get_logins_for_uids(self, uids):
+        """
+        Get the system login names for the specified system user ids.  The login for each uid
+        is only looked up once.
+
+        :param uids:    A list of system user ids to find the logins for
+        :returns:       A dictionary {uid:login} containing the login name for each uid or None
+                        if it couldn't be found
+        """
+        logins = {}
+        uids_to_find = []
+        for uid in uids:
+            login = self._get_login_for_uid(uid)
+            if login is not None or self._is_uid_cached(uid):
+                logins[uid] = login
+            else:
+                uids_to_find.append(uid)
+
+        if uids_to_find:
             try:
                 from pwd import getpwuid
+            except ImportError:
+                getpwuid = None
+
+            for uid in uids_to_find:
+                login = None
+                if getpwuid:
+                    try:
+                        login = getpwuid(uid).pw_name
+                    except KeyError:
+                        # the uid doesn't exist on this system
+                        pass
+                self._cache_login(uid, login)
+                logins[uid] = login
+        return logins
+
+    def _get_user_details_for_logins(self, login_names):
+        """
+        Get the shotgun HumanUser entries for the specified login names.  Any that haven't
+        already been found are looked up with a single Shotgun query.
 
-                login_name = getpwuid(os.stat(path).st_uid).pw_name
-            except:
-                pass
+        :param login_names: The login names of the users to find
+        :returns:           A dictionary {login:user} containing the Shotgun entity dictionary
+                            for each HumanUser found or an empty dictionary if the user
+                            couldn't be found
+        """
+        # first look to see if we've already found the users:
+        users = {}
+        logins_to_fetch = set()
+        for login_name in login_names:
+            sg_user = self._get_user_for_login(login_name)
+            if sg_user is None:
+                logins_to_fetch.add(login_name)
+            else:
+                users[login_name] = sg_user
+
+        if not logins_to_fetch:
+            return users
+
+        # have to do a Shotgun lookup:
+        try:
+            sg_users = self._app.shotgun.find(
+                "HumanUser", [["login", "in", list(logins_to_fetch)]], self._sg_fields
+            )
+        except Exception as e:
+            # this isn't critical so just log as debug
+            self._app.log_debug(
+                "Failed to retrieve Shotgun users for logins %s: %s"
+                % (sorted(logins_to_fetch), e)
+            )
+            return users
+
+        # cache the sg users so we don't have to look for them again
+        for sg_user in sg_users:
+            login_name = sg_user.get("login")
+            if login_name not in logins_to_fetch:
+                continue
+            self._cache_user(login_name, sg_user.get("id"), sg_user)
+            users[login_name] = sg_user
 
-        if login_name:
-            sg_user = self._get_user_details_for_login(login_name)
-            return sg_user
+        # and fill in any blanks so we don't bother searching again:
+        for login_name in logins_to_fetch:
+            if login_name not in users:
+                self._cache_user(login_name, None, {})
+                users[login_name] = {}
 
-        return None
+        return users
 
     def _get_user_details_for_login(self, login_name):
         """
@@ -140,29 +311,8 @@ class UserCache(Threaded):
         :param login_name:  The login name of the user to find
         :returns:           A Shotgun entity dictionary for the HumanUser entity found
         """
-        # first look to see if we've already found the user:
-        sg_user = self._get_user_for_login(login_name)
-        if not sg_user:
-            # have to do a Shotgun lookup:
-            try:
-                sg_user = self._app.shotgun.find_one(
-                    "HumanUser", [["login", "is", login_name]], self._sg_fields
-                )
-                # handle sg_user being None
-                sg_user = sg_user or {}
-            except Exception as e:
-                # this isn't critical so just log as debug
-                self._app.log_debug(
-                    "Failed to retrieve Shotgun user for login '%s': %s"
-                    % (login_name, e)
-                )
+        return self._get_user_details_for_logins([login_name]).get(login_name)
 
-            # cache the sg user so we don't have to look for it again
-            self._cache_user(login_name, sg_user.get("id"), sg_user)
-
-        return sg_user
-
-    @Threaded.exclusive
     def _get_user_for_id(self, user_id):
         """
         Thread-safe mechanism to get the cached user for the specified user id
@@ -173,7 +323,6 @@ class UserCache(Threaded):
         """
         return self._user_details_by_id.get(user_id)
 
-    @Threaded.exclusive
     def _get_user_for_login(self, login):
         """
         Thread-safe mechanism to get the cached user for the specified user login
@@ -184,7 +333,33 @@ class UserCache(Threaded):
         """
         return self._user_details_by_login.get(login)
 
-    @Threaded.exclusive
+    def _get_login_for_uid(self, uid):
+        """
+        Thread-safe mechanism to get the cached login for the specified system user id
+
+        :param uid: The system user id to find the login for
+        :returns:   The login name if found in the cache, otherwise None
+        """
+        return self._login_by_uid.get(uid)
+
+    def _is_uid_cached(self, uid):
+        """
+        Thread-safe mechanism to check if the specified system user id has been looked up
+
+        :param uid: The system user id to check
+        :returns:   True if the uid has already been looked up, otherwise False
+        """
+        return uid in self._login_by_uid
+
+    def _cache_login(self, uid, login):
+        """
+        Thread-safe mechanism to add the login for the specified system user id to the cache
+
+        :param uid:     The system user id to add
+        :param login:   The login name for the uid or None if it couldn't be found
+        """
+        self._login_by_uid.set(uid, login)
+
     def _cache_user(self, login, user_id, details):
         """
         Thread-safe mechanism to add the specified user to the cache
@@ -194,9 +369,9 @@ class UserCache(Threaded):
         :param details: Shotgun entity dictionary containing the details of the user to add
         """
         if login != None:
-            self._user_details_by_login[login] = details
+            self._user_details_by_login.set(login, details)
         if user_id != None:
-            self._user_details_by_id[user_id] = details
+            self._user_details_by_id.set(user_id, details)
 
 
 # single global instance of the user cache
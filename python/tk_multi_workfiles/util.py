@@ -11,6 +11,8 @@
 """
 Various utility methods used by the app code
 """
+import copy
+import datetime
 import threading
 
 import sgtk
@@ -63,6 +65,213 @@ class Threaded(object):
         return wrapper
 
 
+class SnapshotDict(object):
+    """
+    Dictionary for data that is read far more often than it's written by multiple threads.
+
+    Lookups read the current snapshot of the data without taking a lock so concurrent
+    lookups never block each other or wait for a writer.  Writers are serialized by a lock
+    and copy the snapshot, modify the copy and then publish it in place of the current
+    snapshot.  A published snapshot is never modified so it can be read and iterated safely
+    from any thread.
+
+    Writes are O(n) so this shouldn't be used for data that is written as often as it's read.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        self._lock = threading.Lock()
+        self._snapshot = {}
+
+    @property
+    def snapshot(self):
+        """
+        :returns:   The current snapshot of the data.  This must not be modified!
+        """
+        return self._snapshot
+
+    def get(self, key, default=None):
+        """
+        :param key:     The key to look up
+        :param default: The value to return if the key isn't found
+        :returns:       The value for the key or default if it isn't found
+        """
+        return self._snapshot.get(key, default)
+
+    def __contains__(self, key):
+        """
+        :param key: The key to look up
+        :returns:   True if the key is found, otherwise False
+        """
+        return key in self._snapshot
+
+    def __len__(self):
+        """
+        :returns:   The number of items in the current snapshot
+        """
+        return len(self._snapshot)
+
+    def set(self, key, value):
+        """
+        :param key:     The key to set the value for
+        :param value:   The value to set
+        """
+        self.update({key: value})
+
+    def update(self, items):
+        """
+        Update multiple items in a single write.
+
+        :param items:   A dictionary of the items to update
+        """
+        with self._lock:
+            snapshot = dict(self._snapshot)
+            snapshot.update(items)
+            self._snapshot = snapshot
+
+    def setdefault(self, key, value):
+        """
+        Set the value for a key unless it already has one.  This is atomic so if several
+        threads set a value for the same key then they all get the first value set.
+
+        :param key:     The key to set the value for
+        :param value:   The value to set if the key doesn't have one
+        :returns:       The value for the key
+        """
+        snapshot = self._snapshot
+        if key in snapshot:
+            return snapshot[key]
+        with self._lock:
+            if key in self._snapshot:
+                return self._snapshot[key]
+            snapshot = dict(self._snapshot)
+            snapshot[key] = value
+            self._snapshot = snapshot
+        return value
+
+    def pop(self, key, default=None):
+        """
+        :param key:     The key to remove
+        :param default: The value to return if the key isn't found
+        :returns:       The value removed for the key or default if it isn't found
+        """
+        with self._lock:
+            if key not in self._snapshot:
+                return default
+            snapshot = dict(self._snapshot)
+            value = snapshot.pop(key)
+            self._snapshot = snapshot
+        return value
+
+    def clear(self):
+        """
+        Remove all items.
+        """
+        with self._lock:
+            self._snapshot = {}
+
+
+class ReadOnlyDict(dict):
+    """
+    Dictionary that can't be modified once it has been created.  This is used for Shotgun
+    data that is shared between threads and searches so that it can be passed around by
+    reference rather than being copied for each consumer.
+
+    To change the data, create a new dictionary from it, e.g. dict(read_only_dict).
+    """
+
+    def _read_only(self, *args, **kwargs):
+        """
+        :raises:    TypeError as the dictionary can't be modified
+        """
+        raise TypeError("'%s' object is read-only" % type(self).__name__)
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+    __ior__ = _read_only
+
+    def __copy__(self):
+        """
+        :returns:   This instance as it can't be modified
+        """
+        return self
+
+    def __deepcopy__(self, memo):
+        """
+        :param memo:    The memo dictionary used by copy.deepcopy()
+        :returns:       This instance if all values are immutable, otherwise a deep copy
+        """
+        if all(isinstance(v, _IMMUTABLE_TYPES) for v in self.values()):
+            return self
+        return ReadOnlyDict(copy.deepcopy(dict(self), memo))
+
+    def __reduce__(self):
+        """
+        :returns:   Pickle support - the default for dict sub-classes sets each item on
+                    an empty instance which isn't allowed for this class
+        """
+        return (ReadOnlyDict, (dict(self),))
+
+
+# types of value that are never modified in place:
+_IMMUTABLE_TYPES = (
+    (
+        ReadOnlyDict,
+        tuple,
+        frozenset,
+        bool,
+        float,
+        datetime.datetime,
+        datetime.date,
+        type(None),
+    )
+    + six.integer_types
+    + six.string_types
+    + (six.binary_type,)
+)
+
+
+def freeze_sg_data(value):
+    """
+    Convert Shotgun data into a read-only form that can be shared between threads without
+    being copied.  Dictionaries are converted to ReadOnlyDict's and lists to tuples, recursively.
+
+    :param value:   The Shotgun data to convert, e.g. an entity dictionary or list of
+                    entity dictionaries
+    :returns:       The read-only version of the data
+    """
+    if isinstance(value, ReadOnlyDict):
+        return value
+    if isinstance(value, dict):
+        return ReadOnlyDict((k, freeze_sg_data(v)) for k, v in six.iteritems(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_sg_data(v) for v in value)
+    return value
+
+
+def thaw_sg_data(value):
+    """
+    Convert read-only Shotgun data back into plain dictionaries and lists, recursively.  This
+    is the reverse of freeze_sg_data() and is used to give hooks data they can modify and to
+    serialize the data without depending on the classes in this module.
+
+    :param value:   The Shotgun data to convert
+    :returns:       A copy of the data containing only plain dictionaries and lists
+    """
+    if isinstance(value, dict):
+        return dict((k, thaw_sg_data(v)) for k, v in six.iteritems(value))
+    if isinstance(value, (list, tuple)):
+        return [thaw_sg_data(v) for v in value]
+    return value
+
+
 def value_to_str(value):
     """
     Safely convert the value to a string - handles QtCore.QString if usign PyQt
@@ -299,6 +508,34 @@ def get_template_user_keys(template):
     return user_keys
 
 
+def get_context_key(context):
+    """
+    Build a key for a context that can be used in a dictionary.  Contexts can't be used as
+    dictionary keys themselves as their hash isn't consistent with their equality so the key
+    is built from the same entities that are compared when testing contexts for equality.
+
+    :param context: The context to build a key for
+    :returns:       A hashable key that is equal for contexts that compare equal
+    """
+
+    def _entity_key(entity):
+        return (entity["type"], entity["id"]) if entity else None
+
+    additional_entities = None
+    if context.additional_entities:
+        additional_entities = frozenset(
+            (e["type"], e["id"]) for e in context.additional_entities if e
+        )
+    return (
+        _entity_key(context.project),
+        _entity_key(context.entity),
+        _entity_key(context.step),
+        _entity_key(context.task),
+        additional_entities,
+        _entity_key(context.user),
+    )
+
+
 def resolve_filters(filters):
     """
 
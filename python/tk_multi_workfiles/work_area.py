@@ -13,11 +13,13 @@ Environment and context abstraction.
 """
 
 import copy
+import time
 import sgtk
 from sgtk import TankError
 
 from .user_cache import g_user_cache
-from .util import Threaded, get_template_user_keys
+from .template_matcher import TemplateMatcher
+from .util import SnapshotDict, get_template_user_keys, get_context_key
 
 
 class WorkArea(object):
@@ -29,19 +31,18 @@ class WorkArea(object):
     # Number of template settings for the app.
     NB_TEMPLATE_SETTINGS = 4
 
-    class _SettingsCache(Threaded):
+    class _SettingsCache(object):
         """
-        Cache of settings per context.
+        Cache of settings per context.  Settings are looked up far more often than they are
+        added so lookups don't take a lock.
         """
 
         def __init__(self):
             """
             Constructor.
             """
-            Threaded.__init__(self)
-            self._cache = []
+            self._cache = SnapshotDict()  # context key:settings
 
-        @Threaded.exclusive
         def get(self, context):
             """
             Retrieve the cached settings for a given context.
@@ -50,12 +51,8 @@ class WorkArea(object):
 
             :returns: The settings dictionary or None
             """
-            for ctx, settings in self._cache:
-                if ctx == context:
-                    return settings
-            return None
+            return self._cache.get(get_context_key(context))
 
-        @Threaded.exclusive
         def add(self, context, settings):
             """
             Cache settings for a given context.
@@ -63,10 +60,71 @@ class WorkArea(object):
             :param context: Context for which these settings need to be cached.
             :param settings: Settings to cache.
             """
-            self._cache.append((context, copy.deepcopy(settings)))
+            self._cache.set(get_context_key(context), copy.deepcopy(settings))
 
     _settings_cache = _SettingsCache()
 
+    class _SandboxUsersCache(object):
+        """
+        Cache of the users resolved from the user sandboxes on disk per template and context.
+        Entries expire so that new sandboxes are picked up.  Users are looked up far more
+        often than they are added so lookups don't take a lock.
+        """
+
+        # time in seconds that resolved users are cached for:
+        _TTL = 5 * 60
+
+        def __init__(self):
+            """
+            Constructor.
+            """
+            self._cache = (
+                SnapshotDict()
+            )  # (template key, context key):(users, expires at)
+
+        def get(self, template, context):
+            """
+            Retrieve the cached users for a given template and context.
+
+            :param template: The template the user sandboxes were resolved for.
+            :param context: The context the user sandboxes were resolved for.
+
+            :returns: The list of users or None if they aren't cached.
+            """
+            users, expires_at = self._cache.get(
+                self._get_key(template, context), (None, 0)
+            )
+            if expires_at > time.time():
+                return users
+            return None
+
+        def add(self, template, context, users):
+            """
+            Cache the users for a given template and context.
+
+            :param template: The template the user sandboxes were resolved for.
+            :param context: The context the user sandboxes were resolved for.
+            :param users: The list of users to cache.
+            """
+            now = time.time()
+            # drop any expired entries whilst we're here:
+            for key, (_, expires_at) in list(self._cache.snapshot.items()):
+                if expires_at <= now:
+                    self._cache.pop(key)
+            self._cache.set(self._get_key(template, context), (users, now + self._TTL))
+
+        def _get_key(self, template, context):
+            """
+            :param template: The template the user sandboxes were resolved for.
+            :param context: The context the user sandboxes were resolved for.
+
+            :returns: A key that identifies the template, including the storage root it
+                      resolves paths under, and the context.
+            """
+            return (template.root_path, template.definition, get_context_key(context))
+
+    _sandbox_users_cache = _SandboxUsersCache()
+
     def __init__(self, ctx=None):
         """
         Construction
@@ -447,6 +505,13 @@ class WorkArea(object):
             # already resolved users!
             return users
 
+        # see if the users were resolved recently for another work area:
+        users = WorkArea._sandbox_users_cache.get(template, self._context)
+        if users is not None:
+            users = copy.deepcopy(users)
+            self._sandbox_users[template.definition] = users
+            return users
+
         # update cache:
         self._sandbox_users[template.definition] = []
 
@@ -492,17 +557,44 @@ class WorkArea(object):
         app = sgtk.platform.current_bundle()
         paths = app.sgtk.paths_from_template(search_template, ctx_fields, user_keys)
 
-        # split out users from the list of paths:
+        # split out the values of the user keys from the list of paths.  Only keys that
+        # are linked to a HumanUser field can be looked up by value, any other paths are
+        # resolved through the context for the path below:
+        matcher = TemplateMatcher.get(search_template)
+        user_values = {}  # path:(shotgun field name, value)
+        for path in paths:
+            fields = matcher.validate_and_get_fields(path) or {}
+            for key_name in user_keys:
+                value = fields.get(key_name)
+                key = search_template.keys[key_name]
+                if value is not None and key.shotgun_field_name:
+                    user_values[path] = (key.shotgun_field_name, value)
+                    break
+
+        # and find the users for all values in one go for each field:
+        users_by_field_value = {}
+        values_by_field = {}
+        for field_name, value in user_values.values():
+            values_by_field.setdefault(field_name, set()).add(value)
+        for field_name, values in values_by_field.items():
+            for value, user in g_user_cache.get_user_details_for_field_values(
+                field_name, values
+            ).items():
+                users_by_field_value[(field_name, value)] = user
+
         user_ids = set()
         for path in paths:
-            # to find the user, we have to construct a context
-            # from the path and then inspect the user from this
-            path_ctx = app.sgtk.context_from_path(path)
-            user = path_ctx.user
+            user = users_by_field_value.get(user_values.get(path))
+            if not user:
+                # the user couldn't be found from the path fields so we have to
+                # construct a context from the path and then inspect the user from it
+                path_ctx = app.sgtk.context_from_path(path)
+                user = path_ctx.user
             if user:
                 user_ids.add(user["id"])
 
         # look these up in the user cache:
         users = list(g_user_cache.get_user_details_for_ids(user_ids).values())
         self._sandbox_users[template.definition] = users
+        WorkArea._sandbox_users_cache.add(template, self._context, copy.deepcopy(users))
         return users
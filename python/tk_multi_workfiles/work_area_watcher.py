@@ -0,0 +1,433 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Watcher used to track changes to files in work area directories using Linux inotify.
+"""
+import os
+import sys
+import errno
+import struct
+import ctypes
+import ctypes.util
+
+import sgtk
+from sgtk.platform.qt import QtCore
+from tank_vendor import six
+
+
+class WorkAreaWatcher(QtCore.QObject):
+    """
+    Watches the directories of one or more work areas for files being created, written,
+    moved or deleted.  New sub-directories are walked in a background task so that the UI
+    isn't blocked if a large directory tree is created or moved into a work area.
+
+    Each set of directories is watched under a key provided by the caller.  When a change
+    is first seen for a key the work_area_changed signal is emitted straight away so that
+    anything cached for the key can be invalidated.  Changes are then batched up for a short
+    time before the files_changed signal is emitted with the list of paths that changed.
+
+    Note, this is only supported on Linux - is_supported() should be checked before
+    creating an instance.
+    """
+
+    # inotify event flags - see 'man inotify':
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_ONLYDIR = 0x01000000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    _WATCH_MASK = (
+        _IN_CLOSE_WRITE
+        | _IN_MOVED_FROM
+        | _IN_MOVED_TO
+        | _IN_CREATE
+        | _IN_DELETE
+        | _IN_ONLYDIR
+    )
+
+    # struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+    _EVENT_STRUCT = struct.Struct("iIII")
+
+    # time in milliseconds that changes are batched up for before being reported:
+    _BATCH_INTERVAL = 500
+
+    # lazily loaded libc:
+    _libc = None
+
+    # Signal emitted as soon as a change is detected for a watched key
+    work_area_changed = QtCore.Signal(object)  # key
+    # Signal emitted with the batched list of paths that have changed for a watched key
+    files_changed = QtCore.Signal(object, object)  # key, list of paths
+    # Signal emitted if events were lost and the watched directories need to be searched again
+    watch_overflowed = QtCore.Signal()
+
+    @staticmethod
+    def is_supported():
+        """
+        :returns:   True if inotify is available on this platform, otherwise False
+        """
+        return WorkAreaWatcher._get_libc() is not None
+
+    @staticmethod
+    def _get_libc():
+        """
+        :returns:   The libc library containing the inotify functions or None if it isn't
+                    available
+        """
+        if WorkAreaWatcher._libc is None and sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                if hasattr(libc, "inotify_init1"):
+                    WorkAreaWatcher._libc = libc
+            except OSError:
+                pass
+        return WorkAreaWatcher._libc
+
+    def __init__(self, bg_task_manager, parent=None):
+        """
+        Construction
+
+        :param bg_task_manager: A BackgroundTaskManager instance used to walk new
+                                directories in the background
+        :param parent:          The parent QObject for this instance
+        """
+        QtCore.QObject.__init__(self, parent)
+
+        self._app = sgtk.platform.current_bundle()
+        self._libc = WorkAreaWatcher._get_libc()
+
+        self._bg_task_manager = bg_task_manager
+        self._bg_task_manager.task_completed.connect(self._on_background_task_completed)
+        self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
+        self._walk_tasks = {}  # task id:list(key)
+
+        self._wd_paths = {}  # watch descriptor:directory path
+        self._path_wds = {}  # directory path:watch descriptor
+        self._path_keys = {}  # directory path:set(key)
+        self._key_paths = {}  # key:set(directory path)
+        self._pending_changes = {}  # key:set(changed path)
+        self._overflowed = False
+
+        self._fd = self._libc.inotify_init1(
+            WorkAreaWatcher._IN_NONBLOCK | WorkAreaWatcher._IN_CLOEXEC
+        )
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Failed to initialize inotify")
+
+        self._notifier = QtCore.QSocketNotifier(
+            self._fd, QtCore.QSocketNotifier.Read, self
+        )
+        self._notifier.activated.connect(self._on_notifier_activated)
+
+        self._batch_timer = QtCore.QTimer(self)
+        self._batch_timer.setSingleShot(True)
+        self._batch_timer.setInterval(WorkAreaWatcher._BATCH_INTERVAL)
+        self._batch_timer.timeout.connect(self._on_batch_timer_timeout)
+
+    def shut_down(self):
+        """
+        Stop watching all directories and release the inotify instance.  The watcher
+        can't be used after this has been called.
+        """
+        if self._fd < 0:
+            return
+        self._batch_timer.stop()
+        self._notifier.setEnabled(False)
+        self._notifier.activated.disconnect(self._on_notifier_activated)
+        os.close(self._fd)
+        self._fd = -1
+
+        for task_id in self._walk_tasks:
+            self._bg_task_manager.stop_task(task_id)
+        self._walk_tasks = {}
+        self._bg_task_manager.task_completed.disconnect(
+            self._on_background_task_completed
+        )
+        self._bg_task_manager.task_failed.disconnect(self._on_background_task_failed)
+        self._wd_paths = {}
+        self._path_wds = {}
+        self._path_keys = {}
+        self._key_paths = {}
+        self._pending_changes = {}
+
+    def watch(self, key, directories):
+        """
+        Watch the specified directories for changes under the specified key.  Directories
+        are added to any already being watched for the key and are only stopped being watched
+        when the key is unwatched or the directory is removed.
+
+        :param key:         A hashable key that changes will be reported for
+        :param directories: A list of the directory paths to watch
+        """
+        if self._fd < 0:
+            return
+        current_directories = self._key_paths.get(key, set())
+        for path in set(directories) - current_directories:
+            self._add_watch(key, path)
+
+    def unwatch(self, key):
+        """
+        Stop watching all directories for the specified key.
+
+        :param key: The key to stop watching directories for
+        """
+        for path in list(self._key_paths.get(key, [])):
+            self._remove_watch(key, path)
+        self._pending_changes.pop(key, None)
+
+    def clear(self):
+        """
+        Stop watching all directories for all keys.
+        """
+        for key in list(self._key_paths):
+            self.unwatch(key)
+
+    def _add_watch(self, key, path):
+        """
+        Add a watch for the specified key and directory.
+
+        :param key:     The key to add the watch for
+        :param path:    The directory path to watch
+        """
+        if path not in self._path_wds:
+            wd = self._libc.inotify_add_watch(
+                self._fd, self._encode_path(path), WorkAreaWatcher._WATCH_MASK
+            )
+            if wd < 0:
+                # most likely the directory doesn't exist or the watch limit has been
+                # reached - either way, changes in this directory won't be tracked!
+                self._app.log_debug(
+                    "Work area watcher: Failed to watch '%s': %s"
+                    % (path, os.strerror(ctypes.get_errno()))
+                )
+                return
+            self._wd_paths[wd] = path
+            self._path_wds[path] = wd
+        self._path_keys.setdefault(path, set()).add(key)
+        self._key_paths.setdefault(key, set()).add(path)
+
+    def _remove_watch(self, key, path):
+        """
+        Remove the watch for the specified key and directory.  The directory will stop
+        being watched once it isn't being watched for any keys.
+
+        :param key:     The key to remove the watch for
+        :param path:    The directory path to stop watching
+        """
+        key_paths = self._key_paths.get(key)
+        if key_paths:
+            key_paths.discard(path)
+            if not key_paths:
+                del self._key_paths[key]
+
+        path_keys = self._path_keys.get(path)
+        if path_keys:
+            path_keys.discard(key)
+            if path_keys:
+                # still being watched for other keys
+                return
+            del self._path_keys[path]
+
+        wd = self._path_wds.pop(path, None)
+        if wd is not None:
+            del self._wd_paths[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _encode_path(self, path):
+        """
+        :param path:    The path to encode
+        :returns:       The path encoded as bytes for passing to libc
+        """
+        if isinstance(path, six.text_type):
+            return path.encode(sys.getfilesystemencoding())
+        return path
+
+    def _decode_name(self, name):
+        """
+        :param name:    The name of a file as bytes, as read from an inotify event
+        :returns:       The name as a native string
+        """
+        if six.PY3:
+            return os.fsdecode(name)
+        return name
+
+    def _read_events(self):
+        """
+        Read all available events from the inotify instance.
+
+        :returns:   A generator yielding (watch descriptor, mask, name) for each event
+        """
+        event_size = WorkAreaWatcher._EVENT_STRUCT.size
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return
+                raise
+            if not data:
+                return
+
+            offset = 0
+            while offset + event_size <= len(data):
+                wd, mask, _, name_len = WorkAreaWatcher._EVENT_STRUCT.unpack_from(
+                    data, offset
+                )
+                offset += event_size
+                name = data[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+                yield wd, mask, self._decode_name(name)
+
+    def _on_notifier_activated(self, *args):
+        """
+        Slot triggered when there are inotify events available to be read.
+        """
+        for wd, mask, name in self._read_events():
+            if mask & WorkAreaWatcher._IN_Q_OVERFLOW:
+                # events have been lost so we can't be sure what has changed!
+                self._overflowed = True
+                for key in self._key_paths:
+                    self._add_pending_change(key, None)
+                continue
+
+            dir_path = self._wd_paths.get(wd)
+            if dir_path is None:
+                continue
+
+            if mask & WorkAreaWatcher._IN_IGNORED:
+                # the watch was removed by the kernel because the directory was deleted or
+                # the file system was unmounted:
+                for key in list(self._path_keys.get(dir_path, [])):
+                    self._remove_watch(key, dir_path)
+                continue
+
+            if not name:
+                continue
+            path = os.path.join(dir_path, name)
+            keys = list(self._path_keys.get(dir_path, []))
+
+            if mask & WorkAreaWatcher._IN_ISDIR and mask & (
+                WorkAreaWatcher._IN_CREATE | WorkAreaWatcher._IN_MOVED_TO
+            ):
+                # a new sub-directory - watch it straight away and then walk it in the
+                # background as everything that's already in it needs to be watched and
+                # treated as a change - it may have been populated before the watch was
+                # added:
+                for key in keys:
+                    self._add_watch(key, path)
+                    self._add_pending_change(key, None)
+                task_id = self._bg_task_manager.add_task(
+                    WorkAreaWatcher._task_walk_directory,
+                    group=self._bg_task_manager.next_group_id(),
+                    task_kwargs={"path": path},
+                )
+                self._walk_tasks[task_id] = keys
+                continue
+
+            for key in keys:
+                self._add_pending_change(key, path)
+
+        if self._pending_changes and not self._batch_timer.isActive():
+            self._batch_timer.start()
+
+    @staticmethod
+    def _task_walk_directory(path):
+        """
+        Find all sub-directories and files under a new directory.
+
+        Runs in a background thread.
+
+        :param path:    The path of the directory to walk
+        :returns:       A list of (directory path, list(file path)) tuples for the directory
+                        and all of its sub-directories
+        """
+        return [
+            (dir_path, [os.path.join(dir_path, file_name) for file_name in file_names])
+            for dir_path, _, file_names in os.walk(path)
+        ]
+
+    def _on_background_task_completed(self, task_id, group, result):
+        """
+        Slot triggered when a background task completes.  Watches the directories found
+        under a new directory and adds all files in them as pending changes.
+
+        :param task_id: The id of the task that completed
+        :param group:   The group the task belongs to
+        :param result:  The result of the task - see _task_walk_directory()
+        """
+        keys = self._walk_tasks.pop(task_id, None)
+        if keys is None or self._fd < 0:
+            return
+
+        for key in keys:
+            if key not in self._key_paths:
+                # the key was unwatched whilst the directory was being walked
+                continue
+            for dir_path, file_paths in result:
+                self._add_watch(key, dir_path)
+                for file_path in file_paths:
+                    self._add_pending_change(key, file_path)
+
+        if self._pending_changes and not self._batch_timer.isActive():
+            self._batch_timer.start()
+
+    def _on_background_task_failed(self, task_id, group, msg, stack_trace):
+        """
+        Slot triggered when a background task fails.
+
+        :param task_id:     The id of the task that failed
+        :param group:       The group the task belongs to
+        :param msg:         The error message
+        :param stack_trace: The stack trace of the error
+        """
+        if self._walk_tasks.pop(task_id, None) is not None:
+            self._app.log_debug(
+                "Work area watcher: Failed to walk new directory: %s\n%s"
+                % (msg, stack_trace)
+            )
+
+    def _add_pending_change(self, key, path):
+        """
+        Add a changed path to the list of pending changes for the specified key, emitting
+        the work_area_changed signal if this is the first change for the key since the last
+        batch was reported.
+
+        :param key:     The key the path was changed for
+        :param path:    The path that changed or None if the changes aren't known
+        """
+        if key not in self._pending_changes:
+            self._pending_changes[key] = set()
+            self.work_area_changed.emit(key)
+        if path:
+            self._pending_changes[key].add(path)
+
+    def _on_batch_timer_timeout(self):
+        """
+        Slot triggered when the current batch of changes should be reported.
+        """
+        pending_changes = self._pending_changes
+        self._pending_changes = {}
+
+        if self._overflowed:
+            self._overflowed = False
+            self.watch_overflowed.emit()
+            return
+
+        for key, paths in six.iteritems(pending_changes):
+            if paths:
+                self.files_changed.emit(key, sorted(paths))
@@ -0,0 +1,273 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Persistent index of the work area directories walked when searching for work files.
+"""
+import os
+import json
+import time
+import sqlite3
+
+import sgtk
+
+from .util import Threaded
+
+
+class WorkFileIndex(Threaded):
+    """
+    A persistent, on-disk index of directory listings keyed by the work area root
+    and template that was walked to find them.
+
+    Each directory stores the names of its entries together with the template fields
+    of any files that matched the template.  A listing is only reused if the
+    modification time of the directory hasn't changed since it was scanned so a warm
+    search doesn't need to list directories or parse paths again.
+
+    Only details that depend on the names of the entries are stored - a file that is
+    re-written in place doesn't change the modification time of its directory so the
+    files themselves are still stat'ed by every walk.
+    """
+
+    class Listing(object):
+        """
+        The indexed entries of a single directory.
+        """
+
+        def __init__(self, path, mtime, entries=None, scanned_at=None, used_at=None):
+            """
+            Construction
+
+            :param path:        The path of the directory
+            :param mtime:       The modification time of the directory when it was listed
+            :param entries:     Dictionary {name:[is_dir, fields]} for the entries in the
+                                directory.  Fields are only stored for files that have been
+                                matched against the template.
+            :param scanned_at:  The time the directory was listed.  If None then the listing
+                                is new and the current time is used.
+            :param used_at:     The time the listing was last used by a search
+            """
+            self.path = path
+            self.mtime = mtime
+            self.entries = entries or {}
+            self.is_dirty = scanned_at is None
+            self.scanned_at = time.time() if scanned_at is None else scanned_at
+            self.used_at = used_at or self.scanned_at
+
+    # Directory listings scanned within this many seconds of the directory being modified
+    # are not trusted as the file system may not have the granularity to tell if the
+    # directory changed again within the same interval.
+    _RACY_INTERVAL = 2.0
+
+    # Directories that haven't been walked for this many seconds are purged from the index.
+    _EXPIRY_INTERVAL = 30 * 24 * 60 * 60
+
+    # The last used time of listings is only updated at most this often.
+    _USED_AT_INTERVAL = 24 * 60 * 60
+
+    _DB_FILE_NAME = "work_file_index.db"
+
+    # version of the format of the entries stored in the index.  The index is cleared if it
+    # was written with a different version:
+    _SCHEMA_VERSION = 2
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._app = sgtk.platform.current_bundle()
+        self._connection = None
+        self._disabled = False
+
+    @Threaded.exclusive
+    def get_listings(self, root, template):
+        """
+        Get all indexed directory listings for the specified work area root and template.
+
+        :param root:        The root directory the template is walked from
+        :param template:    The template being walked
+        :returns:           A dictionary {path:Listing} of the indexed directory listings
+                            under the root or None if the index isn't available
+        """
+        connection = self._get_connection()
+        if not connection:
+            return None
+
+        listings = {}
+        try:
+            cursor = connection.execute(
+                "SELECT path, mtime, scanned_at, used_at, entries FROM directories "
+                "WHERE template = ? AND root = ?",
+                (self._template_key(template), root),
+            )
+            for path, mtime, scanned_at, used_at, entries in cursor:
+                listings[path] = WorkFileIndex.Listing(
+                    path, mtime, json.loads(entries), scanned_at, used_at
+                )
+        except (sqlite3.Error, ValueError) as e:
+            self._disable(e)
+            return None
+        return listings
+
+    @Threaded.exclusive
+    def update_listings(self, root, template, listings):
+        """
+        Write any directory listings that have changed back to the index.
+
+        :param root:        The root directory the template was walked from
+        :param template:    The template that was walked
+        :param listings:    A list of Listing instances to update the index with.  Only
+                            listings that are dirty will be written.
+        """
+        connection = self._get_connection()
+        if not connection:
+            return
+
+        now = time.time()
+        template_key = self._template_key(template)
+        rows = []
+        used_rows = []
+        for listing in listings:
+            if listing.is_dirty:
+                rows.append(
+                    (
+                        template_key,
+                        root,
+                        listing.path,
+                        listing.mtime,
+                        listing.scanned_at,
+                        now,
+                        json.dumps(listing.entries),
+                    )
+                )
+                listing.is_dirty = False
+            elif now - listing.used_at > WorkFileIndex._USED_AT_INTERVAL:
+                used_rows.append((now, template_key, root, listing.path))
+            else:
+                continue
+            listing.used_at = now
+
+        if not rows and not used_rows:
+            return
+
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO directories "
+                    "(template, root, path, mtime, scanned_at, used_at, entries) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                connection.executemany(
+                    "UPDATE directories SET used_at = ? "
+                    "WHERE template = ? AND root = ? AND path = ?",
+                    used_rows,
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def is_listing_valid(self, listing, mtime):
+        """
+        Determine if a directory listing from the index can be used.
+
+        :param listing: The Listing to check
+        :param mtime:   The current modification time of the directory
+        :returns:       True if the listing is up-to-date, otherwise False
+        """
+        if listing is None or listing.mtime != mtime:
+            return False
+        # don't trust listings for directories modified just before they were scanned:
+        return listing.scanned_at - mtime > WorkFileIndex._RACY_INTERVAL
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Remove all entries from the index.
+        """
+        connection = self._get_connection()
+        if not connection:
+            return
+        try:
+            with connection:
+                connection.execute("DELETE FROM directories")
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def _get_connection(self):
+        """
+        Get the connection to the index database, opening it if needed.  Must be called
+        with the lock held.
+
+        :returns:   An sqlite3 connection or None if the index isn't available
+        """
+        if self._connection or self._disabled:
+            return self._connection
+
+        try:
+            cache_dir = self._app.cache_location
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            db_path = os.path.join(cache_dir, WorkFileIndex._DB_FILE_NAME)
+
+            # the connection is shared by the background threads but all access to it is
+            # serialized by the lock:
+            connection = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            with connection:
+                (schema_version,) = connection.execute("PRAGMA user_version").fetchone()
+                if schema_version != WorkFileIndex._SCHEMA_VERSION:
+                    connection.execute("DROP TABLE IF EXISTS directories")
+                    connection.execute(
+                        "PRAGMA user_version = %d" % WorkFileIndex._SCHEMA_VERSION
+                    )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS directories ("
+                    "template TEXT, root TEXT, path TEXT, mtime REAL, "
+                    "scanned_at REAL, used_at REAL, entries TEXT, "
+                    "PRIMARY KEY (template, root, path))"
+                )
+                # purge directories that haven't been walked for a long time:
+                connection.execute(
+                    "DELETE FROM directories WHERE used_at < ?",
+                    (time.time() - WorkFileIndex._EXPIRY_INTERVAL,),
+                )
+        except (OSError, sqlite3.Error) as e:
+            self._disable(e)
+            return None
+
+        self._connection = connection
+        return self._connection
+
+    def _disable(self, error):
+        """
+        Disable the index for the rest of the session.  The index is just an optimization
+        so any error results in the work areas being walked in full instead.
+
+        :param error:   The error that caused the index to be disabled
+        """
+        self._app.log_debug("Work file index disabled: %s" % error)
+        self._disabled = True
+        if self._connection:
+            try:
+                self._connection.close()
+            except sqlite3.Error:
+                pass
+            self._connection = None
+
+    def _template_key(self, template):
+        """
+        :param template:    The template to return a key for
+        :returns:           A string that uniquely identifies the template
+        """
+        return "%s:%s" % (template.root_path, template.definition)
+
+
+# single global instance of the work file index
+g_work_file_index = WorkFileIndex()
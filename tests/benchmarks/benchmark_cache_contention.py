@@ -0,0 +1,155 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Measure the cost of lookups in the caches shared by the background searches when they
+are made from several threads at the same time.
+
+This isn't collected with the unit tests - run it on its own with:
+
+    python -m pytest tests/benchmarks/benchmark_cache_contention.py -s
+"""
+
+import time
+import threading
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+NUM_THREADS = 8
+NUM_LOOKUPS = 20000
+
+
+class BenchmarkCacheContention(Workfiles2TestBase):
+    """
+    Run NUM_LOOKUPS lookups in each of NUM_THREADS threads for each cache and report the
+    time per lookup.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(BenchmarkCacheContention, self).setUp()
+
+        self.FileSearchCache = self.tk_multi_workfiles.file_search_cache.FileSearchCache
+        self.FileItem = self.tk_multi_workfiles.file_item.FileItem
+        self.WorkArea = self.tk_multi_workfiles.work_area.WorkArea
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        self._work_areas = [
+            self.WorkArea(
+                self.create_context(
+                    self.mockgun.create(
+                        "Task",
+                        {
+                            "content": "Bunny Concept %d" % i,
+                            "project": self.project,
+                            "step": concept,
+                            "entity": bunny,
+                        },
+                    )
+                )
+            )
+            for i in range(20)
+        ]
+
+    def _time_lookups(self, lookup):
+        """
+        Call a lookup function NUM_LOOKUPS times from each of NUM_THREADS threads.
+
+        :param lookup:  A function taking the index of the lookup
+        :returns:       The average time per lookup in microseconds
+        """
+
+        def run():
+            for i in range(NUM_LOOKUPS):
+                lookup(i)
+
+        threads = [threading.Thread(target=run) for _ in range(NUM_THREADS)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return (time.time() - start) / (NUM_THREADS * NUM_LOOKUPS) * 1e6
+
+    def test_cache_contention(self):
+        """
+        Report the time per lookup for each cache.
+        """
+        results = []
+
+        user_cache = self.tk_multi_workfiles.user_cache.UserCache()
+        for i in range(200):
+            user_cache._cache_user("user%d" % i, i, {"type": "HumanUser", "id": i})
+        results.append(
+            (
+                "UserCache._get_user_for_id",
+                self._time_lookups(lambda i: user_cache._get_user_for_id(i % 200)),
+            )
+        )
+
+        name_map = self.tk_multi_workfiles.file_finder.FileFinder._FileNameMap()
+        results.append(
+            (
+                "FileFinder._FileNameMap.get_name",
+                self._time_lookups(
+                    lambda i: name_map.get_name(
+                        i % 500, "/p/f.ma", None, {"name": "n%d" % (i % 500)}
+                    )
+                ),
+            )
+        )
+
+        settings_cache = self.WorkArea._SettingsCache()
+        for i, work_area in enumerate(self._work_areas):
+            settings_cache.add(work_area.context, {"setting": i})
+        results.append(
+            (
+                "WorkArea._SettingsCache.get",
+                self._time_lookups(
+                    lambda i: settings_cache.get(self._work_areas[i % 20].context)
+                ),
+            )
+        )
+
+        search_cache = self.FileSearchCache()
+        keys = [(("name", "file%d" % j),) for j in range(20)]
+        for work_area in self._work_areas:
+            search_cache.add(
+                work_area,
+                [
+                    self.FileItem(key, work_details={"version": v})
+                    for key in keys
+                    for v in range(5)
+                ],
+            )
+        results.append(
+            (
+                "FileSearchCache.find_file_versions",
+                self._time_lookups(
+                    lambda i: search_cache.find_file_versions(
+                        self._work_areas[i % 20], keys[i % 20]
+                    )
+                ),
+            )
+        )
+
+        print("")
+        for name, lookup_time in results:
+            print("%-36s %6.2f us/lookup" % (name, lookup_time))
@@ -0,0 +1,169 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Measure the memory used by the FileItem's and version tables of a large work area.
+
+This isn't collected with the unit tests and needs Python 3 for tracemalloc - run it on
+its own with:
+
+    python -m pytest tests/benchmarks/benchmark_file_item_memory.py -s
+"""
+
+import gc
+import datetime
+import tracemalloc
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+NUM_FILES = 2000
+NUM_VERSIONS = 50
+
+
+class _DictFileItem(object):
+    """
+    Baseline item layout with the same attributes as a FileItem held in a per-instance
+    dictionary, the way FileItem stored them before it used slots.
+    """
+
+    def __init__(self, file_item, attribute_names):
+        """
+        :param file_item:       The FileItem to copy the attribute values from
+        :param attribute_names: The names of the attributes to copy
+        """
+        for name in attribute_names:
+            setattr(self, name, getattr(file_item, name))
+
+
+class BenchmarkFileItemMemory(Workfiles2TestBase):
+    """
+    Add NUM_FILES files with NUM_VERSIONS versions each to a FileSearchCache and assign
+    the version tables to the items the same way FileModel._update_group_file_items()
+    does, then report the memory allocated.  The memory used by the FileItem layout is
+    also compared against a dictionary-backed baseline.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(BenchmarkFileItemMemory, self).setUp()
+
+        self.FileSearchCache = self.tk_multi_workfiles.file_search_cache.FileSearchCache
+        self.FileItem = self.tk_multi_workfiles.file_item.FileItem
+        self.WorkArea = self.tk_multi_workfiles.work_area.WorkArea
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        task = self.mockgun.create(
+            "Task",
+            {
+                "content": "Bunny Concept",
+                "project": self.project,
+                "step": concept,
+                "entity": bunny,
+            },
+        )
+        self._work_area = self.WorkArea(self.create_context(task))
+
+    def _build(self):
+        """
+        Build the cached files and version tables.
+
+        :returns: A tuple of (list of FileItem's, FileSearchCache)
+        """
+        now = datetime.datetime.now()
+        keys = [
+            (("Shot", "s%d" % (f % 20)), ("name", "file%d" % f))
+            for f in range(NUM_FILES)
+        ]
+        items = []
+        for f, key in enumerate(keys):
+            for v in range(NUM_VERSIONS):
+                items.append(
+                    self.FileItem(
+                        key,
+                        is_work_file=True,
+                        work_path="/p/s/file%d_v%03d.ma" % (f, v),
+                        work_details={
+                            "version": v,
+                            "name": "file%d" % f,
+                            "modified_at": now,
+                        },
+                    )
+                )
+
+        cache = self.FileSearchCache()
+        cache.add(self._work_area, items)
+        for key in keys:
+            versions = cache.find_file_versions(self._work_area, key)
+            for item in versions.values():
+                item.versions = versions
+        return items, cache
+
+    def _measure(self, build):
+        """
+        Measure the memory allocated by a build function that is still in use once it has
+        returned.
+
+        :returns: A tuple of (build result, bytes used)
+        """
+        gc.collect()
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            result = build()
+            gc.collect()
+            used = tracemalloc.get_traced_memory()[0] - base
+        finally:
+            tracemalloc.stop()
+        return result, used
+
+    def _copy_file_item(self, file_item):
+        """
+        :returns: A new FileItem sharing all attribute values with the specified one.
+        """
+        copied_item = self.FileItem.__new__(self.FileItem)
+        for name in self.FileItem.__slots__:
+            setattr(copied_item, name, getattr(file_item, name))
+        return copied_item
+
+    def test_file_item_memory(self):
+        """
+        Report the memory allocated for the files and version tables and ensure the slotted
+        FileItem uses less memory per item than the same attributes held in an instance
+        dictionary.
+        """
+        (items, _), used = self._measure(self._build)
+        num_items = len(items)
+        print(
+            "\n%d items: %.1f MB (%.0f bytes/item)"
+            % (num_items, used / 1e6, used / float(num_items))
+        )
+
+        # compare the layouts alone - both sets of items share the same attribute values:
+        _, slotted_used = self._measure(
+            lambda: [self._copy_file_item(item) for item in items]
+        )
+        _, dict_used = self._measure(
+            lambda: [_DictFileItem(item, self.FileItem.__slots__) for item in items]
+        )
+        print(
+            "Layout: %.0f bytes/item with slots, %.0f bytes/item with a dictionary"
+            % (slotted_used / float(num_items), dict_used / float(num_items))
+        )
+        assert slotted_used < dict_used * 0.9
@@ -0,0 +1,609 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import copy
+import datetime
+import threading
+import time
+
+from mock import patch
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestPublishRefreshDelta(Workfiles2TestBase):
+    """
+    Tests that only publishes that changed are processed again when the publishes for a
+    search are refreshed.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestPublishRefreshDelta, self).setUp()
+
+        self.AsyncFileFinder = self.tk_multi_workfiles.file_finder.AsyncFileFinder
+        self._finder = self.AsyncFileFinder(self.bg_task_manager)
+        self.addCleanup(self._finder.shut_down)
+
+        self._search = self.AsyncFileFinder._SearchData(1, None, [], None)
+
+    def _publish(self, publish_id, day):
+        """
+        :returns: A publish record updated on the specified day.
+        """
+        return {
+            "type": "PublishedFile",
+            "id": publish_id,
+            "updated_at": datetime.datetime(2020, 1, day),
+        }
+
+    def _refresh(self, sg_publishes):
+        """
+        Refresh the publishes for the search.
+
+        :returns: A tuple (process mock, search finished mock) that can be inspected to see
+                  what was processed.
+        """
+        with patch.object(
+            self._finder, "_begin_search_process_publishes"
+        ) as process, patch.object(
+            self._finder, "_on_background_search_finished"
+        ) as search_finished:
+            self._finder._begin_search_process_refreshed_publishes(
+                self._search, sg_publishes
+            )
+        return process, search_finished
+
+    def test_only_changes_are_processed(self):
+        """
+        Ensure added and changed publishes are processed and changed and deleted publishes
+        are removed.
+        """
+        unchanged, changed, deleted = (self._publish(i, 1) for i in (1, 2, 3))
+
+        # the first refresh processes everything:
+        process, _ = self._refresh([unchanged, changed, deleted])
+        process.assert_called_once_with(self._search, [unchanged, changed, deleted])
+
+        changed = self._publish(2, 2)
+        added = self._publish(4, 1)
+        process, search_finished = self._refresh([unchanged, changed, added])
+        process.assert_called_once_with(self._search, [changed, added], set([2, 3]))
+        assert not search_finished.called
+        assert self._search.processed_publishes == {
+            1: unchanged["updated_at"],
+            2: changed["updated_at"],
+            4: added["updated_at"],
+        }
+
+    def test_nothing_is_processed_without_changes(self):
+        """
+        Ensure the search completes without processing anything when nothing has changed.
+        """
+        sg_publishes = [self._publish(i, 1) for i in (1, 2)]
+        self._refresh(sg_publishes)
+
+        process, search_finished = self._refresh([dict(p) for p in sg_publishes])
+        assert not process.called
+        search_finished.assert_called_once_with(self._search.id)
+
+    def test_everything_is_processed_whilst_cached_publishes_are_processed(self):
+        """
+        Ensure changes aren't applied on top of cached publishes that haven't finished
+        being processed.
+        """
+        self._refresh([self._publish(1, 1)])
+        self._search.find_publishes_tasks.add(1234)
+
+        sg_publishes = [self._publish(1, 2), self._publish(2, 1)]
+        process, _ = self._refresh(sg_publishes)
+        process.assert_called_once_with(self._search, sg_publishes)
+
+
+class TestWorkFileChunks(Workfiles2TestBase):
+    """
+    Tests that work files are split into chunks as they are found.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestWorkFileChunks, self).setUp()
+
+        self._iter_chunks = (
+            self.tk_multi_workfiles.file_finder.AsyncFileFinder._iter_chunks
+        )
+
+    def test_chunks_are_limited_in_size(self):
+        """
+        Ensure a chunk is completed as soon as it contains the maximum number of items.
+        """
+        chunks = list(self._iter_chunks(iter([1, 2, None, 3, 4, 5]), 2, 60))
+        assert chunks == [[1, 2], [3, 4], [5]]
+
+    def test_chunks_are_completed_whilst_walking(self):
+        """
+        Ensure a chunk is completed once the interval has passed even if no more items are
+        found, e.g. whilst walking slow directories.
+        """
+        now = [0]
+
+        def found_items():
+            yield 1
+            yield 2
+            # a directory that takes a while to list with nothing in it:
+            now[0] = 1
+            yield None
+            yield 3
+
+        with patch("time.time", lambda: now[0]):
+            chunks = list(self._iter_chunks(found_items(), 10, 0.5))
+        assert chunks == [[1, 2], [3]]
+
+    def test_walk_ends_when_stopped(self):
+        """
+        Ensure nothing else is walked or emitted once the chunks are no longer needed.
+        """
+        stopped = [False]
+        walked = []
+
+        def found_items():
+            walked.append(1)
+            yield 1
+            stopped[0] = True
+            yield None
+            walked.append(2)
+            yield 2
+
+        chunks = list(self._iter_chunks(found_items(), 10, 60, lambda: stopped[0]))
+        assert chunks == []
+        assert walked == [1]
+
+
+class TestBatchScan(Workfiles2TestBase):
+    """
+    Tests that searches begun together share the same directory scan.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestBatchScan, self).setUp()
+
+        self.AsyncFileFinder = self.tk_multi_workfiles.file_finder.AsyncFileFinder
+        self._finder = self.AsyncFileFinder(self.bg_task_manager)
+        self.addCleanup(self._finder.shut_down)
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        self._entities = [bunny] + [
+            self.mockgun.create(
+                "Task",
+                {
+                    "content": "Bunny Concept %d" % i,
+                    "project": self.project,
+                    "step": concept,
+                    "entity": bunny,
+                },
+            )
+            for i in range(2)
+        ]
+
+    def _begin_searches(self):
+        """
+        Begin a search for each entity.
+
+        :returns: The shared scans used by the searches.
+        """
+        scans = []
+        for entity in self._entities:
+            search_id = self._finder.begin_search(entity, [self.jeff])
+            scans.append(self._finder._searches[search_id].shared_scan)
+        return scans
+
+    def test_searches_begun_together_share_a_scan(self):
+        """
+        Ensure that searches begun before control returns to the event loop share a scan
+        and that searches begun afterwards use a new one.
+        """
+        scans = self._begin_searches()
+        assert scans[0] is not None
+        assert all(scan is scans[0] for scan in scans)
+        assert self._finder._get_batch_scan() is scans[0]
+
+        with self.wait_for(
+            lambda: self._finder._batch_scan is None, lambda: "Batch didn't end"
+        ):
+            pass
+
+        new_scans = self._begin_searches()
+        assert all(scan is new_scans[0] for scan in new_scans)
+        assert new_scans[0] is not scans[0]
+
+    def test_batch_can_be_ended(self):
+        """
+        Ensure a new scan is begun once the current batch has ended.
+        """
+        scan = self._finder._get_batch_scan()
+        assert self._finder._get_batch_scan() is scan
+        self._finder._end_scan_batch()
+        assert self._finder._get_batch_scan() is not scan
+
+
+class TestBatchedPublishQueries(Workfiles2TestBase):
+    """
+    Tests that the publishes for several tasks of the same entity are found with a single
+    query and then split between the searches for each task.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestBatchedPublishQueries, self).setUp()
+
+        self.AsyncFileFinder = self.tk_multi_workfiles.file_finder.AsyncFileFinder
+        self._finder = self.AsyncFileFinder(self.bg_task_manager)
+        self.addCleanup(self._finder.shut_down)
+
+        self._bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        self._tasks = [
+            self.mockgun.create(
+                "Task",
+                {
+                    "content": "Bunny Concept %d" % i,
+                    "project": self.project,
+                    "step": concept,
+                    "entity": self._bunny,
+                },
+            )
+            for i in range(2)
+        ]
+
+        # the tasks share the same step so their publishes are found in the same
+        # directories - only the task they were published for tells them apart:
+        for task, versions in zip(self._tasks, ([1, 2], [3])):
+            ctx = self.create_context(task)
+            for version in versions:
+                self.create_publish_file(ctx, "scene", version)
+
+    def _publish_versions(self, sg_publishes_by_task):
+        """
+        :returns: A dictionary {task id:sorted list of versions} for the publishes found
+                  by a batched query.
+        """
+        return dict(
+            (
+                task_id,
+                sorted(sg_publish["version_number"] for sg_publish in sg_publishes),
+            )
+            for task_id, sg_publishes in sg_publishes_by_task.items()
+        )
+
+    def test_publishes_are_found_for_each_task(self):
+        """
+        Ensure a batched query returns the publishes for each task and nothing else.
+        """
+        result = self._finder._task_find_publishes_for_tasks(self._bunny, self._tasks)
+        assert self._publish_versions(result["sg_publishes_by_task"]) == {
+            self._tasks[0]["id"]: [1, 2],
+            self._tasks[1]["id"]: [3],
+        }
+
+        # only the requested tasks are returned:
+        result = self._finder._task_find_publishes_for_tasks(
+            self._bunny, self._tasks[1:]
+        )
+        assert self._publish_versions(result["sg_publishes_by_task"]) == {
+            self._tasks[1]["id"]: [3]
+        }
+
+    def test_task_filters_are_applied_to_their_task(self):
+        """
+        Ensure the additional filters for each task only narrow down the publishes for
+        that task.
+        """
+        result = self._finder._task_find_publishes_for_tasks(
+            self._bunny,
+            self._tasks,
+            {
+                self._tasks[0]["id"]: [["version_number", "greater_than", 1]],
+                self._tasks[1]["id"]: [],
+            },
+        )
+        assert self._publish_versions(result["sg_publishes_by_task"]) == {
+            self._tasks[0]["id"]: [2],
+            self._tasks[1]["id"]: [3],
+        }
+
+        result = self._finder._task_find_publishes_for_tasks(
+            self._bunny,
+            self._tasks,
+            {self._tasks[1]["id"]: [["version_number", "less_than", 3]]},
+        )
+        assert self._publish_versions(result["sg_publishes_by_task"]) == {
+            self._tasks[0]["id"]: [1, 2]
+        }
+
+    def test_searches_for_tasks_share_a_query(self):
+        """
+        Ensure the searches for several tasks of an entity are answered by a single query
+        and that each search only gets the publishes for its own task.
+        """
+        self._finder._batch_publish_queries = True
+
+        found = {}
+        self._finder.publishes_found.connect(
+            lambda search_id, files, work_area: found.setdefault(search_id, []).extend(
+                files
+            )
+        )
+
+        with patch.object(
+            self._finder, "_find_publishes", wraps=self._finder._find_publishes
+        ) as find_publishes:
+            with patch.object(
+                self.AsyncFileFinder, "_load_cached_publishes"
+            ) as load_cached_publishes:
+                with self.wait_for(
+                    lambda: len(found) == len(self._tasks),
+                    lambda: "Timed out. Found: %s" % (found,),
+                ):
+                    search_ids = [
+                        self._finder.begin_search(task, [self.jeff])
+                        for task in self._tasks
+                    ]
+
+        assert find_publishes.call_count == 1
+        # batched publishes are never read from the publish model's cache:
+        assert not load_cached_publishes.called
+        assert not self._finder._publish_batches
+        for search_id, task, versions in zip(search_ids, self._tasks, ([1, 2], [3])):
+            files = found[search_id]
+            assert sorted(f.version for f in files) == versions
+            assert all(f.publish_details["task"]["id"] == task["id"] for f in files)
+
+
+class TestDirectoryContextMap(Workfiles2TestBase):
+    """
+    Tests that the context for work files is only resolved once per directory.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestDirectoryContextMap, self).setUp()
+
+        self._context_map = (
+            self.tk_multi_workfiles.file_finder.FileFinder._DirectoryContextMap()
+        )
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        task = self.mockgun.create(
+            "Task",
+            {
+                "content": "Bunny Concept",
+                "project": self.project,
+                "step": concept,
+                "entity": bunny,
+            },
+        )
+        self._ctx_jeff = self.create_context(task)
+        self._ctx_francis = self.create_context(task, self.francis)
+
+    def test_contexts_are_resolved_once_per_directory(self):
+        """
+        Ensure all files in a directory share the context resolved for the first of them
+        and that files in other directories are resolved separately.
+        """
+        paths = [self.create_work_file(self._ctx_jeff, "scene", v) for v in (1, 2)]
+        francis_path = self.create_work_file(self._ctx_francis, "scene", 1)
+
+        with patch.object(
+            self.tk, "context_from_path", wraps=self.tk.context_from_path
+        ) as context_from_path:
+            contexts = [
+                self._context_map.get_context(path, self._ctx_jeff) for path in paths
+            ]
+            assert context_from_path.call_count == 1
+            francis_ctx = self._context_map.get_context(francis_path, self._ctx_jeff)
+            assert context_from_path.call_count == 2
+
+        assert contexts[0] is contexts[1]
+        assert contexts[0] == self.tk.context_from_path(paths[0], self._ctx_jeff)
+        assert francis_ctx == self.tk.context_from_path(francis_path, self._ctx_jeff)
+        assert francis_ctx.task == self._ctx_jeff.task
+
+    def test_contexts_resolved_at_the_same_time_are_shared(self):
+        """
+        Ensure that if several threads resolve the same directory at the same time they
+        all get the same context.
+        """
+        path = self.create_work_file(self._ctx_jeff, "scene", 1)
+        context_from_path = self.tk.context_from_path
+
+        def slow_context_from_path(*args, **kwargs):
+            # make sure the other threads start resolving before this one is done:
+            time.sleep(0.01)
+            return context_from_path(*args, **kwargs)
+
+        contexts = []
+        with patch.object(
+            self.tk, "context_from_path", side_effect=slow_context_from_path
+        ):
+            threads = [
+                threading.Thread(
+                    target=lambda: contexts.append(
+                        self._context_map.get_context(path, self._ctx_jeff)
+                    )
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(contexts) == 4
+        assert all(ctx is contexts[0] for ctx in contexts)
+
+
+class TestPublishProcessingTasks(Workfiles2TestBase):
+    """
+    Tests that publishes are filtered and parsed once for a search and then projected into
+    publish items for each user.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestPublishProcessingTasks, self).setUp()
+
+        self.FileFinder = self.tk_multi_workfiles.file_finder.FileFinder
+        self._finder = self.tk_multi_workfiles.file_finder.AsyncFileFinder(
+            self.bg_task_manager
+        )
+        self.addCleanup(self._finder.shut_down)
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        task = self.mockgun.create(
+            "Task",
+            {
+                "content": "Bunny Concept",
+                "project": self.project,
+                "step": concept,
+                "entity": bunny,
+            },
+        )
+        ctx = self.create_context(task)
+        self.create_context(task, self.francis)
+        for version in (1, 2):
+            self.create_publish_file(ctx, "scene", version)
+
+        WorkArea = self.tk_multi_workfiles.work_area.WorkArea
+        self._work_area = WorkArea(ctx)
+        self._francis_work_area = self._work_area.create_copy_for_user(self.francis)
+
+        self._sg_publishes = self._finder._parse_publishes(
+            self.mockgun.find("PublishedFile", [], self._finder._publish_fields)
+        )
+
+    def test_publishes_are_parsed_once_for_all_users(self):
+        """
+        Ensure the parsed publishes are shared, unchanged, by the publish items built for
+        each user and that each user gets work paths in their own sandbox.
+        """
+        with patch.object(
+            self._finder, "_filter_publishes", wraps=self._finder._filter_publishes
+        ) as filter_publishes:
+            result = self._finder._task_filter_publishes(
+                self._sg_publishes, self._work_area
+            )
+        assert filter_publishes.call_count == 1
+        parsed_publishes = result["parsed_publishes"]
+        assert len(parsed_publishes) == 2
+        expected_parsed_publishes = copy.deepcopy(parsed_publishes)
+
+        name_map = self.FileFinder._FileNameMap()
+        work_paths = {}
+        for work_area in (self._work_area, self._francis_work_area):
+            result = self._finder._task_process_publish_items(
+                parsed_publishes, work_area, name_map, removed_publish_ids={42}
+            )
+            assert result["environment"] is work_area
+            assert result["removed_publish_ids"] == {42}
+
+            user_fields = work_area.context.as_template_fields(self.work_template)
+            publish_items = result["publish_items"]
+            assert sorted(version for _, version in publish_items) == [1, 2]
+            for (file_key, version), kwargs in publish_items.items():
+                assert kwargs["key"] == file_key
+                assert kwargs["is_published"]
+                assert kwargs["publish_details"]["version"] == version
+                assert self.publish_template.validate(kwargs["publish_path"])
+                fields = self.work_template.get_fields(kwargs["work_path"])
+                assert fields["user"] == user_fields["user"]
+                work_paths.setdefault(version, set()).add(kwargs["work_path"])
+
+        assert parsed_publishes == expected_parsed_publishes
+        # the work paths for each user are in their own sandbox:
+        assert all(len(paths) == 2 for paths in work_paths.values())
+
+    def test_publishes_removed_by_the_hook_are_not_parsed(self):
+        """
+        Ensure only the publishes returned by the filter_publishes hook are parsed.
+        """
+        execute_hook = self.app.execute_hook
+
+        def filter_publishes(hook_name, **kwargs):
+            result = execute_hook(hook_name, **kwargs)
+            if hook_name == "hook_filter_publishes":
+                result = [p for p in result if p["sg_publish"]["version_number"] != 1]
+            return result
+
+        with patch.object(self.app, "execute_hook", side_effect=filter_publishes):
+            result = self._finder._task_filter_publishes(
+                self._sg_publishes, self._work_area
+            )
+        parsed_publishes = result["parsed_publishes"]
+        assert [details["version"] for _, _, details in parsed_publishes] == [2]
+
+    def test_nothing_is_processed_without_publishes_or_a_work_area(self):
+        """
+        Ensure the tasks return empty results when there is nothing to process.
+        """
+        assert self._finder._task_filter_publishes([], self._work_area) == {
+            "parsed_publishes": []
+        }
+        assert self._finder._task_filter_publishes(self._sg_publishes, None) == {
+            "parsed_publishes": []
+        }
+
+        parsed_publishes = self._finder._task_filter_publishes(
+            self._sg_publishes, self._work_area
+        )["parsed_publishes"]
+        assert self._finder._task_process_publish_items(
+            parsed_publishes, self._work_area, None, removed_publish_ids={42}
+        ) == {
+            "publish_items": {},
+            "environment": self._work_area,
+            "removed_publish_ids": {42},
+        }
@@ -0,0 +1,210 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from mock import patch
+
+import sgtk
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestFileItemBadges(Workfiles2TestBase):
+    """
+    Tests that the badges for file items are generated in batches and that the badge
+    pixmaps for colours are shared.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestFileItemBadges, self).setUp()
+
+        self.FileItem = self.tk_multi_workfiles.file_item.FileItem
+        self.QColor = sgtk.platform.qt.QtGui.QColor
+
+        # start each test without any badge pixmaps:
+        patcher = patch.dict(self.FileItem._badge_pixmaps, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # the badge returned by the hook for each path:
+        self._badges = {}
+        self._hook_calls = []
+        self._failing_methods = set()
+        patcher = patch.object(
+            self.app, "execute_hook_method", side_effect=self._execute_hook_method
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _execute_hook_method(self, hook_name, method_name, **kwargs):
+        """
+        Stand-in for the get_badge hook that returns the badges set up by the test.
+        """
+        assert hook_name == "hook_get_badge"
+        self._hook_calls.append((method_name, kwargs))
+        if method_name in self._failing_methods:
+            raise Exception("%s failed" % method_name)
+        if method_name == "get_badges":
+            return [
+                self._badges.get(f.get("work_file_path") or f.get("publish_path"))
+                for f in kwargs["files"]
+            ]
+        if method_name == "get_work_file_badge":
+            return self._badges.get(kwargs["work_file_path"])
+        if method_name == "get_publish_badge":
+            return self._badges.get(kwargs["publish_path"])
+        if method_name == "generate_badge_pixmap":
+            return ("pixmap", kwargs["badge_color"].rgba())
+        raise AssertionError("Unexpected hook method %s" % method_name)
+
+    def _hook_methods(self):
+        """
+        :returns: The list of hook methods called so far.
+        """
+        return [method_name for method_name, _ in self._hook_calls]
+
+    def _work_file(self, path):
+        """
+        :returns: A FileItem for a work file.
+        """
+        return self.FileItem(
+            ("key", path), is_work_file=True, work_path=path, work_details={}
+        )
+
+    def _publish(self, path):
+        """
+        :returns: A FileItem for a publish.
+        """
+        return self.FileItem(
+            ("key", path), is_published=True, publish_path=path, publish_details={}
+        )
+
+    def test_badges_are_generated_in_one_call(self):
+        """
+        Ensure the badges for a list of files are generated with a single hook call and
+        aren't generated again.
+        """
+        work_file = self._work_file("/work/scene.v001.ma")
+        publish = self._publish("/publish/scene.v001.ma")
+        other = self.FileItem(("key", "other"))
+        self._badges = {
+            "/work/scene.v001.ma": "work badge",
+            "/publish/scene.v001.ma": "publish badge",
+        }
+
+        self.FileItem.generate_badges([work_file, publish, work_file, other])
+        assert self._hook_methods() == ["get_badges"]
+        assert self._hook_calls[0][1]["files"] == [
+            {"work_file_details": {}, "work_file_path": "/work/scene.v001.ma"},
+            {"publish_details": {}, "publish_path": "/publish/scene.v001.ma"},
+            {},
+        ]
+        assert work_file.badge_generated and work_file.badge == "work badge"
+        assert publish.badge_generated and publish.badge == "publish badge"
+        assert other.badge_generated and other.badge is None
+
+        self.FileItem.generate_badges([work_file, publish, other])
+        assert self._hook_methods() == ["get_badges"]
+
+    def test_badge_is_generated_when_requested(self):
+        """
+        Ensure the badge for a file is generated the first time it's requested.
+        """
+        work_file = self._work_file("/work/scene.v001.ma")
+        self._badges = {"/work/scene.v001.ma": "work badge"}
+        assert not work_file.badge_generated
+
+        assert work_file.badge == "work badge"
+        assert work_file.badge == "work badge"
+        assert self._hook_methods() == ["get_badges"]
+
+    def test_badge_pixmaps_are_shared_for_each_colour(self):
+        """
+        Ensure a badge pixmap is only generated once for each colour returned by the hook.
+        """
+        red = self.QColor(255, 0, 0)
+        green = self.QColor(0, 255, 0)
+        files = [self._work_file("/work/scene.v%03d.ma" % v) for v in (1, 2, 3)]
+        self._badges = dict(
+            zip([f.path for f in files], [red, self.QColor(255, 0, 0), green])
+        )
+
+        self.FileItem.generate_badges(files)
+        assert self._hook_methods() == [
+            "get_badges",
+            "generate_badge_pixmap",
+            "generate_badge_pixmap",
+        ]
+        assert files[0].badge == ("pixmap", red.rgba())
+        assert files[1].badge is files[0].badge
+        assert files[2].badge == ("pixmap", green.rgba())
+
+        # and the pixmaps are shared with files generated later:
+        later_file = self._work_file("/work/layout.v001.ma")
+        self._badges[later_file.path] = self.QColor(0, 255, 0)
+        self.FileItem.generate_badges([later_file])
+        assert later_file.badge is files[2].badge
+        assert self._hook_methods().count("generate_badge_pixmap") == 2
+
+    def test_badges_fall_back_to_single_file_hook_methods(self):
+        """
+        Ensure the badges are generated one file at a time if the batched hook method
+        fails or doesn't return a badge for each file.
+        """
+        work_file = self._work_file("/work/scene.v001.ma")
+        publish = self._publish("/publish/scene.v001.ma")
+        self._badges = {
+            "/work/scene.v001.ma": "work badge",
+            "/publish/scene.v001.ma": "publish badge",
+        }
+
+        self._failing_methods.add("get_badges")
+        self.FileItem.generate_badges([work_file, publish])
+        assert self._hook_methods() == [
+            "get_badges",
+            "get_work_file_badge",
+            "get_publish_badge",
+        ]
+        assert work_file.badge == "work badge"
+        assert publish.badge == "publish badge"
+
+        self._failing_methods.clear()
+        self._hook_calls = []
+        work_file = self._work_file("/work/scene.v001.ma")
+        with patch.object(
+            self.FileItem, "_get_badge", autospec=True, return_value="single badge"
+        ):
+            with patch.object(
+                self.app, "execute_hook_method", return_value=["too", "many", "badges"]
+            ):
+                self.FileItem.generate_badges([work_file])
+        assert work_file.badge == "single badge"
+
+    def test_failed_badge_pixmaps_are_not_cached(self):
+        """
+        Ensure a badge pixmap is generated again if the hook failed to generate it.
+        """
+        red = self.QColor(255, 0, 0)
+        files = [self._work_file("/work/scene.v%03d.ma" % v) for v in (1, 2)]
+        self._badges = dict((f.path, red) for f in files)
+
+        self._failing_methods.add("generate_badge_pixmap")
+        self.FileItem.generate_badges(files[:1])
+        assert files[0].badge_generated and files[0].badge is None
+        assert not self.FileItem._badge_pixmaps
+
+        self._failing_methods.clear()
+        self.FileItem.generate_badges(files[1:])
+        assert files[1].badge == ("pixmap", red.rgba())
+        assert self._hook_methods().count("generate_badge_pixmap") == 2
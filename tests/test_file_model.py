@@ -8,9 +8,13 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import os
 import pprint
+import unittest
 from contextlib import contextmanager
 
+from mock import patch, PropertyMock
+
 from tank_test.tank_test_base import setUpModule  # noqa
 from workfiles2_test_base import Workfiles2TestBase
 from workfiles2_test_base import tearDownModule  # noqa
@@ -126,6 +130,13 @@ class TestFileModelBase(Workfiles2TestBase):
         The list of files is expected to follow this structure
         (ctx, file name, version)
         """
+        assert self._model_contains(expected)
+
+    def _model_contains(self, expected):
+        """
+        :returns: True if the model contains exactly the specified list of files - see
+                  _assert_model_contains().
+        """
         contents = self._get_model_contents()
 
         # Reformat the contents into something that is sortable.
@@ -140,7 +151,7 @@ class TestFileModelBase(Workfiles2TestBase):
             for match in expected
         ]
 
-        assert sorted(contents) == sorted(expected)
+        return sorted(contents) == sorted(expected)
 
     @contextmanager
     def _wait_for_groups(self, nb_groups_expected):
@@ -266,6 +277,266 @@ class TestFileModelWithSandboxes(TestFileModelBase):
             ]
         )
 
+    def test_work_files_found_in_chunks_are_merged(self):
+        """
+        Ensure work files emitted in several chunks whilst searching are merged into the
+        model with the publishes without being duplicated or removed.
+        """
+        for version in (1, 2, 3):
+            self.create_work_file(self._concept_ctx_jeff, "scene", version)
+        self.create_work_file(self._concept_ctx_jeff, "layout", 1)
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 2)
+
+        chunks = []
+        self._model._finder.files_chunk_found.connect(
+            lambda search_id, files, work_area: chunks.append(
+                sorted((f.name, f.version) for f in files)
+            )
+        )
+        AsyncFileFinder = self.tk_multi_workfiles.file_finder.AsyncFileFinder
+        with patch.object(AsyncFileFinder, "_WORK_FILES_CHUNK_SIZE", 1):
+            with self._wait_for_groups(1):
+                self._model.set_entity_searches(
+                    [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+                )
+
+        assert len(chunks) == 4
+        assert sorted(f for chunk in chunks for f in chunk) == [
+            ("layout", 1),
+            ("scene", 1),
+            ("scene", 2),
+            ("scene", 3),
+        ]
+        self._assert_model_contains(
+            [
+                (self._concept_ctx_jeff, "layout", 1, IS_WORKFILE),
+                (self._concept_ctx_jeff, "scene", 1, IS_WORKFILE),
+                (self._concept_ctx_jeff, "scene", 2, IS_WORKFILE),
+                (self._concept_ctx_jeff, "scene", 2, IS_PUBLISH),
+                (self._concept_ctx_jeff, "scene", 3, IS_WORKFILE),
+            ]
+        )
+        group_item = self._model.item(0)
+        assert group_item.rowCount() == 4
+
+    def test_current_item_map_tracks_model_items(self):
+        """
+        Ensure the index of current file items is kept in sync with the model as files are
+        found, removed and groups change.
+        """
+        self.create_work_file(self._concept_ctx_jeff, "scene", 1)
+        removed_path = self.create_work_file(self._concept_ctx_jeff, "scene", 2)
+        self.create_work_file(self._concept_ctx_jeff, "layout", 1)
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 2)
+        self.create_work_file(self._rig_ctx_jeff, "rig", 1)
+
+        with self._wait_for_groups(1):
+            self._model.set_entity_searches(
+                [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+            )
+        self._assert_item_map_matches_model()
+        assert self._model.item(0).rowCount() == 3
+
+        # the work file is removed but the publish for the same version is kept:
+        os.remove(removed_path)
+        with self._wait_for_groups(1):
+            self._model.async_refresh()
+        self._assert_model_contains(
+            [
+                (self._concept_ctx_jeff, "scene", 1, IS_WORKFILE),
+                (self._concept_ctx_jeff, "scene", 2, IS_PUBLISH),
+                (self._concept_ctx_jeff, "layout", 1, IS_WORKFILE),
+            ]
+        )
+        self._assert_item_map_matches_model()
+
+        # groups that are removed are no longer tracked:
+        concept_group_key = self._model.item(0).key
+        with self._wait_for_groups(1):
+            self._model.set_entity_searches(
+                [self.FileModel.SearchDetails("Rig files", self._task_rig)]
+            )
+        assert concept_group_key not in self._model._current_item_map
+        self._assert_item_map_matches_model()
+        self._assert_model_contains([(self._rig_ctx_jeff, "rig", 1, IS_WORKFILE)])
+
+    def _assert_item_map_matches_model(self):
+        """
+        Ensure every file item in the model is tracked in the current item map under its
+        group, file key and version and that nothing else is tracked.
+        """
+        item_map = self._model._current_item_map
+        group_keys = set()
+        for group_row in range(self._model.rowCount()):
+            group_item = self._model.item(group_row)
+            group_keys.add(group_item.key)
+            tracked = dict(
+                ((file_key, version), model_item)
+                for file_key, version_map in item_map.get(group_item.key, {}).items()
+                for version, model_item in version_map.items()
+            )
+            model_items = [
+                group_item.child(row) for row in range(group_item.rowCount())
+            ]
+            assert len(tracked) == len(model_items)
+            for model_item in model_items:
+                file_item = model_item.file_item
+                assert tracked[(file_item.key, file_item.version)] is model_item
+        assert set(key for key, file_map in item_map.items() if file_map) <= group_keys
+
+    def test_publish_changes_are_applied_to_existing_files(self):
+        """
+        Ensure changes to the publishes found for a search update the existing items rather
+        than replacing the group.
+        """
+        self.create_work_file(self._concept_ctx_jeff, "scene", 1)
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 1)
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 2)
+
+        with self._wait_for_groups(1):
+            self._model.set_entity_searches(
+                [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+            )
+
+        group_item = self._model.item(0)
+        work_area = group_item.work_area
+        files = dict(
+            (group_item.child(row).file_item.version, group_item.child(row).file_item)
+            for row in range(group_item.rowCount())
+        )
+        publish_ids = set(f.published_file_id for f in files.values())
+        assert len(publish_ids) == 2
+
+        # removing the publishes keeps the work file but removes the publish only file:
+        self._model._process_files(
+            [],
+            work_area,
+            group_item,
+            have_local=False,
+            have_publishes=True,
+            keep_existing=True,
+            removed_publish_ids=publish_ids,
+        )
+        self._assert_model_contains([(self._concept_ctx_jeff, "scene", 1, IS_WORKFILE)])
+        assert group_item.child(0).file_item is files[1]
+
+        # publishes that are found again are kept:
+        self._model._process_files(
+            [files[2]],
+            work_area,
+            group_item,
+            have_local=False,
+            have_publishes=True,
+            keep_existing=True,
+            removed_publish_ids=set([files[2].published_file_id]),
+        )
+        self._assert_model_contains(
+            [
+                (self._concept_ctx_jeff, "scene", 1, IS_WORKFILE),
+                (self._concept_ctx_jeff, "scene", 2, IS_PUBLISH),
+            ]
+        )
+
+        # the cache is updated along with the model:
+        key = files[1].key
+        cached_versions = self._model.get_cached_file_versions(key, work_area)
+        assert sorted(cached_versions) == [1, 2]
+        assert not cached_versions[1].is_published
+
+    def test_hooks_receive_mutable_publishes(self):
+        """
+        Ensure the publishes given to hooks and exposed by file items can be modified even
+        though the finder shares read-only publish records internally.
+        """
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 1)
+
+        with patch.object(
+            self.app, "execute_hook", wraps=self.app.execute_hook
+        ) as execute_hook:
+            with self._wait_for_groups(1):
+                self._model.set_entity_searches(
+                    [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+                )
+
+        hook_publishes = [
+            item["sg_publish"]
+            for args, kwargs in execute_hook.call_args_list
+            if args and args[0] == "hook_filter_publishes"
+            for item in kwargs["publishes"]
+        ]
+        assert hook_publishes
+        for sg_publish in hook_publishes:
+            assert type(sg_publish) is dict
+            assert type(sg_publish["task"]) is dict
+            sg_publish["description"] = "Modified by a hook"
+
+        group_item = self._model.item(0)
+        publish_items = [
+            group_item.child(i).file_item
+            for i in range(group_item.rowCount())
+            if group_item.child(i).file_item.is_published
+        ]
+        assert publish_items
+        for file_item in publish_items:
+            assert type(file_item.task) is dict
+            assert type(file_item.published_by) is dict
+
+    def test_publish_thumbnail_urls_update_requested_items(self):
+        """
+        Ensure thumbnails queried for publishes are only set on the items they were
+        requested for and that the thumbnails are then requested for those items.
+        """
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 1)
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 2)
+
+        with self._wait_for_groups(1):
+            self._model.set_entity_searches(
+                [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+            )
+
+        group_item = self._model.item(0)
+        publishes = dict(
+            (group_item.child(i).file_item.version, group_item.child(i).file_item)
+            for i in range(group_item.rowCount())
+        )
+        requested = publishes[1]
+
+        with patch.object(
+            self.tk_multi_workfiles.file_item.FileItem,
+            "publish_thumbnail_pending",
+            new_callable=PropertyMock,
+            return_value=True,
+        ):
+            with patch.object(
+                self._model._sg_data_retriever,
+                "execute_find",
+                return_value="thumbnail_urls",
+            ) as execute_find:
+                self._model.request_publish_thumbnails([requested])
+            assert execute_find.call_args[0][1] == [
+                ["id", "in", [requested.published_file_id]]
+            ]
+
+            with patch.object(self._model, "_request_thumbnail") as request_thumbnail:
+                self._model._on_data_retriever_work_completed(
+                    "thumbnail_urls",
+                    "find",
+                    {
+                        "sg": [
+                            {
+                                "type": "PublishedFile",
+                                "id": requested.published_file_id,
+                                "image": "https://thumbnail",
+                            }
+                        ]
+                    },
+                )
+
+        assert not self._model._pending_thumbnail_url_requests
+        assert requested.thumbnail_path == "https://thumbnail"
+        assert publishes[2].thumbnail_path != "https://thumbnail"
+        request_thumbnail.assert_called_once_with(requested, group_item.key)
+
     def test_multi_task_match_same_workfiles_but_different_publishes(self):
         """
         Ensure a task context resolves the files for all tasks on a given
@@ -296,6 +567,90 @@ class TestFileModelWithSandboxes(TestFileModelBase):
             ]
         )
 
+    def test_watched_file_changes_are_merged(self):
+        """
+        Ensure that only the work files for the paths changed in a watched work area are
+        updated in the group, keeping the other files and the publishes.
+        """
+        self.create_work_file(self._concept_ctx_jeff, "scene", 1)
+        removed_path = self.create_work_file(self._concept_ctx_jeff, "scene", 2)
+        self.create_publish_file(self._concept_ctx_jeff, "scene", 1)
+
+        with self._wait_for_groups(1):
+            self._model.set_entity_searches(
+                [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+            )
+        group_item = self._model.item(0)
+
+        expected = [
+            (self._concept_ctx_jeff, "scene", 1, IS_WORKFILE),
+            (self._concept_ctx_jeff, "scene", 1, IS_PUBLISH),
+            (self._concept_ctx_jeff, "scene", 3, IS_WORKFILE),
+        ]
+        with self.wait_for(
+            lambda: self._model_contains(expected),
+            lambda: pprint.pformat(self._get_model_contents()),
+        ):
+            os.remove(removed_path)
+            added_path = self.create_work_file(self._concept_ctx_jeff, "scene", 3)
+            # paths that aren't work files are ignored:
+            self._model._on_watcher_files_changed(
+                group_item.key,
+                [
+                    removed_path,
+                    added_path,
+                    os.path.join(os.path.dirname(added_path), "notes.txt"),
+                ],
+            )
+
+        assert not self._model._watcher_tasks
+        assert self._model.item(0) is group_item
+        assert group_item.data(self.FileModel.SEARCH_STATUS_ROLE) == (
+            self.FileModel.SEARCH_COMPLETED
+        )
+
+    def test_watched_work_areas_are_updated(self):
+        """
+        Ensure that groups are updated when files are created in their work area when
+        work areas are being watched.
+        """
+        WorkAreaWatcher = self.tk_multi_workfiles.work_area_watcher.WorkAreaWatcher
+        if not WorkAreaWatcher.is_supported():
+            raise unittest.SkipTest("inotify isn't available on this platform")
+
+        get_setting = self.app.get_setting
+        with patch.object(
+            self.app,
+            "get_setting",
+            side_effect=lambda name, default=None: name == "watch_work_areas"
+            or get_setting(name, default),
+        ):
+            self._model = self.FileModel(self.bg_task_manager, None)
+        self.addCleanup(self._model.destroy)
+        assert self._model._watcher
+
+        self.create_work_file(self._concept_ctx_jeff, "scene", 1)
+        with self._wait_for_groups(1):
+            self._model.set_entity_searches(
+                [self.FileModel.SearchDetails("Concept files", self._task_concept)]
+            )
+
+        found = []
+        self._model._watcher.files_changed.connect(
+            lambda key, paths: found.append((key, paths))
+        )
+        expected = [
+            (self._concept_ctx_jeff, "scene", 1, IS_WORKFILE),
+            (self._concept_ctx_jeff, "scene", 2, IS_WORKFILE),
+        ]
+        with self.wait_for(
+            lambda: self._model_contains(expected),
+            lambda: pprint.pformat(self._get_model_contents()),
+        ):
+            added_path = self.create_work_file(self._concept_ctx_jeff, "scene", 2)
+
+        assert found == [(self._model.item(0).key, [added_path])]
+
 
 class TestFileModelWithTaskFolder(TestFileModelBase):
     """
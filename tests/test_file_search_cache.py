@@ -0,0 +1,375 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sqlite3
+import datetime
+
+from tank_vendor.shotgun_api3 import sg_timezone
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestFileSearchCache(Workfiles2TestBase):
+    """
+    Tests for the FileSearchCache.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestFileSearchCache, self).setUp()
+
+        self.FileSearchCache = self.tk_multi_workfiles.file_search_cache.FileSearchCache
+        self.FileItem = self.tk_multi_workfiles.file_item.FileItem
+        self.WorkArea = self.tk_multi_workfiles.work_area.WorkArea
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        self._tasks = [
+            self.mockgun.create(
+                "Task",
+                {
+                    "content": "Bunny Concept %d" % i,
+                    "project": self.project,
+                    "step": concept,
+                    "entity": bunny,
+                },
+            )
+            for i in range(3)
+        ]
+        self._work_areas = [
+            self.WorkArea(self.create_context(task)) for task in self._tasks
+        ]
+
+        # start each test without a persistent cache:
+        self._db_path = os.path.join(
+            self.app.cache_location, self.FileSearchCache._DB_FILE_NAME
+        )
+        if os.path.exists(self._db_path):
+            os.remove(self._db_path)
+
+    def _create_files(self, work_area, name, versions, published_versions=()):
+        """
+        Create file items for the specified versions of a file in a work area.
+
+        :returns: A list of FileItem's.
+        """
+        fields = work_area.context.as_template_fields(self.work_template)
+        fields["name"] = name
+        key = self.FileItem.build_file_key(fields, self.work_template)
+
+        files = []
+        for version in versions:
+            fields["version"] = version
+            is_published = version in published_versions
+            files.append(
+                self.FileItem(
+                    key,
+                    is_work_file=True,
+                    work_path=self.work_template.apply_fields(fields),
+                    work_details={
+                        "version": version,
+                        "name": name,
+                        "modified_at": datetime.datetime(2020, 1, version, 12, 30),
+                        "modified_by": self.jeff,
+                    },
+                    is_published=is_published,
+                    publish_path="/publish/%s.v%03d" % (name, version)
+                    if is_published
+                    else None,
+                    publish_details={
+                        "version": version,
+                        "published_at": datetime.datetime(
+                            2020, 1, version, 13, 0, tzinfo=sg_timezone.local
+                        ),
+                        "entity": self._tasks[0]["entity"],
+                    }
+                    if is_published
+                    else None,
+                )
+            )
+        return files
+
+    def _restore(self, cache, work_area):
+        """
+        Restore the entry for a work area from the persistent cache.
+
+        :returns: The result of FileSearchCache.find() once the entry has been restored.
+        """
+        entity = work_area.context.task
+        user = work_area.context.user
+        cache.restore([(entity, user)])
+        return cache.find(entity, user)
+
+    def test_persistent_entries_are_restored(self):
+        """
+        Ensure that saved entries are only restored by restore() and that the restored
+        files are equal to the ones that were saved.
+        """
+        work_area = self._work_areas[0]
+        entity = work_area.context.task
+        user = work_area.context.user
+        files = self._create_files(work_area, "scene", [1, 2, 3], [2])
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        cache.add(work_area, files, is_dirty=False)
+        cache.save()
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        assert cache.needs_restore(entity, user)
+        # looking up an entry never restores it:
+        assert cache.find(entity, user) is None
+        assert not cache.is_up_to_date(entity, user)
+
+        assert cache.restore([(entity, user)]) == [(entity, user)]
+        assert not cache.needs_restore(entity, user)
+        assert cache.is_up_to_date(entity, user)
+
+        restored_files, restored_work_area = cache.find(entity, user)
+        assert restored_work_area.context == work_area.context
+        by_version = dict((f.version, f) for f in restored_files)
+        assert sorted(by_version) == [1, 2, 3]
+        for file_item in files:
+            restored = by_version[file_item.version]
+            assert restored.key == file_item.key
+            assert restored.serialize() == file_item.serialize()
+        assert by_version[2].publish_details["published_at"] == datetime.datetime(
+            2020, 1, 2, 13, 0, tzinfo=sg_timezone.local
+        )
+
+        # entries are only restored once:
+        assert cache.restore([(entity, user)]) == []
+
+    def test_restore_keeps_entries_in_memory(self):
+        """
+        Ensure that restoring doesn't replace entries found whilst it was running.
+        """
+        work_area = self._work_areas[0]
+        entity = work_area.context.task
+        user = work_area.context.user
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        cache.add(work_area, self._create_files(work_area, "scene", [1]), False)
+        cache.save()
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        cache.add(work_area, self._create_files(work_area, "scene", [1, 2]), False)
+        assert not cache.needs_restore(entity, user)
+        assert cache.restore([(entity, user)]) == []
+        files, _ = cache.find(entity, user)
+        assert sorted(f.version for f in files) == [1, 2]
+
+    def test_sandbox_entries_are_restored_for_their_user(self):
+        """
+        Ensure that entries found in the sandbox of another user are restored with a work
+        area for that user rather than for the current user.
+        """
+        work_area = self._work_areas[0].create_copy_for_user(self.francis)
+        entity = work_area.context.task
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        cache.add(work_area, self._create_files(work_area, "scene", [1, 2]), False)
+        cache.save()
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        assert cache.needs_restore(entity, self.francis)
+        files, restored_work_area = self._restore(cache, work_area)
+        assert sorted(f.version for f in files) == [1, 2]
+        assert restored_work_area.context == work_area.context
+        assert restored_work_area.context.user["id"] == self.francis["id"]
+        assert restored_work_area.work_template == work_area.work_template
+        assert restored_work_area.publish_template == work_area.publish_template
+
+    def test_evicted_entries_can_be_restored(self):
+        """
+        Ensure that entries evicted from memory are saved and can be restored again.
+        """
+        cache = self.FileSearchCache(max_size=3, ttl=60, persistent=True)
+        for work_area in self._work_areas:
+            cache.add(work_area, self._create_files(work_area, "scene", [1, 2]), False)
+
+        work_area = self._work_areas[0]
+        entity = work_area.context.task
+        user = work_area.context.user
+        assert cache.find(entity, user) is None
+        assert cache.needs_restore(entity, user)
+        files, _ = self._restore(cache, work_area)
+        assert sorted(f.version for f in files) == [1, 2]
+
+    def test_entries_stored_with_other_schema_are_discarded(self):
+        """
+        Ensure that entries stored in a different format are discarded rather than restored.
+        """
+        work_area = self._work_areas[0]
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        cache.add(work_area, self._create_files(work_area, "scene", [1]), False)
+        cache.save()
+
+        connection = sqlite3.connect(self._db_path)
+        connection.execute(
+            "PRAGMA user_version = %d" % (self.FileSearchCache._SCHEMA_VERSION + 1)
+        )
+        connection.commit()
+        connection.close()
+
+        cache = self.FileSearchCache(ttl=60, persistent=True)
+        assert self._restore(cache, work_area) is None
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """
+        Ensure that the least recently used entries are evicted once the cache is too big
+        and that looking up an entry marks it as used.
+        """
+        cache = self.FileSearchCache(max_size=4)
+        first, second, third = self._work_areas
+        cache.add(first, self._create_files(first, "scene", [1, 2]), False)
+        cache.add(second, self._create_files(second, "scene", [1, 2]), False)
+        assert cache.get_stats()["size"] == 4
+
+        # use the first entry so that the second is evicted instead:
+        assert cache.find_file_versions(first, self._file_key(first, "scene"))
+        cache.add(third, self._create_files(third, "scene", [1, 2]), False)
+
+        assert self._find(cache, first) is not None
+        assert self._find(cache, second) is None
+        assert self._find(cache, third) is not None
+        stats = cache.get_stats()
+        assert stats["size"] == 4
+        assert stats["evictions"] == 1
+        assert stats["evicted_size"] == 2
+
+        # the most recently used entry is always kept, even if it's too big by itself:
+        cache.add(second, self._create_files(second, "scene", [1, 2, 3, 4, 5]), False)
+        assert self._find(cache, second) is not None
+        assert self._find(cache, first) is None
+        assert self._find(cache, third) is None
+        assert cache.get_stats()["size"] == 5
+
+    def test_update(self):
+        """
+        Ensure that update() adds, replaces and removes files without touching the other
+        files in the entry and that the latest versions are kept up to date.
+        """
+        work_area = self._work_areas[0]
+        cache = self.FileSearchCache()
+        assert not cache.update(work_area, self._create_files(work_area, "scene", [1]))
+
+        scene = self._create_files(work_area, "scene", [1, 2, 3], [2])
+        layout = self._create_files(work_area, "layout", [1])
+        cache.add(work_area, scene + layout, False)
+        scene_key = self._file_key(work_area, "scene")
+        layout_key = self._file_key(work_area, "layout")
+        assert cache.find_latest_versions(work_area, scene_key) == (3, 3, 2)
+
+        new_scene = self._create_files(work_area, "scene", [4, 2])
+        assert cache.update(work_area, new_scene, [(scene_key, 3), (layout_key, 1)])
+
+        versions = cache.find_file_versions(work_area, scene_key)
+        assert sorted(versions) == [1, 2, 4]
+        assert versions[1] is scene[0]
+        assert versions[2] is new_scene[1]
+        assert versions[4] is new_scene[0]
+        # version 2 is no longer published:
+        assert cache.find_latest_versions(work_area, scene_key) == (4, 4, None)
+        assert cache.find_file_versions(work_area, layout_key) == {}
+        assert cache.get_stats()["size"] == 3
+
+        # the entry stays clean:
+        assert cache.find_file_versions(work_area, scene_key, clean_only=True)
+
+    def test_latest_versions(self):
+        """
+        Ensure the sorted versions and the latest local and published versions are tracked
+        for each file.
+        """
+        work_area = self._work_areas[0]
+        scene = self._create_files(work_area, "scene", [3, 1, 2], [2])
+        scene_key = scene[0].key
+        published = self.FileItem(
+            scene_key,
+            is_published=True,
+            publish_path="/publish/scene.v005",
+            publish_details={"version": 5, "name": "scene"},
+        )
+        cache = self.FileSearchCache()
+        cache.add(work_area, scene + [published], is_dirty=True)
+
+        assert cache.find_latest_versions(work_area, scene_key) == (5, 3, 5)
+        versions, sorted_versions = cache.find_sorted_file_versions(
+            work_area, scene_key
+        )
+        assert sorted_versions == [1, 2, 3, 5]
+        assert versions[5] is published
+
+        # files that aren't in the entry have no versions:
+        layout_key = self._file_key(work_area, "layout")
+        assert cache.find_latest_versions(work_area, layout_key) == (None, None, None)
+        assert cache.find_sorted_file_versions(work_area, layout_key) == ({}, [])
+
+        # dirty entries and work areas without an entry aren't found:
+        assert cache.find_latest_versions(work_area, scene_key, clean_only=True) is None
+        assert cache.find_latest_versions(self._work_areas[1], scene_key) is None
+
+        cache.set_work_area_dirty(work_area, False)
+        assert cache.find_latest_versions(work_area, scene_key, clean_only=True) == (
+            5,
+            3,
+            5,
+        )
+
+    def test_size_includes_thumbnails(self):
+        """
+        Ensure the size of an entry is re-estimated when thumbnails are loaded for its
+        files and when files are updated.
+        """
+        thumbnail_size = self.FileSearchCache._THUMBNAIL_SIZE
+        first, second, _ = self._work_areas
+        cache = self.FileSearchCache(max_size=thumbnail_size + 6)
+        files = self._create_files(first, "scene", [1, 2])
+        cache.add(first, files, False)
+        cache.add(second, self._create_files(second, "scene", [1, 2]), False)
+        assert cache.get_stats()["size"] == 4
+
+        # thumbnails shared between versions are only counted once:
+        thumbnail = object()
+        for file_item in files:
+            file_item.thumbnail = thumbnail
+        cache.update_size(first)
+        assert cache.get_stats()["size"] == thumbnail_size + 4
+
+        update = self._create_files(first, "scene", [3])
+        update[0].thumbnail = object()
+        cache.update(first, update)
+        assert self._find(cache, first) is not None
+        assert self._find(cache, second) is None
+        assert cache.get_stats()["size"] == thumbnail_size * 2 + 3
+
+    def _file_key(self, work_area, name):
+        """
+        :returns: The file key for the files with the specified name in a work area.
+        """
+        fields = work_area.context.as_template_fields(self.work_template)
+        fields["name"] = name
+        return self.FileItem.build_file_key(fields, self.work_template)
+
+    def _find(self, cache, work_area):
+        """
+        :returns: The result of FileSearchCache.find() for a work area.
+        """
+        return cache.find(work_area.context.task, work_area.context.user)
@@ -0,0 +1,159 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import datetime
+
+from mock import patch
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestTemplateMatcher(Workfiles2TestBase):
+    """
+    Tests for the TemplateMatcher.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestTemplateMatcher, self).setUp()
+
+        self.TemplateMatcher = self.tk_multi_workfiles.template_matcher.TemplateMatcher
+        self.FileItem = self.tk_multi_workfiles.file_item.FileItem
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        task = self.mockgun.create(
+            "Task",
+            {
+                "content": "Bunny Concept",
+                "project": self.project,
+                "step": concept,
+                "entity": bunny,
+            },
+        )
+        self._ctx_jeff = self.create_context(task)
+        self._ctx_francis = self.create_context(task, self.francis)
+
+    def _test_paths(self):
+        """
+        :returns: A list of paths that do and don't match the work template.
+        """
+        paths = []
+        for ctx in (self._ctx_jeff, self._ctx_francis):
+            for name in ("scene", "scene.v001", "layout_v2"):
+                for version in (1, 12, 1234):
+                    paths.append(self.create_work_file(ctx, name, version))
+
+        work_dir = os.path.dirname(paths[0])
+        paths.extend(
+            [
+                os.path.join(work_dir, "notes.txt"),
+                os.path.join(work_dir, "scene.vabc.ma"),
+                os.path.join(work_dir, "scene.v001.mb"),
+                os.path.join(work_dir, "nested", "scene.v001.ma"),
+                os.path.join(os.path.dirname(work_dir), "scene.v001.ma"),
+                os.path.join(self.project_root, "scene.v001.ma"),
+            ]
+        )
+        return paths
+
+    def _assert_matches_template(self, matcher):
+        """
+        Ensure the matcher extracts the same fields as template.get_fields() for matching
+        paths and rejects the paths the template rejects.
+        """
+        paths = self._test_paths()
+        results = matcher.get_fields_for_paths(paths)
+        assert set(results) == set(paths)
+
+        num_valid = 0
+        for path in paths:
+            expected = self.work_template.validate_and_get_fields(path)
+            assert results[path] == expected
+            assert matcher.validate_and_get_fields(path) == expected
+            if expected is not None:
+                num_valid += 1
+                assert matcher.get_fields(path) == self.work_template.get_fields(path)
+        assert num_valid == 18
+
+    def test_fields_match_template(self):
+        """
+        Ensure the compiled expressions give the same results as template.get_fields().
+        """
+        matcher = self.TemplateMatcher(self.work_template)
+        assert matcher._variations
+        self._assert_matches_template(matcher)
+
+    def test_fields_match_template_without_variations(self):
+        """
+        Ensure the matcher falls back to template.get_fields() if the template variations
+        aren't available.
+        """
+        with patch.object(self.work_template, "_definitions", None):
+            matcher = self.TemplateMatcher(self.work_template)
+        assert matcher._variations == []
+        self._assert_matches_template(matcher)
+
+    def test_intern_table_is_bounded(self):
+        """
+        Ensure the table of interned file keys doesn't grow without limit.
+        """
+        with patch.object(self.TemplateMatcher, "_MAX_FILE_KEYS", 10):
+            with patch.object(self.TemplateMatcher, "_file_keys", {}):
+                for i in range(25):
+                    key = (("name", "scene_%d" % i),)
+                    assert self.TemplateMatcher.intern_file_key(key) == key
+                    assert len(self.TemplateMatcher._file_keys) <= 10
+
+                # keys already in the table are still shared:
+                key = self.TemplateMatcher.intern_file_key((("name", "scene_24"),))
+                assert self.TemplateMatcher.intern_file_key(tuple(list(key))) is key
+
+    def test_equal_keys_compare_equal(self):
+        """
+        Ensure files with equal keys that aren't the same object are compared as versions
+        of the same file, e.g. when keys were interned before the table was cleared.
+        """
+        key = (("name", "scene"),)
+        with patch.object(self.TemplateMatcher, "_file_keys", {}):
+            older = self.FileItem(
+                key,
+                is_work_file=True,
+                work_path="/work/scene.v002.ma",
+                work_details={
+                    "version": 2,
+                    "modified_at": datetime.datetime(2020, 1, 2),
+                },
+            )
+        with patch.object(self.TemplateMatcher, "_file_keys", {}):
+            newer = self.FileItem(
+                tuple(list(key)),
+                is_work_file=True,
+                work_path="/work/scene.v003.ma",
+                work_details={
+                    "version": 3,
+                    "modified_at": datetime.datetime(2020, 1, 1),
+                },
+            )
+        assert older.key is not newer.key and older.key == newer.key
+
+        # the versions are compared rather than the modification times:
+        assert newer.compare(older) == 1
+        assert older.compare(newer) == -1
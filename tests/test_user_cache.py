@@ -0,0 +1,124 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import unittest
+
+from mock import patch, Mock
+
+import sgtk
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestUserCache(Workfiles2TestBase):
+    """
+    Tests for the UserCache.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestUserCache, self).setUp()
+
+        # use a new cache for each test so that nothing has been looked up yet:
+        self._user_cache = self.tk_multi_workfiles.user_cache.UserCache()
+
+    def _user_ids(self, users):
+        """
+        :returns: A dictionary {key:user id} for a dictionary of users.
+        """
+        return dict((k, user["id"] if user else user) for k, user in users.items())
+
+    def test_users_for_ids_are_found_in_one_query(self):
+        """
+        Ensure all users that haven't been looked up are found with a single query and
+        that users that don't exist aren't looked up again.
+        """
+        user_ids = [self.jeff["id"], self.francis["id"], 12345]
+        with patch.object(self.mockgun, "find", wraps=self.mockgun.find) as find:
+            users = self._user_cache.get_user_details_for_ids(user_ids)
+            assert find.call_count == 1
+            assert self._user_ids(users) == {
+                self.jeff["id"]: self.jeff["id"],
+                self.francis["id"]: self.francis["id"],
+                12345: {},
+            }
+
+            users = self._user_cache.get_user_details_for_ids(user_ids)
+            assert users[self.jeff["id"]]["id"] == self.jeff["id"]
+            assert users[self.francis["id"]]["id"] == self.francis["id"]
+            assert find.call_count == 1
+
+    def test_users_for_logins_are_found_in_one_query(self):
+        """
+        Ensure users are found by login with a single query and cached by both login and
+        id.
+        """
+        with patch.object(self.mockgun, "find", wraps=self.mockgun.find) as find:
+            users = self._user_cache.get_user_details_for_field_values(
+                "login", ["jeff", "francis", "nobody"]
+            )
+            assert find.call_count == 1
+            assert self._user_ids(users) == {
+                "jeff": self.jeff["id"],
+                "francis": self.francis["id"],
+            }
+
+            # all logins and the ids of the users found are now cached:
+            self._user_cache.get_user_details_for_field_values(
+                "login", ["jeff", "nobody"]
+            )
+            self._user_cache.get_user_details_for_ids([self.francis["id"]])
+            assert find.call_count == 1
+
+    @unittest.skipIf(sgtk.util.is_windows(), "File owners aren't available on Windows")
+    def test_file_owners_are_resolved_in_one_batch(self):
+        """
+        Ensure the owners of several files are resolved with a single query and that each
+        uid is only resolved to a login once.
+        """
+        logins = {1001: "jeff", 1002: "francis", 1003: "nobody"}
+
+        def getpwuid(uid):
+            if uid not in logins:
+                raise KeyError(uid)
+            return Mock(pw_name=logins[uid])
+
+        stats = dict(
+            ("/work/file_%d.ma" % uid, Mock(st_uid=uid))
+            for uid in (1001, 1002, 1003, 1004)
+        )
+        stats["/work/other_file.ma"] = Mock(st_uid=1001)
+
+        with patch("pwd.getpwuid", side_effect=getpwuid) as pwd_getpwuid:
+            with patch.object(self.mockgun, "find", wraps=self.mockgun.find) as find:
+                users = self._user_cache.get_file_last_modified_users(
+                    list(stats), stats
+                )
+                assert find.call_count == 1
+                assert pwd_getpwuid.call_count == 4
+                assert self._user_ids(users) == {
+                    "/work/file_1001.ma": self.jeff["id"],
+                    "/work/other_file.ma": self.jeff["id"],
+                    "/work/file_1002.ma": self.francis["id"],
+                    "/work/file_1003.ma": {},
+                    "/work/file_1004.ma": None,
+                }
+
+                # everything is cached now:
+                assert (
+                    self._user_cache.get_file_last_modified_users(list(stats), stats)
+                    == users
+                )
+                assert find.call_count == 1
+                assert pwd_getpwuid.call_count == 4
@@ -0,0 +1,138 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestSnapshotDict(Workfiles2TestBase):
+    """
+    Tests for the SnapshotDict.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestSnapshotDict, self).setUp()
+
+        self.SnapshotDict = self.tk_multi_workfiles.util.SnapshotDict
+
+    def test_snapshots_are_never_modified(self):
+        """
+        Ensure writes copy the data rather than modifying snapshots that may be being read.
+        """
+        data = self.SnapshotDict()
+        data.set("a", 1)
+        snapshot = data.snapshot
+
+        data.set("b", 2)
+        data.update({"a": 3, "c": 4})
+        assert data.setdefault("d", 5) == 5
+        assert data.pop("b") == 2
+        assert snapshot == {"a": 1}
+
+        snapshot = data.snapshot
+        assert snapshot == {"a": 3, "c": 4, "d": 5}
+        data.clear()
+        assert snapshot == {"a": 3, "c": 4, "d": 5}
+        assert len(data) == 0 and "a" not in data
+
+        # reads and writes that don't change anything don't copy the data:
+        data.set("a", 1)
+        snapshot = data.snapshot
+        assert data.setdefault("a", 2) == 1
+        assert data.pop("missing", "default") == "default"
+        assert data.snapshot is snapshot
+        assert data.get("a") == 1 and data.get("missing") is None
+
+    def test_concurrent_writes(self):
+        """
+        Ensure concurrent writers don't lose each other's updates and that setdefault gives
+        all threads the same value.
+        """
+        data = self.SnapshotDict()
+        num_threads = 8
+        num_keys = 200
+        shared_values = [None] * num_threads
+        start = threading.Event()
+
+        def write(index):
+            start.wait()
+            for i in range(num_keys):
+                data.set((index, i), i)
+            shared_values[index] = data.setdefault("shared", index)
+
+        threads = [
+            threading.Thread(target=write, args=(index,))
+            for index in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(data) == num_threads * num_keys + 1
+        assert len(set(shared_values)) == 1
+        assert data.get("shared") == shared_values[0]
+
+
+class TestContextKey(Workfiles2TestBase):
+    """
+    Tests for get_context_key.
+    """
+
+    def test_keys_match_context_equality(self):
+        """
+        Ensure contexts that compare equal have equal keys even if they don't hash the same
+        and that contexts that don't compare equal have different keys.
+        """
+        get_context_key = self.tk_multi_workfiles.util.get_context_key
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        tasks = [
+            self.mockgun.create(
+                "Task",
+                {
+                    "content": "Bunny Concept %d" % i,
+                    "project": self.project,
+                    "step": concept,
+                    "entity": bunny,
+                },
+            )
+            for i in range(2)
+        ]
+        contexts = [
+            self.tk.context_from_entity("Asset", bunny["id"]),
+            self.create_context(tasks[0]),
+            self.create_context(tasks[0], self.francis),
+            self.create_context(tasks[1]),
+        ]
+        for ctx in contexts:
+            # the same context with different entity details is still equal:
+            same_ctx = ctx.create_copy_for_user(dict(ctx.user, name="Someone else"))
+            assert same_ctx == ctx
+            assert get_context_key(same_ctx) == get_context_key(ctx)
+            hash(get_context_key(ctx))
+
+        for index, ctx in enumerate(contexts):
+            for other_ctx in contexts[index + 1 :]:
+                assert ctx != other_ctx
+                assert get_context_key(ctx) != get_context_key(other_ctx)
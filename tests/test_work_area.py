@@ -0,0 +1,145 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import time
+
+from mock import patch
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestSandboxUsersCache(Workfiles2TestBase):
+    """
+    Tests for the cache of users resolved from the user sandboxes on disk.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestSandboxUsersCache, self).setUp()
+
+        self.WorkArea = self.tk_multi_workfiles.work_area.WorkArea
+
+        # use a new cache for each test so that nothing has been resolved yet:
+        patcher = patch.object(
+            self.WorkArea, "_sandbox_users_cache", self.WorkArea._SandboxUsersCache()
+        )
+        self._cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        self._tasks = [
+            self.mockgun.create(
+                "Task",
+                {
+                    "content": "Bunny Concept %d" % i,
+                    "project": self.project,
+                    "step": concept,
+                    "entity": bunny,
+                },
+            )
+            for i in range(2)
+        ]
+        self._ctx_jeff = self.create_context(self._tasks[0])
+        self._ctx_francis = self.create_context(self._tasks[0], self.francis)
+        self.create_work_file(self._ctx_jeff, "scene", 1)
+        self.create_work_file(self._ctx_francis, "scene", 1)
+
+    def _user_ids(self, users):
+        """
+        :returns: A sorted list of the ids of the specified users.
+        """
+        return sorted(user["id"] for user in users)
+
+    def test_users_are_cached_until_they_expire(self):
+        """
+        Ensure users are cached per template and context, that equal contexts share the
+        same entry and that entries expire.
+        """
+        users = [self.jeff, self.francis]
+        assert self._cache.get(self.work_template, self._ctx_jeff) is None
+
+        self._cache.add(self.work_template, self._ctx_jeff, users)
+        assert self._cache.get(self.work_template, self._ctx_jeff) == users
+        # an equal context built separately finds the same entry:
+        assert (
+            self._cache.get(
+                self.work_template,
+                self.tk.context_from_entity("Task", self._tasks[0]["id"]),
+            )
+            == users
+        )
+        # but other templates and contexts don't:
+        assert self._cache.get(self.publish_template, self._ctx_jeff) is None
+        other_ctx = self.create_context(self._tasks[1])
+        assert self._cache.get(self.work_template, other_ctx) is None
+
+        expired = time.time() + self.WorkArea._SandboxUsersCache._TTL + 1
+        with patch("time.time", return_value=expired):
+            assert self._cache.get(self.work_template, self._ctx_jeff) is None
+            # expired entries are dropped when new users are added:
+            self._cache.add(self.work_template, other_ctx, [self.jeff])
+            assert list(self._cache._cache.snapshot.values()) == [
+                ([self.jeff], expired + self.WorkArea._SandboxUsersCache._TTL)
+            ]
+
+    def test_sandboxes_are_resolved_once_for_all_work_areas(self):
+        """
+        Ensure the users found in the sandboxes of one work area are re-used by other work
+        areas for the same context until they expire.
+        """
+        work_area = self.WorkArea(self._ctx_jeff)
+        assert self._user_ids(work_area.work_area_sandbox_users) == [
+            self.jeff["id"],
+            self.francis["id"],
+        ]
+
+        # a new sandbox isn't picked up whilst the users are cached:
+        self.create_work_file(self.create_context(self._tasks[0], self.rob), "scene", 1)
+        with patch.object(
+            self.tk, "paths_from_template", wraps=self.tk.paths_from_template
+        ) as paths_from_template:
+            work_area = self.WorkArea(self._ctx_jeff)
+            assert self._user_ids(work_area.work_area_sandbox_users) == [
+                self.jeff["id"],
+                self.francis["id"],
+            ]
+            assert paths_from_template.call_count == 0
+
+        # but is as soon as the cached users expire:
+        expired = time.time() + self.WorkArea._SandboxUsersCache._TTL + 1
+        with patch("time.time", return_value=expired):
+            work_area = self.WorkArea(self._ctx_jeff)
+            assert self._user_ids(work_area.work_area_sandbox_users) == [
+                self.jeff["id"],
+                self.francis["id"],
+                self.rob["id"],
+            ]
+
+    def test_cached_users_are_copied(self):
+        """
+        Ensure work areas can't change the users cached for other work areas.
+        """
+        users = self.WorkArea(self._ctx_jeff).work_area_sandbox_users
+        users.append(self.rob)
+        users[0]["name"] = "Changed"
+
+        users = self.WorkArea(self._ctx_jeff).work_area_sandbox_users
+        assert self._user_ids(users) == [self.jeff["id"], self.francis["id"]]
+        assert all(user.get("name") != "Changed" for user in users)
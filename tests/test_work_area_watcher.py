@@ -0,0 +1,200 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestWorkAreaWatcher(Workfiles2TestBase):
+    """
+    Tests for the WorkAreaWatcher, using a real inotify instance to watch a temporary
+    directory.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestWorkAreaWatcher, self).setUp()
+
+        WorkAreaWatcher = self.tk_multi_workfiles.work_area_watcher.WorkAreaWatcher
+        if not WorkAreaWatcher.is_supported():
+            raise unittest.SkipTest("inotify isn't available on this platform")
+        self.WorkAreaWatcher = WorkAreaWatcher
+
+        self._root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._root)
+
+        # report changes quickly so that the tests don't have to wait too long:
+        with patch.object(WorkAreaWatcher, "_BATCH_INTERVAL", 10):
+            self._watcher = WorkAreaWatcher(self.bg_task_manager)
+        self.addCleanup(self._watcher.shut_down)
+
+        self._changed_keys = []
+        self._changed_files = []
+        self._overflows = []
+        self._watcher.work_area_changed.connect(self._changed_keys.append)
+        self._watcher.files_changed.connect(
+            lambda key, paths: self._changed_files.append((key, paths))
+        )
+        self._watcher.watch_overflowed.connect(lambda: self._overflows.append(True))
+
+    def _touch(self, *path_parts):
+        """
+        Create an empty file under the temporary directory.
+
+        :returns: The path to the file.
+        """
+        path = os.path.join(self._root, *path_parts)
+        with open(path, "wb"):
+            return path
+
+    def _wait_for_changes(self, nb_changes_expected=1):
+        """
+        Wait for the expected number of files_changed signals to be emitted.
+        """
+        return self.wait_for(
+            lambda: len(self._changed_files) >= nb_changes_expected,
+            lambda: "Timed out. Changes: %s" % (self._changed_files,),
+        )
+
+    def test_created_files_are_reported(self):
+        """
+        Ensure files created in a watched directory are reported for the key they were
+        watched under, with the key reported as changed straight away.
+        """
+        self._watcher.watch("key", [self._root])
+        with self._wait_for_changes():
+            scene_path = self._touch("scene.v001.ma")
+            layout_path = self._touch("layout.v001.ma")
+
+        assert self._changed_keys == ["key"]
+        assert self._changed_files == [("key", sorted([scene_path, layout_path]))]
+        assert self._overflows == []
+
+    def test_deleted_files_are_reported(self):
+        """
+        Ensure files deleted from a watched directory are reported.
+        """
+        path = self._touch("scene.v001.ma")
+        self._watcher.watch("key", [self._root])
+        with self._wait_for_changes():
+            os.remove(path)
+
+        assert self._changed_files == [("key", [path])]
+
+    def test_moved_files_are_reported(self):
+        """
+        Ensure both the old and the new path of a file renamed in a watched directory are
+        reported, as well as files moved into and out of the directory.
+        """
+        other_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_dir)
+        old_path = self._touch("scene.v001.ma")
+        moved_out_path = self._touch("scene.v002.ma")
+        moved_in_path = os.path.join(other_dir, "scene.v003.ma")
+        with open(moved_in_path, "wb"):
+            pass
+
+        self._watcher.watch("key", [self._root])
+        with self._wait_for_changes():
+            new_path = os.path.join(self._root, "layout.v001.ma")
+            os.rename(old_path, new_path)
+            shutil.move(moved_out_path, os.path.join(other_dir, "scene.v002.ma"))
+            shutil.move(moved_in_path, self._root)
+
+        assert self._changed_files == [
+            (
+                "key",
+                sorted(
+                    [
+                        old_path,
+                        new_path,
+                        moved_out_path,
+                        os.path.join(self._root, "scene.v003.ma"),
+                    ]
+                ),
+            )
+        ]
+
+    def test_new_directories_are_walked_and_watched(self):
+        """
+        Ensure files in a directory moved into a watched directory are reported and that
+        the new directory is then watched as well.
+        """
+        other_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_dir, True)
+        os.makedirs(os.path.join(other_dir, "maya", "scenes"))
+        with open(os.path.join(other_dir, "maya", "scenes", "scene.v001.ma"), "wb"):
+            pass
+
+        self._watcher.watch("key", [self._root])
+        with self._wait_for_changes():
+            shutil.move(os.path.join(other_dir, "maya"), self._root)
+
+        scenes_dir = os.path.join(self._root, "maya", "scenes")
+        assert self._changed_files == [
+            ("key", [os.path.join(scenes_dir, "scene.v001.ma")])
+        ]
+
+        with self._wait_for_changes(2):
+            path = self._touch("maya", "scenes", "scene.v002.ma")
+        assert self._changed_files[1] == ("key", [path])
+
+    def test_changes_are_reported_for_each_key(self):
+        """
+        Ensure changes to a directory watched under several keys are reported for each key
+        and that keys stop being reported once they are unwatched.
+        """
+        self._watcher.watch("first", [self._root])
+        self._watcher.watch("second", [self._root])
+        with self._wait_for_changes(2):
+            path = self._touch("scene.v001.ma")
+        assert sorted(self._changed_files) == [
+            ("first", [path]),
+            ("second", [path]),
+        ]
+
+        self._watcher.unwatch("first")
+        with self._wait_for_changes(3):
+            os.remove(path)
+        assert self._changed_files[2] == ("second", [path])
+
+        self._watcher.unwatch("second")
+        self._touch("scene.v002.ma")
+        self._watcher._on_notifier_activated()
+        assert self._watcher._pending_changes == {}
+
+    def test_overflow_is_reported(self):
+        """
+        Ensure that all watched keys are reported as changed and watch_overflowed is
+        emitted instead of files_changed if inotify events are lost.
+        """
+        self._watcher.watch("first", [self._root])
+        self._watcher.watch("second", [self._root])
+
+        overflow_event = (-1, self.WorkAreaWatcher._IN_Q_OVERFLOW, "")
+        with self.wait_for(lambda: bool(self._overflows), lambda: "Not overflowed"):
+            with patch.object(
+                self._watcher, "_read_events", return_value=[overflow_event]
+            ):
+                self._watcher._on_notifier_activated()
+
+        assert sorted(self._changed_keys) == ["first", "second"]
+        assert self._changed_files == []
+        assert self._overflows == [True]
@@ -0,0 +1,290 @@
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import threading
+import time
+
+from mock import patch
+
+from tank_test.tank_test_base import setUpModule  # noqa
+from workfiles2_test_base import Workfiles2TestBase
+from workfiles2_test_base import tearDownModule  # noqa
+
+
+class TestWorkFileWalker(Workfiles2TestBase):
+    """
+    Test that the WorkFileWalker finds the same files as paths_from_template.
+    """
+
+    def setUp(self):
+        """
+        Fixtures setup
+        """
+        super(TestWorkFileWalker, self).setUp()
+
+        self.WorkFileWalker = self.tk_multi_workfiles.file_finder.WorkFileWalker
+        self.WorkFileIndex = self.tk_multi_workfiles.work_file_index.WorkFileIndex
+        self.SharedDirectoryScan = (
+            self.tk_multi_workfiles.shared_directory_scan.SharedDirectoryScan
+        )
+
+        bunny = self.mockgun.create(
+            "Asset",
+            {"code": "Bunny", "sg_asset_type": "Character", "project": self.project},
+        )
+        concept = self.mockgun.create(
+            "Step", {"code": "Concept", "short_name": "concept"}
+        )
+        task = self.mockgun.create(
+            "Task",
+            {
+                "content": "Bunny Concept",
+                "project": self.project,
+                "step": concept,
+                "entity": bunny,
+            },
+        )
+        self._ctx_jeff = self.create_context(task)
+        self._ctx_francis = self.create_context(task, self.francis)
+
+        for ctx in (self._ctx_jeff, self._ctx_francis):
+            for name in ("scene", "layout"):
+                for version in (1, 2, 3):
+                    self.create_work_file(ctx, name, version)
+
+        # add some files that don't match the template, including a hidden file that
+        # glob never matches with a wildcard:
+        self._work_dir = os.path.dirname(
+            self.create_work_file(self._ctx_jeff, "scene", 4)
+        )
+        for file_name in ("notes.txt", "scene.vabc.ma", ".scene.v001.ma"):
+            with open(os.path.join(self._work_dir, file_name), "w"):
+                pass
+
+    def _assert_walk_matches(self, walker, fields, skip_keys):
+        """
+        Ensure the walker finds the same files as paths_from_template and that the stat
+        and fields returned for each file are correct.
+
+        :returns: The files found by the walker.
+        """
+        expected = set(
+            self.tk.paths_from_template(
+                self.work_template, fields, skip_keys, skip_missing_optional_keys=True
+            )
+        )
+        found = walker.walk(fields, skip_keys, skip_missing_optional_keys=True)
+
+        assert set(found) == expected
+        for path, (stat, found_fields) in found.items():
+            assert found_fields == self.work_template.get_fields(path)
+            assert stat.st_size == os.stat(path).st_size
+            assert stat.st_mtime == os.stat(path).st_mtime
+        return found
+
+    def _search_cases(self):
+        """
+        :returns: A list of (fields, skip keys) to search with.
+        """
+        fields = self._ctx_jeff.as_template_fields(self.work_template)
+        return [
+            (fields, ["version"]),
+            (fields, ["version", "user"]),
+            (fields, ["version", "name"]),
+            (dict(fields, name="scene", version=2), []),
+            ({}, ["version"]),
+        ]
+
+    def test_matches_paths_from_template(self):
+        """
+        Ensure the walker finds the same files as paths_from_template.
+        """
+        for fields, skip_keys in self._search_cases():
+            found = self._assert_walk_matches(
+                self.WorkFileWalker(self.work_template), fields, skip_keys
+            )
+            assert found
+
+    def test_progress_is_reported(self):
+        """
+        Ensure progress is reported as the walk advances without changing the files found.
+        """
+        for fields, skip_keys in self._search_cases():
+            walker = self.WorkFileWalker(self.work_template)
+            results = list(
+                walker.iter_walk(
+                    fields,
+                    skip_keys,
+                    skip_missing_optional_keys=True,
+                    report_progress=True,
+                )
+            )
+            found = dict(result for result in results if result is not None)
+            assert found == walker.walk(
+                fields, skip_keys, skip_missing_optional_keys=True
+            )
+            assert None in results
+
+    def test_supports_template(self):
+        """
+        Ensure the template internals the walker relies on are available and that
+        templates without them aren't walked.
+        """
+        assert self.WorkFileWalker.supports_template(self.work_template)
+
+        class _PublicTemplate(object):
+            keys = self.work_template.keys
+            definition = self.work_template.definition
+
+        assert not self.WorkFileWalker.supports_template(_PublicTemplate())
+
+    def test_matches_paths_from_template_with_index(self):
+        """
+        Ensure the walker finds the same files as paths_from_template when directory
+        listings are read from the index and that unchanged directories aren't listed
+        again.
+        """
+        index = self.WorkFileIndex()
+        index.clear()
+
+        # make the directories look as though they were modified a while ago, otherwise
+        # their listings won't be trusted by the index:
+        self._age_directories()
+
+        for fields, skip_keys in self._search_cases():
+            self._assert_walk_matches(
+                self.WorkFileWalker(self.work_template, index), fields, skip_keys
+            )
+            with patch("os.scandir", wraps=os.scandir) as scandir:
+                self._assert_walk_matches(
+                    self.WorkFileWalker(self.work_template, index), fields, skip_keys
+                )
+            assert scandir.call_count == 0
+
+    def test_index_refreshes_files_changed_in_place(self):
+        """
+        Ensure that files re-written in place are stat'ed again even though their
+        directory hasn't changed.
+        """
+        index = self.WorkFileIndex()
+        index.clear()
+        self._age_directories()
+
+        fields = self._ctx_jeff.as_template_fields(self.work_template)
+        skip_keys = ["version"]
+        self._assert_walk_matches(
+            self.WorkFileWalker(self.work_template, index), fields, skip_keys
+        )
+
+        # re-write a file without changing the modification time of its directory:
+        dir_stat = os.stat(self._work_dir)
+        path = self.create_work_file(self._ctx_jeff, "scene", 1)
+        with open(path, "w") as fh:
+            fh.write("updated")
+        os.utime(self._work_dir, (dir_stat.st_atime, dir_stat.st_mtime))
+
+        found = self._assert_walk_matches(
+            self.WorkFileWalker(self.work_template, index), fields, skip_keys
+        )
+        assert found[path][0].st_size == len("updated")
+
+        # and new files are found as soon as the directory changes:
+        new_path = self.create_work_file(self._ctx_jeff, "scene", 5)
+        found = self._assert_walk_matches(
+            self.WorkFileWalker(self.work_template, index), fields, skip_keys
+        )
+        assert new_path in found
+
+    def test_shared_scan_lists_each_directory_once(self):
+        """
+        Ensure that walkers sharing a scan find the same files as they do on their own
+        whilst each directory is only listed once, even when the walks run at the same
+        time.
+        """
+        scan = self.SharedDirectoryScan()
+        cases = [
+            (self._ctx_jeff.as_template_fields(self.work_template), ["version"]),
+            (
+                self._ctx_francis.as_template_fields(self.work_template),
+                ["version", "user"],
+            ),
+        ]
+        expected = [
+            self.WorkFileWalker(self.work_template).walk(
+                fields, skip_keys, skip_missing_optional_keys=True
+            )
+            for fields, skip_keys in cases
+        ]
+
+        listed = []
+        scandir = os.scandir
+
+        def slow_scandir(dir_path):
+            # give the other walk a chance to reach the directory whilst it's being listed:
+            listed.append(dir_path)
+            time.sleep(0.01)
+            return scandir(dir_path)
+
+        found = [None] * len(cases)
+
+        def walk(index):
+            fields, skip_keys = cases[index]
+            found[index] = self.WorkFileWalker(
+                self.work_template, shared_scan=scan
+            ).walk(fields, skip_keys, skip_missing_optional_keys=True)
+
+        with patch("os.scandir", side_effect=slow_scandir):
+            threads = [
+                threading.Thread(target=walk, args=(index,))
+                for index in range(len(cases))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert found == expected
+        assert listed
+        assert sorted(listed) == sorted(set(listed))
+        assert not scan._pending_listings
+
+    def test_shared_scan_claims_listings(self):
+        """
+        Ensure a directory is claimed by the first caller to reach it, that later callers
+        wait for its listing and that the listing is then re-used.
+        """
+        scan = self.SharedDirectoryScan()
+
+        assert scan._get_or_claim_listing(self._work_dir) == (False, None, None)
+        is_listed, entries, pending = scan._get_or_claim_listing(self._work_dir)
+        assert not is_listed
+        assert not pending.is_set()
+
+        listing = list(os.scandir(self._work_dir))
+        scan._set_listing(self._work_dir, listing)
+        assert pending.is_set()
+        assert scan._get_or_claim_listing(self._work_dir) == (True, listing, None)
+        with patch("os.scandir", wraps=os.scandir) as scandir:
+            assert scan.scandir(self._work_dir) is listing
+        assert scandir.call_count == 0
+
+        # directories that can't be listed are only tried once as well:
+        missing_dir = os.path.join(self._work_dir, "missing")
+        assert scan.scandir(missing_dir) is None
+        assert scan._get_or_claim_listing(missing_dir) == (True, None, None)
+
+    def _age_directories(self):
+        """
+        Set the modification time of all directories in the project to a minute ago.
+        """
+        past = time.time() - 60
+        for dir_path, _, _ in os.walk(self.project_root):
+            os.utime(dir_path, (past, past))